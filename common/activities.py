@@ -1,22 +1,26 @@
 from __future__ import unicode_literals
 
+import hashlib
+import json
 import re
 
-from collections import Counter, defaultdict
-from functools import partial
+from collections import defaultdict
 from itertools import chain
 
 from django.contrib.auth.models import AnonymousUser
 from django.core.cache import cache
 from django.core.urlresolvers import reverse
+from django.db import transaction
+from django.db.models import Count
+from django.utils.functional import cached_property
 
-from common.utils import (app_label_to_user_data_model,
-                          get_source_labels_and_configs)
+from common.utils import get_source_labels_and_configs
 
 from data_import.models import DataFile
-from private_sharing.models import DataRequestProject
+from private_sharing.models import (DataRequestProject,
+                                    DataRequestProjectMember)
 
-from open_humans.models import Member
+from open_humans.models import BadgeCount
 
 
 LABELS = {
@@ -46,8 +50,10 @@ LABELS = {
     },
 }
 
-TWO_HOURS = 2 * 60 * 60
-ONE_MINUTE = 60
+ONE_DAY = 24 * 60 * 60
+
+# memoized per process by sources_fingerprint()
+_SOURCES_FINGERPRINT = None
 
 
 def compose(*funcs):
@@ -64,58 +70,94 @@ def get_labels(*args):
     return {name: value for name, value in LABELS.items() if name in args}
 
 
-def badge_counts_inner():
-    """
-    Return a dictionary of badges in the form {label: count}; e.g.
-    {'fitbit': 100}.
-    """
-    members = Member.objects.all().values('badges')
-    badges = chain.from_iterable(member['badges'] for member in members)
-    counts = Counter(badge.get('label') for badge in badges)
-
-    return dict(counts.items())
-
-
 def badge_counts():
     """
     Return badge counts.
 
     Badge counts are in the form {label: count}; e.g.
-    {'fitbit': 100}. This function is a wrapper that provides
-    caching for the result, to improve performance.
+    {'fitbit': 100}. They're read from the BadgeCount table, which is kept up
+    to date as members' badges change (see open_humans.badges), so this is a
+    single small query.
     """
-    cache_tag = 'badge-counts'
+    return dict(BadgeCount.objects
+                .filter(count__gt=0)
+                .values_list('label', 'count'))
 
-    cached = cache.get(cache_tag)
 
-    if cached:
-        return cached
+class UserActivityResolver(object):
+    """
+    Answer the per-user questions the activity definitions need with a fixed
+    number of aggregate queries, rather than one query per source or project.
+    """
 
-    badge_counts = badge_counts_inner()
+    def __init__(self, user):
+        self.user = user
 
-    cache.set(cache_tag, badge_counts, ONE_MINUTE)
+    @cached_property
+    def file_counts(self):
+        """
+        Return a dictionary of current file counts in the form {source: count}.
+        """
+        files = (DataFile.objects
+                 .for_user(self.user)
+                 .values('source')
+                 .annotate(count=Count('id')))
 
-    return badge_counts
+        return {row['source']: row['count'] for row in files}
+
+    @cached_property
+    def joined_project_ids(self):
+        """
+        Return the set of DataRequestProject IDs the user has actively joined.
+        """
+        return set(DataRequestProjectMember.objects
+                   .filter_active()
+                   .filter(member__user=self.user)
+                   .values_list('project_id', flat=True))
 
+    @cached_property
+    def connected_sources(self):
+        """
+        Return the set of source labels the user is connected to.
+        """
+        return set(self.user.member.connections.keys())
 
-def get_sources(user=None):
+    @cached_property
+    def connected_labels(self):
+        """
+        Return the set of all activity labels the user is connected to.
+        """
+        labels = set(self.connected_sources)
+
+        labels.update('direct-sharing-{}'.format(project_id)
+                      for project_id in self.joined_project_ids)
+
+        if self.user.member.public_data_participant.enrolled:
+            labels.add('public_data_sharing')
+
+        return labels
+
+    def has_files(self, label):
+        return self.file_counts.get(label, 0) > 0
+
+    def is_connected(self, label):
+        return label in self.connected_labels
+
+    def is_joined(self, project):
+        return project.id in self.joined_project_ids
+
+
+def get_sources(user=None, resolver=None):
     """
     Create and return activity definitions for all of the activities in the
     'study' and 'activity' modules.
     """
     activities = defaultdict(dict)
 
-    for label, source in get_source_labels_and_configs():
-        user_data_model = app_label_to_user_data_model(label)
-        is_connected = False
-
-        if user:
-            if hasattr(user_data_model, 'objects'):
-                is_connected = user_data_model.objects.get(
-                    user=user).is_connected
-            elif hasattr(source, 'user_data'):
-                is_connected = source.user_data(user=user).is_connected
+    if user and not resolver:
+        resolver = UserActivityResolver(user)
 
+    for label, source in get_source_labels_and_configs():
         if hasattr(source, 'url_slug'):
             url_slug = source.url_slug
         else:
@@ -146,10 +188,8 @@ def get_sources(user=None):
                                             source.verbose_name),
             'add_data_url': source.href_add_data if source.href_add_data else source.href_connect,
             'url_slug': url_slug,
-            'has_files': (user and DataFile.objects.for_user(user)
-                          .filter(source=label).count() > 0),
-            'is_connected': is_connected,
-            'members': badge_counts().get(label, 0),
+            'has_files': resolver and resolver.has_files(label),
+            'is_connected': bool(resolver and resolver.is_connected(label)),
             'type': 'internal',
         }
 
@@ -168,12 +208,15 @@ def get_sources(user=None):
     return activities
 
 
-def activity_from_data_request_project(project, user=None):
+def activity_from_data_request_project(project, user=None, resolver=None):
     """
     Create an activity definition from the given DataRequestProject.
     """
     labels = []
 
+    if user and not resolver:
+        resolver = UserActivityResolver(user)
+
     data_source = bool(project.returned_data_description)
 
     # a member can share with a project by sharing their username or their data
@@ -206,12 +249,9 @@ def activity_from_data_request_project(project, user=None):
         'add_data_text': ('Join {}'.format(project.name) if
                           project.type == 'on-site' else
                           'Connect {}'.format(project.name)),
-        'members': badge_counts().get(project.id_label, 0),
         'project_id': project.id,
         'url_slug': project.slug,
-        'has_files': (
-            user and
-            project.projectdatafile_set.filter(user__pk=user.pk).count() > 0),
+        'has_files': resolver and resolver.has_files(project.id_label),
         'type': 'project',
         'on_site': project.type == 'on-site',
         'badge': {
@@ -236,8 +276,8 @@ def activity_from_data_request_project(project, user=None):
     if project.is_study:
         activity['labels'].update(get_labels('study'))
 
-    if user:
-        activity['is_connected'] = project.is_joined(user)
+    if resolver:
+        activity['is_connected'] = resolver.is_joined(project)
 
     try:
         activity['badge'].update({
@@ -270,15 +310,17 @@ def get_data_request_projects(user=None, only_approved=True, only_active=True):
     else:
         projs = DataRequestProject.objects.all()
 
+    resolver = UserActivityResolver(user) if user else None
+
     output = {
             project.id_label: activity_from_data_request_project(
-                project=project, user=user) for project in projs
+                project=project, resolver=resolver) for project in projs
         }
 
     return output
 
 
-def manual_overrides(user, activities):
+def manual_overrides(activities):
     """
     Apply any manual overrides (and create any activity definitions that
     weren't created by the other methods).
@@ -316,9 +358,7 @@ def manual_overrides(user, activities):
             'connect_verb': 'join',
             'join_url': reverse('public-data:home'),
             'url_slug': None,
-            'is_connected': (user and
-                             user.member.public_data_participant.enrolled),
-            'members': badge_counts().get('public_data_sharing', 0),
+            'is_connected': False,
         }
     })
 
@@ -410,67 +450,144 @@ def sort(activities):
     return sorted(activities.values(), key=sort_order)
 
 
-def personalize_activities(user=None, only_approved=True, only_active=True):
+def sources_fingerprint():
     """
-    A wrapper that caches activities for the case where there's no
-    authenticated user. Could be extended for caching a user's activities but
-    would need either a shorter expiration or a method to invalidate the cache
-    for a user when they joined/disconnected an activity.
+    Return a hash of the user-independent source definitions.
 
-    Also note that a low value is used (two hours) because a logged out user
-    will not immediately see changes to the home page if a new data request
-    project is approved. A signal to invalidate the cache when projects change
-    would allow a higher expiration time.
+    The source definitions come from the AppConfigs, which only change when
+    the code is deployed; including this hash in the catalog's cache tag means
+    a deploy that changes them never serves a stale catalog.
     """
-    if user == AnonymousUser():
-        user = None
+    global _SOURCES_FINGERPRINT  # pylint: disable=global-statement
+
+    if not _SOURCES_FINGERPRINT:
+        definitions = json.dumps(get_sources(), sort_keys=True, default=str)
+        _SOURCES_FINGERPRINT = hashlib.md5(
+            definitions.encode('utf-8')).hexdigest()
+
+    return _SOURCES_FINGERPRINT
+
 
-    if not user:
-        cache_tag = 'personalize-activities'
-        if only_approved:
-            cache_tag = cache_tag + '-approved'
-        if only_active:
-            cache_tag = cache_tag + '-active'
+def catalog_cache_tag(only_approved=True, only_active=True):
+    """
+    Return the cache tag for a variant of the activity catalog.
+    """
+    cache_tag = 'activity-catalog-{}'.format(sources_fingerprint())
 
-        cached = cache.get(cache_tag)
+    if only_approved:
+        cache_tag = cache_tag + '-approved'
+    if only_active:
+        cache_tag = cache_tag + '-active'
 
-        if cached:
-            return cached
+    return cache_tag
 
-        activities = personalize_activities_inner(
-            user, only_approved=only_approved, only_active=only_active)
 
-        cache.set(cache_tag, activities, timeout=TWO_HOURS)
+def invalidate_activity_catalog():
+    """
+    Remove every cached variant of the activity catalog.
 
-        return activities
+    This is called from the post_save and post_delete signals of the models
+    the catalog is built from. The cache is cleared immediately and again once
+    the current transaction commits, so that a request running concurrently
+    can't re-cache the catalog from data that was about to change.
+    """
+    def delete_catalogs():
+        cache.delete_many([
+            catalog_cache_tag(only_approved=only_approved,
+                              only_active=only_active)
+            for only_approved in (True, False)
+            for only_active in (True, False)])
 
-    return personalize_activities_inner(user, only_approved=only_approved,
-                                        only_active=only_active)
+    delete_catalogs()
+    transaction.on_commit(delete_catalogs)
 
 
-def personalize_activities_inner(user, only_approved=True, only_active=True):
+def get_activity_catalog_inner(only_approved=True, only_active=True):
     """
-    Generate a list of activities by getting sources and data request projects
-    and running them through a composed set of methods.
+    Generate the user-independent activity definitions by getting sources and
+    data request projects and running them through a composed set of methods.
     """
-    sources = get_sources(user).items()
+    sources = get_sources().items()
     data_req_projects = get_data_request_projects(
-        user,
         only_approved=only_approved,
         only_active=only_active).items()
 
     metadata = dict(chain(sources, data_req_projects))
 
-    metadata = compose(sort,
-                       fix_linebreaks,
+    metadata = compose(fix_linebreaks,
                        add_classes,
                        add_labels,
                        add_source_names,
-                       partial(manual_overrides, user))(metadata)
+                       manual_overrides)(metadata)
 
     return metadata
 
 
+def get_activity_catalog(only_approved=True, only_active=True):
+    """
+    Return a dictionary of the user-independent activity definitions.
+
+    The catalog is cached until a DataRequestProject or FeaturedProject
+    changes (see invalidate_activity_catalog) or the source definitions
+    change.
+    """
+    cache_tag = catalog_cache_tag(only_approved=only_approved,
+                                  only_active=only_active)
+
+    cached = cache.get(cache_tag)
+
+    if cached:
+        return cached
+
+    activities = get_activity_catalog_inner(only_approved=only_approved,
+                                            only_active=only_active)
+
+    cache.set(cache_tag, activities, timeout=ONE_DAY)
+
+    return activities
+
+
+def add_user_overlay(activities, user=None):
+    """
+    Overlay the member counts and the given user's connection and file status
+    on the activity catalog.
+    """
+    counts = badge_counts()
+
+    resolver = UserActivityResolver(user) if user else None
+
+    for label, activity in activities.items():
+        activity['members'] = counts.get(label, 0)
+        activity['is_connected'] = bool(resolver and
+                                        resolver.is_connected(label))
+
+        if activity['has_files'] != '':
+            activity['has_files'] = bool(resolver and
+                                         resolver.has_files(label))
+
+        if activity['is_connected']:
+            activity['classes'] = ' '.join([activity['classes'], 'connected'])
+
+    return activities
+
+
+def personalize_activities(user=None, only_approved=True, only_active=True):
+    """
+    Return a sorted list of activities with the given user's state overlaid.
+
+    The activity definitions come from the cached catalog, so the only
+    per-request work is the overlay, which takes a fixed number of queries
+    regardless of the number of sources and projects.
+    """
+    if user == AnonymousUser():
+        user = None
+
+    activities = get_activity_catalog(only_approved=only_approved,
+                                      only_active=only_active)
+
+    return sort(add_user_overlay(activities, user))
+
+
 def personalize_activities_dict(user=None, only_approved=True,
                                 only_active=True):
     """
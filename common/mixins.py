@@ -1,3 +1,4 @@
+from django.contrib.admin.views.decorators import staff_member_required
 from django.views.decorators.cache import never_cache
 
 from .decorators import participant_required
@@ -18,6 +19,21 @@ class PrivateMixin(object):
         return view
 
 
+class StaffMixin(object):
+    """
+    Require staff status and never cache this view.
+    """
+
+    @classmethod
+    def as_view(cls, **initkwargs):
+        view = super(StaffMixin, cls).as_view(**initkwargs)
+
+        view = staff_member_required(view)
+        view = never_cache(view)
+
+        return view
+
+
 class NeverCacheMixin(object):
     """
     Never cache this view.
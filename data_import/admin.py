@@ -4,3 +4,4 @@ from . import models
 
 admin.site.register(models.DataFile)
 admin.site.register(models.NewDataFileAccessLog)
+admin.site.register(models.QueuedTask)
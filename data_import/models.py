@@ -1,19 +1,21 @@
 import logging
 import os
 
+from datetime import timedelta
+
 from django.conf import settings
 from django.contrib.postgres.fields import JSONField
 from django.core.urlresolvers import reverse
-from django.db import models
+from django.db import models, transaction
 from django.db.models import F
 from django.dispatch import receiver
+from django.utils import timezone
 
 import account.signals
 
 from common import fields
 from common.utils import full_url
 
-from .processing import start_task
 from .utils import get_upload_path
 
 logger = logging.getLogger(__name__)
@@ -23,10 +25,7 @@ def is_public(member, source):
     """
     Return whether a given member has publicly shared the given source.
     """
-    return bool(member
-                .public_data_participant
-                .publicdataaccess_set
-                .filter(data_source=source, is_public=True))
+    return member.user.public_sources.filter(source=source).exists()
 
 
 @receiver(account.signals.email_confirmed)
@@ -35,8 +34,10 @@ def start_processing_cb(email_address, **kwargs):
     A signal that sends all of a user's connections to data-processing when
     they first verify their email.
     """
-    for source, _ in email_address.user.member.connections.items():
-        start_task(email_address.user, source)
+    # check the sources rather than reading the stored connections, which
+    # may not be up to date yet
+    for source in email_address.user.member.get_connected_sources():
+        QueuedTask.objects.enqueue(email_address.user, source)
 
 
 def delete_file(instance, **kwargs):  # pylint: disable=unused-argument
@@ -74,16 +75,12 @@ class DataFileManager(models.Manager):
         models.signals.pre_delete.connect(delete_file, model)
 
     def public(self):
-        prefix = 'user__member__public_data_participant__publicdataaccess'
-
-        filters = {
-            prefix + '__is_public': True,
-            prefix + '__data_source': F('source'),
-        }
-
-        return self.filter(**filters).current().exclude(
-            parent_project_data_file__completed=False).order_by(
-            'user__username')
+        # public_data.PublicSource indexes the (user, source) pairs that are
+        # currently public
+        return (self.filter(user__public_sources__source=F('source'))
+                .current()
+                .exclude(parent_project_data_file__completed=False)
+                .order_by('user__username'))
 
     def get_queryset(self):
         return DataFileQuerySet(self.model, using=self._db)
@@ -132,7 +129,9 @@ class DataFile(models.Model):
 
     @property
     def is_public(self):
-        return is_public(self.user.member, self.source)
+        return (DataFile.objects
+                .filter(pk=self.pk, user__public_sources__source=F('source'))
+                .exists())
 
     def has_access(self, user=None):
         return self.is_public or self.user == user
@@ -192,3 +191,157 @@ class TestUserData(models.Model):
 
     user = fields.AutoOneToOneField(settings.AUTH_USER_MODEL,
                                     related_name='test_user_data')
+
+
+class QueuedTaskManager(models.Manager):
+    """
+    Add a method for enqueueing tasks to the QueuedTask manager.
+    """
+
+    def enqueue(self, user, source, force=False):
+        """
+        Queue a task for the given user and source, unless an identical task
+        was queued within the last QueuedTask.DEDUPE_SECONDS and hasn't been
+        sent yet.
+        """
+        window_start = timezone.now() - timedelta(
+            seconds=QueuedTask.DEDUPE_SECONDS)
+
+        # accept a user ID so that bulk callers needn't load each user
+        user_id = getattr(user, 'pk', user)
+
+        existing = (self.filter(user_id=user_id,
+                                source=source,
+                                status=QueuedTask.QUEUED,
+                                created__gte=window_start)
+                    .order_by('-created')
+                    .first())
+
+        if existing:
+            if force and not existing.force:
+                existing.force = True
+                existing.save(update_fields=['force'])
+
+            return existing
+
+        return self.create(user_id=user_id, source=source, force=force)
+
+    def due(self):
+        return (self.filter(status=QueuedTask.QUEUED,
+                            next_attempt__lte=timezone.now())
+                .order_by('next_attempt'))
+
+    def claim(self, batch_size):
+        """
+        Return up to batch_size due tasks, pushing their next attempt back by
+        QueuedTask.CLAIM_SECONDS so that other workers skip them while they're
+        sent.
+
+        The rows are only locked while they're claimed; the caller sends them
+        after this transaction has committed. A task whose worker dies before
+        recording the result becomes due again once the claim expires.
+        """
+        with transaction.atomic():
+            tasks = list(self.due().select_for_update()[:batch_size])
+
+            self._extend_claim(tasks)
+
+        return tasks
+
+    def claim_task(self, task):
+        """
+        Claim a single task as claim() does. Returns the task, or None if it
+        isn't due, e.g. because a worker has already claimed it.
+        """
+        with transaction.atomic():
+            task = self.due().select_for_update().filter(pk=task.pk).first()
+
+            if task:
+                self._extend_claim([task])
+
+        return task
+
+    def _extend_claim(self, tasks):
+        self.filter(pk__in=[task.pk for task in tasks]).update(
+            next_attempt=timezone.now() +
+            timedelta(seconds=QueuedTask.CLAIM_SECONDS))
+
+
+class QueuedTask(models.Model):
+    """
+    A task waiting to be sent to data-processing.
+
+    Tasks are queued by start_task and sent by the process_task_queue
+    management command, so that web requests never wait on data-processing.
+    """
+
+    QUEUED = 'queued'
+    SENT = 'sent'
+    FAILED = 'failed'
+
+    STATUS_CHOICES = (
+        (QUEUED, 'Queued'),
+        (SENT, 'Sent'),
+        (FAILED, 'Failed'),
+    )
+
+    # identical tasks queued within this many seconds are only sent once
+    DEDUPE_SECONDS = 5 * 60
+
+    # retries back off exponentially from this delay, up to the maximum
+    RETRY_DELAY_SECONDS = 60
+    MAX_RETRY_DELAY_SECONDS = 60 * 60
+    MAX_ATTEMPTS = 8
+
+    # how long a worker has to send a task it claimed before another worker
+    # may claim it
+    CLAIM_SECONDS = 10 * 60
+
+    objects = QueuedTaskManager()
+
+    user = models.ForeignKey(settings.AUTH_USER_MODEL,
+                             related_name='queued_tasks')
+    source = models.CharField(max_length=32)
+    force = models.BooleanField(default=False)
+
+    status = models.CharField(max_length=16, choices=STATUS_CHOICES,
+                              default=QUEUED)
+    attempts = models.IntegerField(default=0)
+    last_error = models.TextField(blank=True)
+
+    created = models.DateTimeField(auto_now_add=True)
+    next_attempt = models.DateTimeField(default=timezone.now)
+    sent = models.DateTimeField(null=True, blank=True)
+
+    class Meta:  # noqa: D101
+        index_together = [('status', 'next_attempt')]
+
+    def __unicode__(self):
+        return '%s:%s:%s' % (self.user, self.source, self.status)
+
+    def mark_sent(self):
+        self.status = self.SENT
+        self.sent = timezone.now()
+        self.attempts += 1
+
+        self.save(update_fields=['status', 'sent', 'attempts'])
+
+    def mark_failed(self, error):
+        """
+        Schedule the task to be retried with exponential backoff, or give up
+        on it after MAX_ATTEMPTS.
+        """
+        self.attempts += 1
+        self.last_error = error
+
+        if self.attempts >= self.MAX_ATTEMPTS:
+            self.status = self.FAILED
+        else:
+            delay = min(self.RETRY_DELAY_SECONDS * 2 ** (self.attempts - 1),
+                        self.MAX_RETRY_DELAY_SECONDS)
+
+            self.next_attempt = (timezone.now() +
+                                 timedelta(seconds=delay))
+
+        self.save(update_fields=['attempts', 'last_error', 'status',
+                                 'next_attempt'])
@@ -9,10 +9,14 @@ from raven.contrib.django.raven_compat.models import client
 from common.utils import full_url
 from open_humans.models import Member
 
+from .models import QueuedTask
 from .utils import get_upload_dir
 
 logger = logging.getLogger(__name__)
 
+# seconds to wait for data-processing to accept a task
+SEND_TIMEOUT = 10
+
 
 def task_params_for_source(user, source):
     """
@@ -65,32 +69,64 @@ def task_params_for_source(user, source):
 
 def start_task(user, source, force=False):
     """
-    Send a task to data-processing.
+    Queue a task for data-processing; the process_task_queue management
+    command sends it.
+    """
+    return QueuedTask.objects.enqueue(user, source, force=force)
+
+
+def post_task(task, session=requests):
+    """
+    Post a queued task to data-processing, returning None if it was accepted
+    or an error message if it wasn't.
+
+    This doesn't touch the database so it's safe to call from worker threads.
     """
     task_url = '{}/'.format(
-        urlparse.urljoin(settings.DATA_PROCESSING_URL, source))
+        urlparse.urljoin(settings.DATA_PROCESSING_URL, task.source))
 
     try:
-        task_req = requests.post(
+        task_req = session.post(
             task_url,
             params={'key': settings.PRE_SHARED_KEY},
             json={
-                'oh_user_id': user.id,
+                'oh_user_id': task.user_id,
                 'oh_base_url': full_url('/data-import/'),
-                'force': force,
-            })
+                'force': task.force,
+            },
+            timeout=SEND_TIMEOUT)
     except requests.exceptions.RequestException:
         logger.error('Error in sending request to data processing')
 
-        error_message = 'Error in call to Open Humans Data Processing.'
+        return 'Error in call to Open Humans Data Processing.'
 
-    if 'task_req' in locals() and not task_req.status_code == 200:
+    if task_req.status_code != 200:
         logger.error('Non-200 response from data processing')
 
-        error_message = 'Open Humans Data Processing not returning 200.'
+        return 'Open Humans Data Processing not returning 200.'
+
 
-    if 'error_message' in locals():
-        if not settings.TESTING:
-            client.captureMessage(error_message)
+def record_task_result(task, error_message):
+    """
+    Mark a task as sent, or schedule a retry if it failed.
+    """
+    if not error_message:
+        task.mark_sent()
 
-        return 'error'
+        return True
+
+    task.mark_failed(error_message)
+
+    if task.status == task.FAILED and not settings.TESTING:
+        client.captureMessage(error_message)
+
+    return False
+
+
+def send_task(task, session=requests):
+    """
+    Send a queued task to data-processing, returning True if it was accepted.
+
+    A requests.Session can be passed to reuse connections across tasks.
+    """
+    return record_task_result(task, post_task(task, session=session))
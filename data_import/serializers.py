@@ -8,10 +8,25 @@ class DataFileSerializer(serializers.ModelSerializer):
     Serialize a data file.
     """
 
-    download_url = serializers.CharField(source='private_download_url')
+    download_url = serializers.SerializerMethodField()
     metadata = serializers.JSONField()
 
     class Meta:  # noqa: D101
         model = DataFile
         fields = ('id', 'basename', 'created', 'download_url', 'metadata',
                   'source')
+
+    def get_download_url(self, obj):
+        """
+        Use the public file IDs from the context if a view looked them up in
+        bulk, rather than checking each file individually.
+        """
+        public_file_ids = self.context.get('public_file_ids')
+
+        if public_file_ids is None:
+            return obj.private_download_url
+
+        if obj.id in public_file_ids:
+            return obj.download_url
+
+        return obj.file.url
@@ -1,10 +1,13 @@
+import json
+
 from django.conf import settings
 from django.contrib import auth
 from django.test import TestCase
 
 from mock import patch
 
-from .processing import start_task
+from .models import DataFile, QueuedTask
+from .processing import send_task, start_task
 
 UserModel = auth.get_user_model()
 
@@ -19,9 +22,23 @@ class DataImportTestCase(TestCase):
     def setUp(self):
         self.user = UserModel.objects.get(username='beau')
 
-    @patch('requests.post')
-    def test_start_task(self, mock):
+    def test_start_task(self):
         start_task(self.user, 'american_gut')
+        start_task(self.user, 'american_gut', force=True)
+
+        tasks = QueuedTask.objects.filter(user=self.user,
+                                          source='american_gut')
+
+        self.assertEqual(tasks.count(), 1)
+        self.assertTrue(tasks[0].force)
+        self.assertEqual(tasks[0].status, QueuedTask.QUEUED)
+
+    @patch('requests.post')
+    def test_send_task(self, mock):
+        mock.return_value.status_code = 200
+
+        task = start_task(self.user, 'american_gut')
+        self.assertTrue(send_task(task))
 
         self.assertTrue(mock.called)
         self.assertEqual(mock.call_count, 1)
@@ -33,3 +50,67 @@ class DataImportTestCase(TestCase):
 
         self.assertEqual(kwargs['params']['key'], settings.PRE_SHARED_KEY)
         self.assertEqual(kwargs['json']['oh_user_id'], self.user.id)
+
+        self.assertEqual(QueuedTask.objects.get(pk=task.pk).status,
+                         QueuedTask.SENT)
+
+    @patch('requests.post')
+    def test_send_task_retries(self, mock):
+        mock.return_value.status_code = 500
+
+        task = start_task(self.user, 'american_gut')
+        self.assertFalse(send_task(task))
+
+        task = QueuedTask.objects.get(pk=task.pk)
+
+        self.assertEqual(task.status, QueuedTask.QUEUED)
+        self.assertEqual(task.attempts, 1)
+        self.assertFalse(QueuedTask.objects.due().filter(pk=task.pk).exists())
+
+    def test_claimed_tasks_are_not_due(self):
+        task = start_task(self.user, 'american_gut')
+
+        self.assertEqual(QueuedTask.objects.claim(10), [task])
+        self.assertEqual(QueuedTask.objects.claim(10), [])
+        self.assertFalse(QueuedTask.objects.due().filter(pk=task.pk).exists())
+
+    def test_claimed_task_is_only_claimed_once(self):
+        task = start_task(self.user, 'american_gut')
+
+        self.assertEqual(QueuedTask.objects.claim_task(task), task)
+        self.assertIsNone(QueuedTask.objects.claim_task(task))
+
+        # a deduplicated task that's already claimed isn't claimed again
+        self.assertEqual(start_task(self.user, 'american_gut'), task)
+        self.assertIsNone(QueuedTask.objects.claim_task(task))
+
+    def test_task_update_is_idempotent(self):
+        def task_update(keys, archive_previous=False):
+            return self.client.post(
+                '/data-import/task-update/',
+                data=json.dumps({
+                    'task_data': {
+                        'oh_user_id': self.user.id,
+                        'oh_source': 'pgp',
+                        'archive_previous': archive_previous,
+                        'data_files': [
+                            {'s3_key': key, 'metadata': {'tags': []}}
+                            for key in keys
+                        ],
+                    },
+                }),
+                content_type='application/json')
+
+        files = DataFile.objects.filter(user=self.user, source='pgp')
+
+        task_update(['pgp/1.json', 'pgp/2.json'])
+        task_update(['pgp/1.json', 'pgp/2.json'])
+
+        self.assertEqual(files.current().count(), 2)
+
+        task_update(['pgp/3.json'], archive_previous=True)
+
+        self.assertEqual(
+            list(files.current().values_list('file', flat=True)),
+            ['pgp/3.json'])
+        self.assertEqual(files.archived().count(), 2)
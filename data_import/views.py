@@ -7,6 +7,7 @@ from django.apps import apps
 from django.contrib import messages
 from django.contrib.auth import get_user_model
 from django.core.urlresolvers import reverse, reverse_lazy
+from django.db import transaction
 from django.http import (HttpResponse, HttpResponseBadRequest,
                          HttpResponseForbidden, HttpResponseRedirect)
 from django.views.decorators.csrf import csrf_exempt
@@ -25,6 +26,7 @@ from common.permissions import HasPreSharedKey
 from common.utils import full_url
 from open_humans.signals import send_connection_email
 from private_sharing.utilities import source_to_url_slug
+from public_data.contributors import refresh_public_contributor
 
 from .forms import ArchiveDataFilesForm
 from .models import DataFile, NewDataFileAccessLog
@@ -97,9 +99,16 @@ class ArchiveDataFilesView(APIView):
                             status=status.HTTP_400_BAD_REQUEST)
 
         data_files = form.cleaned_data['data_file_ids']
-        data_files.update(archived=datetime.now())
 
         ids = [data_file.id for data_file in data_files]
+        pairs = set((data_file.user_id, data_file.source)
+                    for data_file in data_files)
+
+        data_files.update(archived=datetime.now())
+
+        # update() doesn't send the signals that maintain the counts
+        for user_id, source in pairs:
+            refresh_public_contributor(user_id, source)
 
         return Response({'ids': ids}, status=status.HTTP_200_OK)
 
@@ -134,17 +143,52 @@ class TaskUpdateView(View):
     # pylint: disable=unused-argument
     @staticmethod
     def create_datafiles_with_metadata(oh_user_id, oh_source, data_files,
-                                       **kwargs):
+                                       archive_previous=False, **kwargs):
+        """
+        Create the reported files in one transaction.
+
+        Files whose S3 key already exists for the user and source are skipped,
+        so it's safe for data-processing to retry a task update. If
+        archive_previous is set, the user's other current files for the source
+        are archived.
+        """
         user = UserModel.objects.get(pk=oh_user_id)
+        keys = [data_file['s3_key'] for data_file in data_files]
+
+        with transaction.atomic():
+            existing_keys = set(DataFile.objects
+                                .filter(user=user, source=oh_source,
+                                        file__in=keys)
+                                .values_list('file', flat=True))
+
+            if archive_previous:
+                (DataFile.objects
+                 .filter(user=user, source=oh_source)
+                 .current()
+                 .exclude(file__in=keys)
+                 .update(archived=datetime.now()))
+
+            data_file_objects = []
+
+            for data_file in data_files:
+                if data_file['s3_key'] in existing_keys:
+                    continue
+
+                existing_keys.add(data_file['s3_key'])
+
+                data_file_object = DataFile(user=user,
+                                            source=oh_source,
+                                            metadata=data_file['metadata'])
+
+                data_file_object.file.name = data_file['s3_key']
 
-        for data_file in data_files:
-            data_file_object = DataFile(user=user,
-                                        source=oh_source,
-                                        metadata=data_file['metadata'])
+                data_file_objects.append(data_file_object)
 
-            data_file_object.file.name = data_file['s3_key']
+            DataFile.objects.bulk_create(data_file_objects)
 
-            data_file_object.save()
+            # bulk_create() and update() don't send the signals that maintain
+            # the counts
+            refresh_public_contributor(user.id, oh_source)
 
 
 class DataRetrievalView(ContextMixin, PrivateMixin, View):
@@ -154,7 +198,6 @@ class DataRetrievalView(ContextMixin, PrivateMixin, View):
 
     source = None
     redirect_url = reverse_lazy('my-member-data')
-    message_error = 'Sorry, our data retrieval server seems to be down.'
     message_started = "Thanks! We've submitted this import task to our server."
     message_postponed = """We've postponed imports pending email verification.
     Check for our confirmation email, which has a verification link. To send a
@@ -186,12 +229,9 @@ class DataRetrievalView(ContextMixin, PrivateMixin, View):
             return self.redirect()
 
         if request.user.member.primary_email.verified:
-            task = start_task(request.user, self.source)
+            start_task(request.user, self.source)
 
-            if task == 'error':
-                messages.error(request, self.message_error)
-            else:
-                messages.success(request, self.message_started)
+            messages.success(request, self.message_started)
         else:
             messages.warning(request, self.message_postponed)
 
@@ -11,6 +11,10 @@ urlpatterns = [
         api_views.PublicDataListAPIView.as_view(),
         name='public-data'),
 
+    url(r'^public-data/export/$',
+        api_views.PublicDataExportAPIView.as_view(),
+        name='public-data-export'),
+
     url(r'^public-data/members/$',
         api_views.PublicDataMembers.as_view()),
 
@@ -1,15 +1,25 @@
+import base64
+import binascii
+import json
+import os
+
 from collections import defaultdict
 
 from django.contrib.auth import get_user_model
+from django.core.urlresolvers import reverse
+from django.http import StreamingHttpResponse
 from django_filters import CharFilter, MultipleChoiceFilter
 from django_filters.filterset import STRICTNESS
 from django_filters.widgets import CSVWidget
 
+from rest_framework import serializers
 from rest_framework.filters import DjangoFilterBackend, FilterSet, SearchFilter
 from rest_framework.generics import ListAPIView
 from rest_framework.response import Response
+from rest_framework.utils.encoders import JSONEncoder
 from rest_framework.views import APIView
 
+from common.utils import full_url
 from data_import.models import DataFile
 from private_sharing.utilities import (
     get_source_labels_and_names_including_dynamic)
@@ -77,13 +87,89 @@ class PublicDataListAPIView(ListAPIView):
     Return the list of public data files.
     """
 
-    queryset = DataFile.objects.public()
+    queryset = DataFile.objects.public().select_related('user__member')
     serializer_class = PublicDataFileSerializer
 
     filter_backends = (DjangoFilterBackend,)
     filter_class = PublicDataFileFilter
 
 
+def encode_export_cursor(data_file_id):
+    return base64.urlsafe_b64encode(str(data_file_id))
+
+
+def decode_export_cursor(cursor):
+    try:
+        return int(base64.urlsafe_b64decode(str(cursor)))
+    except (TypeError, ValueError, binascii.Error):
+        raise serializers.ValidationError({'cursor': ['Invalid cursor.']})
+
+
+class PublicDataExportAPIView(APIView):
+    """
+    Stream every public data file as newline-delimited JSON.
+
+    Files are returned in ID order and accept the same filters as the public
+    data list. Each row includes a cursor; pass the cursor of the last row
+    received as the 'cursor' parameter to resume an interrupted export.
+    """
+
+    batch_size = 1000
+
+    fields = ('id', 'file', 'created', 'metadata', 'source', 'user__username',
+              'user__member__member_id', 'user__member__name')
+
+    def get_queryset(self):
+        queryset = DataFile.objects.public().order_by('id')
+
+        return PublicDataFileFilter(self.request.query_params,
+                                    queryset=queryset).qs.values(*self.fields)
+
+    @staticmethod
+    def serialize(row):
+        return {
+            'id': row['id'],
+            'basename': os.path.basename(row['file']),
+            'created': row['created'],
+            'download_url': full_url(
+                reverse('data-management:datafile-download',
+                        args=(row['id'],))),
+            'metadata': row['metadata'],
+            'source': row['source'],
+            'user': {
+                'id': row['user__member__member_id'],
+                'name': row['user__member__name'],
+                'username': row['user__username'],
+            },
+            'cursor': encode_export_cursor(row['id']),
+        }
+
+    def rows(self, queryset, last_id):
+        """
+        Read the files in batches keyed on the last ID seen so that each query
+        is an index range scan, however far into the export we are.
+        """
+        while True:
+            batch = list(queryset.filter(id__gt=last_id)[:self.batch_size])
+
+            for row in batch:
+                yield json.dumps(self.serialize(row), cls=JSONEncoder) + '\n'
+
+            if len(batch) < self.batch_size:
+                return
+
+            last_id = batch[-1]['id']
+
+    def get(self, request):
+        last_id = 0
+
+        if 'cursor' in request.query_params:
+            last_id = decode_export_cursor(request.query_params['cursor'])
+
+        return StreamingHttpResponse(self.rows(self.get_queryset(), last_id),
+                                     content_type='application/x-ndjson')
+
+
 class PublicDataSourcesByUserAPIView(ListAPIView):
     """
     Return an array where each entry is an object with this form:
@@ -24,3 +24,8 @@ class OpenHumansConfig(AppConfig):
         # Make sure our signal handlers get hooked up
         # pylint: disable=unused-variable
         import open_humans.signals  # noqa
+
+        if settings.INSTRUMENTATION_SAMPLE_RATE:
+            from open_humans.instrumentation import install
+
+            install()
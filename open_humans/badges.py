@@ -0,0 +1,235 @@
+"""
+Maintenance of Member.badges and Member.connected_sources.
+
+Badges are kept up to date incrementally: the signal handlers in
+open_humans.signals call schedule_badge_update whenever a member connects or
+disconnects a source, joins or leaves a project, or enrolls in public data
+sharing. The update_badges management command reconciles every member
+against the same computation and only writes the members whose badges
+differ.
+
+Every change goes through set_member_badges, which also adjusts the
+BadgeCount table; rebuild_badge_counts repairs it from Member.badges. The
+connections the badges are computed from are stored with
+set_member_connections, so that Member.connections can be read without
+checking every source.
+"""
+from collections import Counter, defaultdict
+
+from django.db import connection, transaction
+from django.db.models import F
+
+from common.activities import get_activity_catalog
+from private_sharing.models import DataRequestProjectMember
+
+from .models import BadgeCount, Member
+
+
+def get_badge_data():
+    """
+    Return a dictionary of badges in the form {label: badge}.
+    """
+    return {label: activity['badge']
+            for label, activity in get_activity_catalog(
+                only_active=False).items()}
+
+
+def get_project_labels(member_ids):
+    """
+    Return the labels of the approved projects each member has actively
+    joined, in the form {member_id: [label, ...]}, using one query.
+    """
+    memberships = (DataRequestProjectMember.objects
+                   .filter_active()
+                   .filter(project__approved=True,
+                           member_id__in=member_ids)
+                   .order_by('member_id', 'project_id')
+                   .values_list('member_id', 'project_id'))
+
+    labels = defaultdict(list)
+
+    for member_id, project_id in memberships:
+        labels[member_id].append('direct-sharing-{}'.format(project_id))
+
+    return labels
+
+
+def compute_badges(member, badge_data, project_labels=None,
+                   connected_sources=None):
+    """
+    Return the badge list for a member.
+
+    project_labels can be passed in when the member's project labels were
+    fetched in bulk with get_project_labels, and connected_sources when
+    they've already been checked with Member.get_connected_sources.
+    """
+    if project_labels is None:
+        project_labels = get_project_labels([member.pk])[member.pk]
+
+    if connected_sources is None:
+        connected_sources = member.get_connected_sources()
+
+    # Badges for activities and deeply integrated studies, e.g. PGP,
+    # RunKeeper, followed by badges for DataRequestProjects
+    labels = list(connected_sources) + list(project_labels)
+
+    # The badge for the Public Data Sharing Study
+    if member.public_data_participant.enrolled:
+        labels.append('public_data_sharing')
+
+    return [badge_data[label] for label in labels if label in badge_data]
+
+
+def update_member_badges(member, badge_data=None):
+    """
+    Recompute a member's connections and badges and save them if they
+    changed. Returns True if the member was updated.
+    """
+    if badge_data is None:
+        badge_data = get_badge_data()
+
+    connected_sources = member.get_connected_sources()
+    badges = compute_badges(member, badge_data,
+                            connected_sources=connected_sources)
+
+    updated = set_member_connections(member, connected_sources)
+
+    if badges == member.badges:
+        return updated
+
+    return set_member_badges(member, badges) or updated
+
+
+def set_member_connections(member, connected_sources):
+    """
+    Save a member's connected sources if they changed. Returns True if the
+    member was updated.
+    """
+    if connected_sources == member.connected_sources:
+        return False
+
+    # update() rather than save() so the Member save signals aren't sent
+    Member.objects.filter(pk=member.pk).update(
+        connected_sources=connected_sources)
+
+    member.connected_sources = connected_sources
+
+    return True
+
+
+def badge_labels(badges):
+    """
+    Return a Counter of the labels in a badge list.
+    """
+    # members that have never had their badges computed have an empty dict
+    if not isinstance(badges, list):
+        return Counter()
+
+    return Counter(badge.get('label') for badge in badges
+                   if badge.get('label'))
+
+
+def adjust_badge_counts(old_badges, new_badges):
+    """
+    Apply the difference between two badge lists to the BadgeCount table.
+    """
+    delta = badge_labels(new_badges)
+    delta.subtract(badge_labels(old_badges))
+
+    # update the rows in a consistent order so that concurrent adjustments
+    # can't lock the same labels in opposite orders and deadlock
+    for label, change in sorted(delta.items()):
+        if not change:
+            continue
+
+        updated = (BadgeCount.objects
+                   .filter(label=label)
+                   .update(count=F('count') + change))
+
+        if not updated:
+            BadgeCount.objects.get_or_create(label=label)
+            BadgeCount.objects.filter(label=label).update(
+                count=F('count') + change)
+
+
+def set_member_badges(member, badges):
+    """
+    Save a member's badges and adjust the badge counts to match. Returns True
+    if the member was updated.
+    """
+    with transaction.atomic():
+        # lock the row and diff against what's stored, so that concurrent
+        # updates to the same member can't count a change twice
+        current = (Member.objects
+                   .select_for_update()
+                   .filter(pk=member.pk)
+                   .values_list('badges', flat=True)
+                   .first())
+
+        if current is None or current == badges:
+            return False
+
+        # update() rather than save() so the Member save signals aren't sent
+        Member.objects.filter(pk=member.pk).update(badges=badges,
+                                                   badge_count=len(badges))
+
+        adjust_badge_counts(current, badges)
+
+    member.badges = badges
+    member.badge_count = len(badges)
+
+    return True
+
+
+def aggregate_badge_counts():
+    """
+    Count the badges held by all members with a single aggregate query, in
+    the form {label: count}.
+    """
+    with connection.cursor() as cursor:
+        cursor.execute("""
+            SELECT badge->>'label', COUNT(*)
+            FROM {member_table}, jsonb_array_elements(badges) AS badge
+            WHERE jsonb_typeof(badges) = 'array'
+              AND badge->>'label' IS NOT NULL
+            GROUP BY badge->>'label'
+        """.format(member_table=Member._meta.db_table))
+
+        return dict(cursor.fetchall())
+
+
+def rebuild_badge_counts():
+    """
+    Replace the BadgeCount table with counts aggregated from Member.badges.
+    """
+    with transaction.atomic():
+        # block adjust_badge_counts until the rebuild commits; any member
+        # update that's already in progress is waited for, so the aggregate
+        # either includes its change or the change is applied afterwards
+        with connection.cursor() as cursor:
+            cursor.execute('LOCK TABLE {} IN SHARE ROW EXCLUSIVE MODE'.format(
+                BadgeCount._meta.db_table))
+
+        counts = aggregate_badge_counts()
+
+        BadgeCount.objects.all().delete()
+        BadgeCount.objects.bulk_create(
+            BadgeCount(label=label, count=count)
+            for label, count in counts.items())
+
+    return counts
+
+
+def schedule_badge_update(**lookup):
+    """
+    Update the badges of the member matching the lookup, e.g. user_id=1, once
+    the current transaction commits.
+    """
+    def update():
+        member = Member.enriched.filter(**lookup).first()
+
+        # the member may have been deleted along with the changed object
+        if member:
+            update_member_badges(member)
+
+    transaction.on_commit(update)
@@ -0,0 +1,316 @@
+"""
+Sampled per-view instrumentation.
+
+InstrumentationMiddleware records a sample for a fraction of requests
+(settings.INSTRUMENTATION_SAMPLE_RATE) with the view's query count, duplicate
+queries, time spent in the database, rendering templates, signing S3 URLs and
+making outbound HTTP requests, and its cache hits and misses. Samples are kept
+in a fixed-size ring buffer in the cache, shared by every process, and read by
+InstrumentationView and the instrumentation management command.
+
+A sampled view that runs more queries than its budget in
+settings.QUERY_BUDGETS is logged as a warning.
+"""
+import functools
+import logging
+import random
+import re
+import threading
+import time
+
+from collections import Counter, OrderedDict
+
+from django.conf import settings
+from django.core.cache import cache, caches
+from django.db import connection
+
+logger = logging.getLogger(__name__)
+
+_LOCAL = threading.local()
+
+INDEX_KEY = 'instrumentation:index'
+SAMPLE_KEY = 'instrumentation:{}'
+ONE_DAY = 60 * 60 * 24
+
+LITERAL_RE = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+IN_LIST_RE = re.compile(r'\(\?(?:, \?)*\)')
+WHITESPACE_RE = re.compile(r'\s+')
+
+
+def fingerprint(sql):
+    """
+    Return the SQL with its literals replaced, so that queries that differ
+    only by their parameters are the same.
+    """
+    sql = LITERAL_RE.sub('?', sql)
+    sql = IN_LIST_RE.sub('(...)', sql)
+
+    return WHITESPACE_RE.sub(' ', sql).strip()
+
+
+def get_query_budget(view_name):
+    """
+    Return the maximum number of queries for a view, or None if it has no
+    budget.
+    """
+    budgets = settings.QUERY_BUDGETS
+
+    return budgets.get(view_name, budgets.get('*'))
+
+
+def current_sample():
+    return getattr(_LOCAL, 'sample', None)
+
+
+def add_timing(key, elapsed):
+    """
+    Count a timed operation in the current sample, if there is one.
+    """
+    sample = current_sample()
+
+    if sample is None:
+        return
+
+    sample[key] = sample.get(key, 0) + 1
+    sample[key + '_time'] = sample.get(key + '_time', 0) + elapsed
+
+
+def start_sample(request):
+    """
+    Start recording a sample for this request if it's chosen for sampling.
+    """
+    if random.random() >= settings.INSTRUMENTATION_SAMPLE_RATE:
+        return
+
+    _LOCAL.sample = {
+        'path': request.path,
+        'method': request.method,
+        'view': None,
+        'timestamp': time.time(),
+    }
+
+    _LOCAL.force_debug_cursor = connection.force_debug_cursor
+
+    # record the queries in connection.queries_log for this request
+    connection.force_debug_cursor = True
+    connection.queries_log.clear()
+
+
+def set_view_name(view_name):
+    sample = current_sample()
+
+    if sample is not None:
+        sample['view'] = view_name
+
+
+def finish_sample(status_code):
+    """
+    Stop recording the current sample, add the queries and store it.
+    """
+    sample = current_sample()
+
+    if sample is None:
+        return
+
+    _LOCAL.sample = None
+
+    queries = list(connection.queries_log)
+
+    connection.force_debug_cursor = _LOCAL.force_debug_cursor
+
+    fingerprints = Counter(fingerprint(query['sql']) for query in queries)
+
+    sample.update({
+        'status': status_code,
+        'total_time': time.time() - sample['timestamp'],
+        'queries': len(queries),
+        'db_time': sum(float(query['time']) for query in queries),
+        'duplicates': [[sql, count] for sql, count
+                       in fingerprints.most_common(5) if count > 1],
+    })
+
+    store_sample(sample)
+    check_budget(sample)
+
+    return sample
+
+
+def check_budget(sample):
+    budget = get_query_budget(sample['view'])
+
+    if budget is None or sample['queries'] <= budget:
+        return
+
+    logger.warning('View "%s" ran %s queries for %s, over its budget of %s',
+                   sample['view'], sample['queries'], sample['path'], budget)
+
+
+def store_sample(sample):
+    """
+    Write a sample to the next slot of the ring buffer.
+    """
+    try:
+        cache.add(INDEX_KEY, 0, ONE_DAY)
+        index = cache.incr(INDEX_KEY)
+    except ValueError:
+        # e.g. the dummy cache when caching is disabled
+        return
+
+    cache.set(SAMPLE_KEY.format(index % settings.INSTRUMENTATION_BUFFER_SIZE),
+              sample, ONE_DAY)
+
+
+def sample_keys():
+    return [SAMPLE_KEY.format(i)
+            for i in range(settings.INSTRUMENTATION_BUFFER_SIZE)]
+
+
+def get_samples():
+    """
+    Return the samples in the ring buffer, oldest first.
+    """
+    return sorted(cache.get_many(sample_keys()).values(),
+                  key=lambda sample: sample['timestamp'])
+
+
+def clear_samples():
+    cache.delete_many(sample_keys() + [INDEX_KEY])
+
+
+def summarize(samples):
+    """
+    Return an OrderedDict of {view name: summary} of a list of samples, with
+    the slowest views first.
+    """
+    views = {}
+
+    for sample in samples:
+        view = views.setdefault(sample['view'] or '(unresolved)', {
+            'samples': 0,
+            'queries': [],
+            'duplicates': Counter(),
+            'over_budget': 0,
+        })
+
+        view['samples'] += 1
+        view['queries'].append(sample['queries'])
+
+        for key in ['total_time', 'db_time', 'template_time', 'cache_hits',
+                    'cache_misses', 'http', 'http_time', 's3', 's3_time']:
+            view[key] = view.get(key, 0) + sample.get(key, 0)
+
+        for sql, count in sample['duplicates']:
+            view['duplicates'][sql] += count
+
+        budget = get_query_budget(sample['view'])
+
+        if budget is not None and sample['queries'] > budget:
+            view['over_budget'] += 1
+
+    summary = []
+
+    for name, view in views.items():
+        n = float(view['samples'])
+
+        summary.append((name, OrderedDict([
+            ('samples', view['samples']),
+            ('mean_time', view['total_time'] / n),
+            ('mean_queries', sum(view['queries']) / n),
+            ('max_queries', max(view['queries'])),
+            ('query_budget', get_query_budget(name)),
+            ('over_budget', view['over_budget']),
+            ('mean_db_time', view['db_time'] / n),
+            ('mean_template_time', view['template_time'] / n),
+            ('cache_hits', view['cache_hits']),
+            ('cache_misses', view['cache_misses']),
+            ('http_requests', view['http']),
+            ('mean_http_time', view['http_time'] / n),
+            ('s3_urls', view['s3']),
+            ('mean_s3_time', view['s3_time'] / n),
+            ('duplicates', view['duplicates'].most_common(5)),
+        ])))
+
+    return OrderedDict(sorted(summary, key=lambda x: -x[1]['mean_time']))
+
+
+def wrap_timed(cls, method_name, key):
+    """
+    Time calls to a method of a class in the current sample under key.
+    """
+    original = getattr(cls, method_name)
+
+    if getattr(original, 'instrumented', False):
+        return
+
+    @functools.wraps(original)
+    def wrapper(*args, **kwargs):
+        if current_sample() is None:
+            return original(*args, **kwargs)
+
+        start = time.time()
+
+        try:
+            return original(*args, **kwargs)
+        finally:
+            add_timing(key, time.time() - start)
+
+    wrapper.instrumented = True
+
+    setattr(cls, method_name, wrapper)
+
+
+def wrap_cache(cls):
+    """
+    Count the cache hits and misses of a cache backend's get and get_many in
+    the current sample.
+    """
+    get = cls.get
+    get_many = cls.get_many
+
+    if getattr(get, 'instrumented', False):
+        return
+
+    def count(hits, misses):
+        sample = current_sample()
+
+        if sample is not None:
+            sample['cache_hits'] = sample.get('cache_hits', 0) + hits
+            sample['cache_misses'] = sample.get('cache_misses', 0) + misses
+
+    @functools.wraps(get)
+    def wrapped_get(self, key, default=None, *args, **kwargs):
+        value = get(self, key, default, *args, **kwargs)
+
+        if value is default:
+            count(0, 1)
+        else:
+            count(1, 0)
+
+        return value
+
+    @functools.wraps(get_many)
+    def wrapped_get_many(self, keys, *args, **kwargs):
+        values = get_many(self, keys, *args, **kwargs)
+
+        count(len(values), len(keys) - len(values))
+
+        return values
+
+    wrapped_get.instrumented = True
+
+    cls.get = wrapped_get
+    cls.get_many = wrapped_get_many
+
+
+def install():
+    """
+    Instrument outbound HTTP requests, S3 URL signing and the default cache.
+    Called from OpenHumansConfig.ready() when sampling is enabled.
+    """
+    import requests
+
+    from storages.backends.s3boto import S3BotoStorage
+
+    wrap_timed(requests.Session, 'send', 'http')
+    wrap_timed(S3BotoStorage, 'url', 's3')
+    wrap_cache(type(caches['default']))
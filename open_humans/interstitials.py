@@ -0,0 +1,98 @@
+"""
+One-time interstitial pages.
+
+An interstitial is a page that members are redirected to once, before they
+continue to the page they asked for. Each one is declared with
+register_interstitial() and shown by InterstitialRedirectMiddleware.
+
+Whether a member has seen an interstitial is recorded either on a boolean
+field of the Member, which is already loaded with the request, or in the
+session, so once it has been decided no further queries are made. The
+`applies` check runs on every request and must only read the Member row;
+the `needed` check may query and runs at most once per member.
+"""
+from collections import OrderedDict, namedtuple
+
+from data_import.models import is_public
+
+from .models import Member
+
+SESSION_KEY = 'seen_interstitials'
+
+Interstitial = namedtuple('Interstitial',
+                          ['url_name', 'seen_field', 'applies', 'needed'])
+
+INTERSTITIALS = OrderedDict()
+
+
+def register_interstitial(url_name, applies, needed=None, seen_field=None):
+    """
+    Register the view named url_name as an interstitial for the members for
+    which applies(member) and then needed(member) are True.
+
+    If seen_field is given it names a Member BooleanField that records that
+    the interstitial was seen; otherwise it's recorded in the session.
+    """
+    INTERSTITIALS[url_name] = Interstitial(
+        url_name=url_name,
+        seen_field=seen_field,
+        applies=applies,
+        needed=needed or (lambda member: True))
+
+
+def has_seen_interstitial(request, interstitial):
+    if interstitial.seen_field:
+        return getattr(request.user.member, interstitial.seen_field)
+
+    return interstitial.url_name in request.session.get(SESSION_KEY, [])
+
+
+def mark_interstitial_seen(request, url_name):
+    """
+    Record that the member has seen (or doesn't need) an interstitial.
+    """
+    interstitial = INTERSTITIALS[url_name]
+
+    if has_seen_interstitial(request, interstitial):
+        return
+
+    if interstitial.seen_field:
+        member = request.user.member
+
+        # update() rather than save() so the Member save signals aren't sent
+        Member.objects.filter(pk=member.pk).update(
+            **{interstitial.seen_field: True})
+
+        setattr(member, interstitial.seen_field, True)
+    else:
+        request.session[SESSION_KEY] = (request.session.get(SESSION_KEY, []) +
+                                        [url_name])
+
+
+def get_interstitial(request):
+    """
+    Return the url_name of the interstitial the member should be redirected
+    to, if any.
+    """
+    member = request.user.member
+
+    for interstitial in INTERSTITIALS.values():
+        if has_seen_interstitial(request, interstitial):
+            continue
+
+        if not interstitial.applies(member):
+            continue
+
+        if interstitial.needed(member):
+            return interstitial.url_name
+
+        mark_interstitial_seen(request, interstitial.url_name)
+
+
+# Shown to PGP members with 1 or more private PGP datasets and no public PGP
+# datasets.
+register_interstitial(
+    'pgp-interstitial',
+    applies=lambda member: 'pgp' in member.connected_sources,
+    needed=lambda member: not is_public(member, 'pgp'),
+    seen_field='seen_pgp_interstitial')
@@ -0,0 +1,30 @@
+import arrow
+
+from django.core.management.base import BaseCommand
+
+from open_humans.statistics import rebuild_statistics
+
+
+class Command(BaseCommand):
+    """
+    A management command for rebuilding the DailyStatistic rollups.
+    """
+
+    help = ('Rebuild the daily statistics from user events, activity feed '
+            'rows and join dates')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--since',
+                            dest='since',
+                            help=('only rebuild the statistics from this date '
+                                  'onwards'))
+
+    def handle(self, *args, **options):
+        since = None
+
+        if options['since']:
+            since = arrow.get(options['since']).date()
+
+        count = rebuild_statistics(since=since)
+
+        self.stdout.write('Done: {} daily statistics written'.format(count))
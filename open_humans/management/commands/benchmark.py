@@ -0,0 +1,413 @@
+import json
+import random
+import resource
+import time
+
+from cStringIO import StringIO
+from collections import OrderedDict
+
+import arrow
+
+from account.models import EmailAddress
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core import management
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test import Client
+from django.test.utils import (CaptureQueriesContext, override_settings,
+                               setup_test_environment,
+                               teardown_test_environment)
+
+from common.utils import get_source_labels
+from data_import.models import DataFile
+from open_humans.models import Member
+from private_sharing.models import (DataRequestProjectMember,
+                                    OnSiteDataRequestProject, ProjectDataFile)
+from public_data.models import PublicDataAccess
+
+UserModel = get_user_model()
+
+
+def percentile(values, percent):
+    """
+    Return the nearest-rank percentile of a sorted list.
+    """
+    index = int(round(percent / 100.0 * len(values) + 0.5)) - 1
+
+    return values[min(max(index, 0), len(values) - 1)]
+
+
+def max_rss_kb():
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+class Command(BaseCommand):
+    """
+    Benchmark the busiest views and API endpoints in-process.
+
+    A throwaway test database is created and filled with a synthetic dataset
+    of the requested size, built from a fixed random seed so that runs are
+    reproducible. Each URL is then requested repeatedly with the test client
+    and its latency percentiles, query counts and memory growth are reported.
+    The results can be written as JSON and compared with an earlier run.
+    """
+
+    help = 'Benchmark the main views against a synthetic dataset'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--members',
+                            type=int,
+                            default=200,
+                            help='the number of members to create')
+
+        parser.add_argument('--files-per-source',
+                            dest='files_per_source',
+                            type=int,
+                            default=2,
+                            help='the number of files per member and source')
+
+        parser.add_argument('--projects',
+                            type=int,
+                            default=20,
+                            help='the number of projects to create')
+
+        parser.add_argument('--memberships',
+                            type=int,
+                            default=3,
+                            help='the number of projects each member joins')
+
+        parser.add_argument('--public-fraction',
+                            dest='public_fraction',
+                            type=float,
+                            default=0.5,
+                            help=('the fraction of members who publicly '
+                                  'share some of their sources'))
+
+        parser.add_argument('-n', '--requests',
+                            type=int,
+                            default=20,
+                            help='the number of timed requests per URL')
+
+        parser.add_argument('--seed',
+                            type=int,
+                            default=0,
+                            help='the random seed for the dataset')
+
+        parser.add_argument('-o', '--output',
+                            help='write the results to this JSON file')
+
+        parser.add_argument('--compare',
+                            help=('compare the results with those in this '
+                                  'JSON file from an earlier run'))
+
+        parser.add_argument('--keepdb',
+                            action='store_true',
+                            help='keep the test database between runs')
+
+    @staticmethod
+    def create_member(username):
+        user = UserModel(username=username,
+                         email='{}@example.com'.format(username))
+        user.set_unusable_password()
+        user.save()
+
+        EmailAddress.objects.create(user=user, email=user.email,
+                                    verified=True, primary=True)
+
+        return Member.objects.create(user=user, name=username)
+
+    def build_dataset(self, options):
+        """
+        Create the members, projects, memberships, files and public sharing
+        of the synthetic dataset. Returns the first member, project and source,
+        which the benchmarked URLs use.
+        """
+        sources = get_source_labels()
+
+        with transaction.atomic():
+            coordinator = self.create_member('benchmark_coordinator')
+
+            projects = []
+
+            for i in range(max(options['projects'], 1)):
+                projects.append(OnSiteDataRequestProject.objects.create(
+                    name='Benchmark project {}'.format(i),
+                    is_study=False,
+                    leader='Benchmark leader',
+                    organization='Benchmark organization',
+                    is_academic_or_nonprofit=True,
+                    contact_email='benchmark@example.com',
+                    info_url='https://example.com/',
+                    short_description='A benchmark project.',
+                    long_description='A project for benchmarking.',
+                    returned_data_description='Benchmark data.',
+                    active=True,
+                    approved=True,
+                    request_sources_access=random.sample(
+                        sources, min(3, len(sources))),
+                    request_message_permission=True,
+                    request_username_access=True,
+                    coordinator=coordinator,
+                    consent_text='Benchmark consent.'))
+
+            members = [self.create_member('benchmark{}'.format(i))
+                       for i in range(max(options['members'], 1))]
+
+            for i, member in enumerate(members):
+                for source in sources:
+                    for j in range(options['files_per_source']):
+                        DataFile.objects.create(
+                            user=member.user,
+                            source=source,
+                            file='member-files/{}/{}-{}.json'.format(
+                                source, i, j))
+
+                joined = random.sample(
+                    projects, min(options['memberships'], len(projects)))
+
+                # the first member is the one the URLs are requested as
+                if i == 0 and projects[0] not in joined:
+                    joined.append(projects[0])
+
+                for project in joined:
+                    DataRequestProjectMember.objects.create(
+                        member=member,
+                        project=project,
+                        joined=True,
+                        authorized=True,
+                        sources_shared=project.request_sources_access,
+                        username_shared=True,
+                        message_permission=True)
+
+                    ProjectDataFile.objects.create(
+                        user=member.user,
+                        file='member-files/{}/{}.json'.format(
+                            project.id_label, i),
+                        direct_sharing_project=project,
+                        completed=True)
+
+                if random.random() >= options['public_fraction']:
+                    continue
+
+                participant = member.public_data_participant
+                participant.enrolled = True
+                participant.save()
+
+                for source in random.sample(sources, len(sources) // 2):
+                    PublicDataAccess.objects.create(participant=participant,
+                                                    data_source=source,
+                                                    is_public=True)
+
+        management.call_command('update_badges', stdout=StringIO())
+
+        return members[0], projects[0], sources[0]
+
+    @staticmethod
+    def get_urls(member, project, source):
+        """
+        Return (name, method, url, data, logged in) for each URL benchmarked.
+        """
+        project_member = DataRequestProjectMember.objects.get(
+            member=member, project=project)
+
+        token = project.master_access_token
+
+        return [
+            ('home', 'get', '/', None, False),
+            ('add-data', 'get', '/add-data/', None, True),
+            ('member-list', 'get', '/members/', None, False),
+            ('member-detail', 'get',
+             '/member/{}/'.format(member.user.username), None, False),
+            ('my-member-data', 'get', '/member/me/data/', None, True),
+            ('activity-management', 'get',
+             '/activity/{}/'.format(project.slug), None, True),
+            ('public-data-list', 'get',
+             '/api/public-data/?source={}'.format(source), None, False),
+            ('public-data-members-by-source', 'get',
+             '/api/public-data/members-by-source/', None, False),
+            ('project-member-list', 'get',
+             '/api/direct-sharing/project/members/?access_token={}'.format(
+                 token), None, False),
+            ('project-direct-upload', 'post',
+             '/api/direct-sharing/project/files/upload/direct/'
+             '?access_token={}'.format(token),
+             {
+                 'project_member_id': project_member.project_member_id,
+                 'filename': 'benchmark.json',
+                 'metadata': ('{"description": "Benchmark file", '
+                              '"tags": ["benchmark"]}'),
+             }, False),
+        ]
+
+    @staticmethod
+    def measure(client, method, url, data, requests):
+        """
+        Request a URL once to warm any caches and then time `requests` more
+        requests, counting their queries.
+        """
+        request = getattr(client, method)
+
+        if data:
+            request(url, data)
+        else:
+            request(url)
+
+        latencies = []
+        queries = []
+        statuses = set()
+
+        rss_before = max_rss_kb()
+
+        for _ in range(requests):
+            with CaptureQueriesContext(connection) as context:
+                start = time.time()
+
+                if data:
+                    response = request(url, data)
+                else:
+                    response = request(url)
+
+                latencies.append((time.time() - start) * 1000)
+
+            queries.append(len(context.captured_queries))
+            statuses.add(response.status_code)
+
+        latencies.sort()
+        queries.sort()
+
+        return OrderedDict([
+            ('url', url),
+            ('method', method.upper()),
+            ('status_codes', sorted(statuses)),
+            ('requests', requests),
+            ('latency_ms', OrderedDict([
+                ('min', latencies[0]),
+                ('p50', percentile(latencies, 50)),
+                ('p90', percentile(latencies, 90)),
+                ('p99', percentile(latencies, 99)),
+                ('max', latencies[-1]),
+                ('mean', sum(latencies) / len(latencies)),
+            ])),
+            ('queries', OrderedDict([
+                ('min', queries[0]),
+                ('median', percentile(queries, 50)),
+                ('max', queries[-1]),
+            ])),
+            ('max_rss_kb', max_rss_kb()),
+            ('rss_growth_kb', max_rss_kb() - rss_before),
+        ])
+
+    def run_benchmark(self, options):
+        member, project, source = self.build_dataset(options)
+
+        anonymous = Client()
+        logged_in = Client()
+
+        logged_in.force_login(member.user)
+
+        results = OrderedDict()
+
+        for name, method, url, data, login in self.get_urls(member, project,
+                                                            source):
+            self.stdout.write('Benchmarking {}'.format(name))
+
+            results[name] = self.measure(logged_in if login else anonymous,
+                                         method, url, data,
+                                         max(options['requests'], 1))
+
+        return results
+
+    def write_results(self, results):
+        self.stdout.write('\n{:<32} {:>9} {:>9} {:>9} {:>8} {:>9}'.format(
+            'view', 'p50 ms', 'p90 ms', 'p99 ms', 'queries', 'rss +kb'))
+
+        for name, result in results.items():
+            self.stdout.write(
+                '{:<32} {:>9.1f} {:>9.1f} {:>9.1f} {:>8} {:>9}'.format(
+                    name,
+                    result['latency_ms']['p50'],
+                    result['latency_ms']['p90'],
+                    result['latency_ms']['p99'],
+                    result['queries']['median'],
+                    result['rss_growth_kb']))
+
+    def write_comparison(self, results, previous):
+        self.stdout.write('\n{:<32} {:>12} {:>12} {:>9}'.format(
+            'view', 'p50 before', 'p50 after', 'queries'))
+
+        for name, result in results.items():
+            if name not in previous:
+                continue
+
+            before = previous[name]
+
+            self.stdout.write('{:<32} {:>12.1f} {:>12.1f} {:>+9}'.format(
+                name,
+                before['latency_ms']['p50'],
+                result['latency_ms']['p50'],
+                result['queries']['median'] - before['queries']['median']))
+
+    def handle(self, *args, **options):
+        previous = None
+
+        if options['compare']:
+            try:
+                with open(options['compare']) as f:
+                    previous = json.load(f)['results']
+            except (IOError, ValueError, KeyError) as e:
+                raise CommandError('Could not read "{}": {}'.format(
+                    options['compare'], e))
+
+        random.seed(options['seed'])
+
+        setup_test_environment()
+
+        old_name = connection.creation.create_test_db(
+            verbosity=0, autoclobber=True, serialize=False,
+            keepdb=options['keepdb'])
+
+        try:
+            # don't serve pages from the page cache or talk to Mailchimp, and
+            # sign upload URLs without needing real credentials
+            with override_settings(
+                    TESTING=True,
+                    SSLIFY_DISABLE=True,
+                    CACHE_MIDDLEWARE_SECONDS=0,
+                    CACHES={
+                        'default': {
+                            'BACKEND': ('django.core.cache.backends.locmem.'
+                                        'LocMemCache'),
+                        }
+                    },
+                    AWS_ACCESS_KEY_ID=(settings.AWS_ACCESS_KEY_ID or
+                                       'benchmark'),
+                    AWS_SECRET_ACCESS_KEY=(settings.AWS_SECRET_ACCESS_KEY or
+                                           'benchmark'),
+                    AWS_STORAGE_BUCKET_NAME=(settings.AWS_STORAGE_BUCKET_NAME
+                                             or 'benchmark')):
+                results = self.run_benchmark(options)
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0,
+                                                keepdb=options['keepdb'])
+
+            teardown_test_environment()
+
+        self.write_results(results)
+
+        if previous:
+            self.write_comparison(results, previous)
+
+        if options['output']:
+            dataset = OrderedDict(
+                (key, options[key]) for key in [
+                    'members', 'files_per_source', 'projects', 'memberships',
+                    'public_fraction', 'requests', 'seed'])
+
+            with open(options['output'], 'w') as f:
+                json.dump(OrderedDict([
+                    ('created', arrow.utcnow().isoformat()),
+                    ('dataset', dataset),
+                    ('results', results),
+                ]), f, indent=2)
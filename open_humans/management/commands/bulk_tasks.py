@@ -1,15 +1,53 @@
-import random
+import os
+import threading
 import time
 
+from multiprocessing.pool import ThreadPool
+from Queue import Queue, Empty
+
+import requests
+
+from account.models import EmailAddress
+
 from django.contrib.auth import get_user_model
 from django.core.management.base import BaseCommand, CommandError
+from social.apps.django_app.default.models import UserSocialAuth
 
 from common.utils import app_label_to_user_data_model
-from data_import.processing import start_task
+from data_import.models import QueuedTask
+from data_import.processing import post_task, record_task_result, start_task
 
 UserModel = get_user_model()
 
 
+class TokenBucket(object):
+    """
+    A token bucket that allows `rate` acquisitions per second on average, with
+    bursts of up to `capacity`.
+    """
+
+    def __init__(self, rate, capacity):
+        self.rate = float(rate)
+        self.capacity = float(capacity)
+        self.tokens = self.capacity
+        self.updated = time.time()
+
+    def acquire(self):
+        while True:
+            now = time.time()
+
+            self.tokens = min(self.capacity,
+                              self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+
+            if self.tokens >= 1:
+                self.tokens -= 1
+
+                return
+
+            time.sleep((1 - self.tokens) / self.rate)
+
+
 class Command(BaseCommand):
     """
     A management command for starting tasks for a given app or app and user.
@@ -40,7 +78,90 @@ class Command(BaseCommand):
         parser.add_argument('-d', '--delay',
                             dest='delay',
                             required=False,
-                            help='Added delay (seconds) between each task.')
+                            help=('Added delay (seconds) between each task; '
+                                  'overrides --rate.'))
+
+        parser.add_argument('-r', '--rate',
+                            dest='rate',
+                            type=float,
+                            default=5,
+                            help='the maximum number of tasks sent per second')
+
+        parser.add_argument('-c', '--concurrency',
+                            dest='concurrency',
+                            type=int,
+                            default=4,
+                            help='the number of threads sending tasks')
+
+        parser.add_argument('--max-in-flight',
+                            dest='max_in_flight',
+                            type=int,
+                            help=('the maximum number of tasks being sent at '
+                                  'once; defaults to twice the concurrency'))
+
+        parser.add_argument('--checkpoint',
+                            dest='checkpoint',
+                            required=False,
+                            help=('a file recording progress; if it exists, '
+                                  'tasks resume after the last user started'))
+
+        parser.add_argument('--queue-only',
+                            dest='queue_only',
+                            action='store_true',
+                            help=('only queue the tasks and leave sending '
+                                  'them to process_task_queue'))
+
+    @staticmethod
+    def connected_user_ids(app, UserDataModel, user):
+        """
+        Yield the IDs of users connected to the app in ascending order,
+        streaming rather than loading every row at once.
+        """
+        if hasattr(UserDataModel, 'objects'):
+            data = UserDataModel.objects.all()
+
+            if user:
+                data = data.filter(user=user)
+
+            def has_data(user_data):
+                if hasattr(user_data, 'has_key_data'):
+                    return user_data.has_key_data
+
+                return user_data.is_connected
+
+            for user_data in data.order_by('user_id').iterator():
+                if has_data(user_data):
+                    yield user_data.user_id
+        else:
+            # Python Social Auth sources are connected if they have any
+            # UserSocialAuth for the provider
+            auths = UserSocialAuth.objects.filter(provider=app)
+
+            if user:
+                auths = auths.filter(user=user)
+
+            user_ids = (auths.order_by('user_id')
+                        .values_list('user_id', flat=True)
+                        .distinct())
+
+            for user_id in user_ids.iterator():
+                yield user_id
+
+    @staticmethod
+    def read_checkpoint(path):
+        if not path or not os.path.exists(path):
+            return 0
+
+        with open(path) as f:
+            return int(f.read().strip() or 0)
+
+    @staticmethod
+    def write_checkpoint(path, user_id):
+        if not path:
+            return
+
+        with open(path, 'w') as f:
+            f.write(str(user_id))
 
     def handle(self, *args, **options):
         UserDataModel = app_label_to_user_data_model(options['app'])
@@ -54,34 +175,114 @@ class Command(BaseCommand):
             raise CommandError('Could not find UserData for "{}"'
                                .format(options['app']))
 
-        if hasattr(UserDataModel, 'objects'):
-            data = UserDataModel.objects.all()
+        rate = options['rate']
 
-            if user:
-                data = data.filter(user=user)
-        else:
-            UserDataModel.user = user
-            data = UserDataModel.to_list()
+        if options['delay']:
+            rate = 1.0 / max(float(options['delay']), 0.001)
+
+        concurrency = max(options['concurrency'], 1)
+        max_in_flight = options['max_in_flight'] or concurrency * 2
+
+        bucket = TokenBucket(rate, capacity=max(rate, 1))
+        in_flight = threading.BoundedSemaphore(max_in_flight)
+        results = Queue()
+
+        thread_data = threading.local()
+
+        def post(task):
+            # requests.Session isn't guaranteed to be thread-safe so each
+            # thread keeps its own pooled session
+            if not hasattr(thread_data, 'session'):
+                thread_data.session = requests.Session()
+
+            try:
+                return task, post_task(task, session=thread_data.session)
+            except Exception as e:  # pylint: disable=broad-except
+                # the callback that frees the in-flight slot has to run
+                return task, 'Error sending task: {}'.format(e)
 
-        def has_data(user_data):
-            if hasattr(user_data, 'has_key_data'):
-                return user_data.has_key_data
+        def on_result(result):
+            results.put(result)
+            in_flight.release()
 
-            return user_data.is_connected
+        counts = {'queued': 0, 'sent': 0, 'failed': 0, 'unverified': 0,
+                  'claimed': 0}
 
-        data = list(data)
-        random.shuffle(data)
-        for user_data in [d for d in data if has_data(d)]:
-            self.stdout.write('starting task for {}'.format(
-                user_data.user.username))
+        def record_results():
+            # database writes happen on this thread only, since each thread
+            # would otherwise open its own database connection
+            while True:
+                try:
+                    task, error_message = results.get_nowait()
+                except Empty:
+                    return
 
-            if user_data.user.member.primary_email.verified:
-                start_task(user_data.user, options['app'],
-                           force=options['force'])
+                if record_task_result(task, error_message):
+                    counts['sent'] += 1
+                else:
+                    counts['failed'] += 1
 
-                print '- task was started'
+        verified_user_ids = set(EmailAddress.objects
+                                .filter(primary=True, verified=True)
+                                .values_list('user_id', flat=True))
+
+        checkpoint = self.read_checkpoint(options['checkpoint'])
+
+        if checkpoint:
+            self.stdout.write('resuming after user {}'.format(checkpoint))
+
+        pool = None if options['queue_only'] else ThreadPool(concurrency)
+        start = time.time()
+
+        for user_id in self.connected_user_ids(options['app'],
+                                               UserDataModel, user):
+            if user_id <= checkpoint:
+                continue
+
+            if user_id not in verified_user_ids:
+                counts['unverified'] += 1
             else:
-                print '- task was not started (unverified email)'
+                task = start_task(user_id, options['app'],
+                                  force=options['force'])
+                counts['queued'] += 1
+
+                # claim the task first so that process_task_queue doesn't
+                # send it too; a deduplicated task may already be claimed
+                if pool:
+                    task = QueuedTask.objects.claim_task(task)
+
+                if not task:
+                    counts['claimed'] += 1
+                elif pool:
+                    bucket.acquire()
+                    in_flight.acquire()
+
+                    pool.apply_async(post, (task,), callback=on_result)
+
+                    record_results()
+
+            self.write_checkpoint(options['checkpoint'], user_id)
+
+            total = counts['queued'] + counts['unverified']
+
+            if total % 100 == 0:
+                self.stdout.write('{} users processed ({} sent, {} failed)'
+                                  .format(total, counts['sent'],
+                                          counts['failed']))
+
+        if pool:
+            pool.close()
+            pool.join()
+
+            record_results()
+
+        elapsed = time.time() - start
 
-            if options['delay']:
-                time.sleep(int(options['delay']))
+        self.stdout.write(
+            'done: {queued} queued, {sent} sent, {failed} failed, '
+            '{claimed} already being sent, {unverified} skipped '
+            '(unverified email) in {elapsed:.1f}s '
+            '({throughput:.1f} tasks/s)'.format(
+                elapsed=elapsed,
+                throughput=counts['queued'] / elapsed if elapsed else 0,
+                **counts))
@@ -0,0 +1,38 @@
+import json
+
+from django.core.management.base import BaseCommand
+
+from open_humans.instrumentation import clear_samples, get_samples, summarize
+
+
+class Command(BaseCommand):
+    """
+    Print the sampled per-view query counts and timings recorded by
+    InstrumentationMiddleware.
+    """
+
+    help = 'Dump the sampled per-view query counts and timings'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--raw',
+                            dest='raw',
+                            action='store_true',
+                            help='print the samples rather than a summary')
+
+        parser.add_argument('--clear',
+                            dest='clear',
+                            action='store_true',
+                            help='empty the sample buffer after printing')
+
+    def handle(self, *args, **options):
+        samples = get_samples()
+
+        if options['raw']:
+            output = samples
+        else:
+            output = summarize(samples)
+
+        self.stdout.write(json.dumps(output, indent=2))
+
+        if options['clear']:
+            clear_samples()
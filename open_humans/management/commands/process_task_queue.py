@@ -0,0 +1,68 @@
+import time
+
+import requests
+
+from django.core.management.base import BaseCommand
+
+from data_import.models import QueuedTask
+from data_import.processing import send_task
+
+
+class Command(BaseCommand):
+    """
+    A management command for sending queued tasks to data-processing.
+    """
+
+    help = 'Send queued data processing tasks'
+
+    def add_arguments(self, parser):
+        parser.add_argument('-b', '--batch-size',
+                            dest='batch_size',
+                            type=int,
+                            default=50,
+                            help='the number of tasks to send per batch')
+
+        parser.add_argument('-s', '--sleep',
+                            dest='sleep',
+                            type=int,
+                            default=5,
+                            help='seconds to wait when the queue is empty')
+
+        parser.add_argument('--once',
+                            dest='once',
+                            action='store_true',
+                            help='exit once the queue is empty')
+
+    def send_batch(self, session, batch_size):
+        """
+        Send a batch of due tasks, returning the number of tasks attempted.
+
+        The batch is claimed first so that a second worker doesn't send the
+        same tasks, and then sent without holding any row locks.
+        """
+        tasks = QueuedTask.objects.claim(batch_size)
+
+        for task in tasks:
+            if send_task(task, session=session):
+                self.stdout.write('- sent {} for user {}'.format(
+                    task.source, task.user_id))
+            else:
+                self.stdout.write('- failed {} for user {} (attempt {})'
+                                  .format(task.source, task.user_id,
+                                          task.attempts))
+
+        return len(tasks)
+
+    def handle(self, *args, **options):
+        session = requests.Session()
+
+        while True:
+            sent = self.send_batch(session, options['batch_size'])
+
+            if sent:
+                continue
+
+            if options['once']:
+                break
+
+            time.sleep(options['sleep'])
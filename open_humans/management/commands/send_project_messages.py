@@ -0,0 +1,88 @@
+import time
+
+from django.core.mail import get_connection
+from django.core.management.base import BaseCommand
+
+from private_sharing.messaging import send_chunk
+from private_sharing.models import ProjectMessage
+
+
+class Command(BaseCommand):
+    """
+    A management command for delivering queued project messages.
+    """
+
+    help = 'Send queued project messages to project members'
+
+    def add_arguments(self, parser):
+        parser.add_argument('-c', '--chunk-size',
+                            dest='chunk_size',
+                            type=int,
+                            default=100,
+                            help=('the number of emails sent per '
+                                  'connection use'))
+
+        parser.add_argument('-r', '--rate',
+                            dest='rate',
+                            type=float,
+                            default=600,
+                            help='the maximum emails per minute per project')
+
+        parser.add_argument('-s', '--sleep',
+                            dest='sleep',
+                            type=int,
+                            default=5,
+                            help='seconds to wait when the queue is empty')
+
+        parser.add_argument('--once',
+                            dest='once',
+                            action='store_true',
+                            help='exit once the queue is empty')
+
+    def handle(self, *args, **options):
+        connection = get_connection()
+
+        # the earliest time each project may send its next chunk
+        next_send = {}
+
+        while True:
+            project_messages = (ProjectMessage.objects
+                                .filter(status__in=[ProjectMessage.QUEUED,
+                                                    ProjectMessage.SENDING])
+                                .select_related('project')
+                                .order_by('created'))
+
+            sent_any = False
+            throttled = False
+
+            for project_message in project_messages:
+                if next_send.get(project_message.project_id, 0) > time.time():
+                    throttled = True
+
+                    continue
+
+                count = send_chunk(project_message, connection,
+                                   chunk_size=options['chunk_size'])
+
+                if count:
+                    self.stdout.write('- {}: {} sent, {} failed'.format(
+                        project_message.project.slug,
+                        project_message.sent_count,
+                        project_message.failed_count))
+
+                    next_send[project_message.project_id] = (
+                        time.time() + count * 60.0 / options['rate'])
+
+                sent_any = True
+
+            if sent_any:
+                continue
+
+            if throttled:
+                time.sleep(1)
+            elif options['once']:
+                break
+            else:
+                time.sleep(options['sleep'])
+
+        connection.close()
@@ -2,19 +2,16 @@
 
 import arrow
 
-from django.contrib.auth import get_user_model
 from django.core.management.base import BaseCommand
 
-from termcolor import colored
-
-from open_humans.models import Member
-
-UserModel = get_user_model()
+from open_humans.statistics import (CONNECTIONS, PROJECT_JOINS,
+                                    PUBLIC_SHARED, PUBLIC_UNSHARED, SIGNUPS,
+                                    VERIFIED_EMAILS, daily_statistics)
 
 
 class Command(BaseCommand):
     """
-    Generate signup codes.
+    Print daily statistics from the DailyStatistic rollups.
     """
 
     help = 'Statistics on the last day(s) of users'
@@ -24,39 +21,30 @@ class Command(BaseCommand):
         parser.add_argument('--days', nargs='?', type=int, default=1,
                             help='the number of days to show')
 
+    @staticmethod
+    def format_labels(counts):
+        return ', '.join('{} {}'.format(label, count)
+                         for label, count in sorted(counts.items()))
+
     def handle(self, *args, **options):
         day_offset = options['days'] - 1
 
-        end = arrow.now().span('day')[1]
-        start = end.replace(days=-day_offset).span('day')[0]
+        end = arrow.utcnow().date()
+        start = arrow.utcnow().replace(days=-day_offset).date()
 
-        users = (UserModel.objects.all()
-                 .filter(date_joined__range=[start.datetime, end.datetime])
-                 .order_by('date_joined'))
-
-        for user in users:
+        for date, metrics in daily_statistics(start, end).items():
             self.stdout.write(
-                '{} ({})'.format(
-                    user.username,
-                    arrow.get(user.date_joined).format('YYYY-MM-DD')))
-
-            try:
-                for key, connection in user.member.connections.items():
-                    suffix = 'no key data'
-
-                    data = getattr(user, key).get_retrieval_params()
-
-                    if key == 'pgp' and 'huID' in data:
-                        suffix = data['huID']
-
-                    if key == 'runkeeper' and 'access_token' in data:
-                        suffix = 'access token present'
-
-                    self.stdout.write(u'  {}: {} {}'.format(
-                        connection['verbose_name'],
-                        colored(u'✔', 'green'),
-                        suffix))
-            except Member.DoesNotExist:
-                pass
+                '{}: {} signups, {} verified emails'.format(
+                    date.strftime('%Y-%m-%d'),
+                    metrics[SIGNUPS].get('', 0),
+                    metrics[VERIFIED_EMAILS].get('', 0)))
+
+            for title, metric in (('connections', CONNECTIONS),
+                                  ('project joins', PROJECT_JOINS),
+                                  ('made public', PUBLIC_SHARED),
+                                  ('made private', PUBLIC_UNSHARED)):
+                if metrics[metric]:
+                    self.stdout.write('  {}: {}'.format(
+                        title, self.format_labels(metrics[metric])))
 
             self.stdout.write('')
@@ -4,7 +4,6 @@ import arrow
 
 from django.contrib.auth import get_user_model
 from django.core.management.base import BaseCommand
-from django.db.models import Count
 
 from termcolor import colored
 
@@ -26,19 +25,17 @@ class Command(BaseCommand):
         cutoff = arrow.get(options['date']).datetime
 
         members = Member.objects.filter(user__date_joined__lte=cutoff)
-        members_with_data = members.annotate(
-            datafiles_count=Count('user__datafiles')).filter(
-            datafiles_count__gte=1)
+        members_with_data = members.filter(
+            user__datafiles__isnull=False).distinct()
         files = DataFile.objects.exclude(archived__lte=cutoff).filter(
             created__lte=cutoff)
         projects_made = DataRequestProject.objects.filter(created__lte=cutoff)
         projects_approved = projects_made.filter(approved=True)
 
-        data_connections = set([(
-            df['source'], df['user__username']) for
-            df in DataFile.objects.exclude(
-            archived__lte=cutoff).filter(
-            created__lte=cutoff).values('user__username', 'source')])
+        # counted in the database rather than by loading every file
+        data_connections = (files.order_by()
+                            .values('user_id', 'source')
+                            .distinct())
 
         proj_connections = DataRequestProjectMember.objects.exclude(
             project__approved=False).exclude(joined=False).exclude(
@@ -47,7 +44,7 @@ class Command(BaseCommand):
         print("Members: {}".format(members.count()))
         print("Members with any data connections: {}".format(
             members_with_data.count()))
-        print("Data connections: {}".format(len(data_connections)))
+        print("Data connections: {}".format(data_connections.count()))
         print("Project connections: {}".format(proj_connections.count()))
         print("Projects drafted: {}".format(projects_made.count()))
         print("Projects approved: {}".format(projects_approved.count()))
@@ -1,46 +1,88 @@
 from django.core.management.base import BaseCommand
 
-from common.activities import personalize_activities_dict
-
+from common.activities import badge_counts
+from open_humans.badges import (aggregate_badge_counts, compute_badges,
+                                get_badge_data, get_project_labels,
+                                rebuild_badge_counts, set_member_badges,
+                                set_member_connections)
 from open_humans.models import Member
 
 
 class Command(BaseCommand):
     """
-    A management command for updating all user badges.
+    A management command for reconciling all user badges and connections.
+
+    Badges and connections are normally kept up to date by signal handlers
+    (see open_humans.badges); this recomputes them in chunks, only writes the
+    members whose badges or connections differ, and then repairs the badge
+    counts.
     """
 
     help = 'Update badges for all users'
 
+    def add_arguments(self, parser):
+        parser.add_argument('-c', '--chunk-size',
+                            dest='chunk_size',
+                            type=int,
+                            default=500,
+                            help='the number of members loaded at once')
+
+        parser.add_argument('--verify',
+                            dest='verify',
+                            action='store_true',
+                            help=('only report members whose badges are out '
+                                  'of date, without updating them'))
+
     def handle(self, *args, **options):
         self.stdout.write('Updating badges')
 
-        badge_data = {k: v['badge']
-                      for k, v in personalize_activities_dict(
-                      only_active=False).items()}
+        badge_data = get_badge_data()
+
+        chunk_size = max(options['chunk_size'], 1)
+
+        checked = 0
+        changed = 0
+        last_pk = 0
+
+        while True:
+            members = list(Member.enriched
+                           .filter(pk__gt=last_pk)
+                           .order_by('pk')[:chunk_size])
+
+            if not members:
+                break
+
+            last_pk = members[-1].pk
+
+            project_labels = get_project_labels(
+                [member.pk for member in members])
 
-        for member in Member.enriched.all():
-            self.stdout.write('- {0}'.format(member.user.username))
+            for member in members:
+                connected_sources = member.get_connected_sources()
+                badges = compute_badges(member, badge_data,
+                                        project_labels[member.pk],
+                                        connected_sources)
 
-            member.badges = []
+                checked += 1
 
-            # Badges for activities and deeply integrated studies, e.g. PGP,
-            # RunKeeper
-            for label, _ in member.connections.items():
-                member.badges.append(badge_data[label])
+                if (badges == member.badges and
+                        connected_sources == member.connected_sources):
+                    continue
 
-            project_memberships = (member.datarequestprojectmember_set
-                                   .filter(project__approved=True)
-                                   .filter_active())
+                changed += 1
 
-            # Badges for DataRequestProjects
-            for membership in project_memberships:
-                member.badges.append(badge_data[membership.project.id_label])
+                self.stdout.write('- {0}'.format(member.user.username))
 
-            # The badge for the Public Data Sharing Study
-            if member.public_data_participant.enrolled:
-                member.badges.append(badge_data['public_data_sharing'])
+                if not options['verify']:
+                    set_member_connections(member, connected_sources)
+                    set_member_badges(member, badges)
 
-            member.save()
+        if options['verify']:
+            if badge_counts() != aggregate_badge_counts():
+                self.stdout.write('Badge counts are out of date')
+        else:
+            rebuild_badge_counts()
 
-        self.stdout.write('Done')
+        self.stdout.write('Done: {} of {} members {}'.format(
+            changed, checked,
+            'out of date' if options['verify'] else 'updated'))
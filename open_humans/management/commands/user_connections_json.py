@@ -1,74 +1,261 @@
 import json
-import itertools
+import os
 
-from django.core.management.base import BaseCommand
+import arrow
+
+from account.models import EmailAddress
+
+from django.core.management.base import BaseCommand, CommandError
 
 from common.utils import get_source_labels
-from data_import.models import DataFile, is_public
-from open_humans.models import Member
+from data_import.models import DataFile
+from open_humans.models import Member, UserEvent
+from private_sharing.models import ActivityFeed
+from public_data.models import PublicSource
 
 
-def flatten(l):
+class PreviousOutput(object):
     """
-    Flatten a 2-dimensional list.
+    A read-only {username: member_data} mapping backed by an earlier output
+    file.
+
+    Only the offset of each member's data is kept in memory; the data itself
+    is read and parsed when it's looked up. This relies on the file having
+    been written by Command.write_members_data (or json.dump with indent=2),
+    where each member starts on a line indented by two spaces and ends with
+    a line that is just a closing brace at that indentation.
     """
-    return list(itertools.chain.from_iterable(l))
+
+    def __init__(self, f):
+        self.f = f
+        self.index = {}
+
+        decoder = json.JSONDecoder()
+        offset = 0
+        username = None
+
+        for line in iter(f.readline, ''):
+            if line.startswith('  "'):
+                username, end = decoder.raw_decode(line, 2)
+                start = offset + end + len(': ')
+                value = line[end + len(': '):].rstrip('\n').rstrip(',')
+
+                # an object on one line, e.g. "{}"
+                if value != '{':
+                    self.index[username] = (start, len(value))
+                    username = None
+            elif username is not None and line.rstrip('\n') in ('  }',
+                                                                '  },'):
+                self.index[username] = (start, offset + len('  }') - start)
+                username = None
+
+            offset += len(line)
+
+    def __contains__(self, username):
+        return username in self.index
+
+    def __getitem__(self, username):
+        start, length = self.index[username]
+
+        self.f.seek(start)
+
+        return json.loads(self.f.read(length))
 
 
 class Command(BaseCommand):
     """
-    Return list of users matching a particular flag.
+    Write a JSON file describing each member's connections, files and public
+    sharing by source.
+
+    The data is gathered with a few grouped queries per chunk of members and
+    written out one member at a time, so the run time and memory use don't
+    depend on the number of sources.
     """
 
     def add_arguments(self, parser):
         parser.add_argument('outputfile')
 
+        parser.add_argument('-c', '--chunk-size',
+                            dest='chunk_size',
+                            type=int,
+                            default=1000,
+                            help='the number of members loaded at once')
+
+        parser.add_argument('--since',
+                            dest='since',
+                            help=('only recompute members who joined, added '
+                                  'files or had activity since this date, '
+                                  'reusing the rest from the existing '
+                                  'outputfile'))
+
     @staticmethod
-    def get_member_data(member):
-        member_data = {}
+    def changed_user_ids(since):
+        """
+        Return the IDs of users with any recorded change since a date.
+        """
+        user_ids = set(Member.objects
+                       .filter(user__date_joined__gte=since)
+                       .values_list('user_id', flat=True))
+
+        user_ids.update(DataFile.objects
+                        .filter(created__gte=since)
+                        .values_list('user_id', flat=True)
+                        .distinct())
+
+        user_ids.update(UserEvent.objects
+                        .filter(timestamp__gte=since)
+                        .values_list('user_id', flat=True)
+                        .distinct())
+
+        user_ids.update(ActivityFeed.objects
+                        .filter(timestamp__gte=since)
+                        .values_list('member__user_id', flat=True)
+                        .distinct())
+
+        return user_ids
+
+    @staticmethod
+    def get_chunk_data(members):
+        """
+        Return a dictionary of {username: member_data} for a chunk of member
+        rows, using one query each for files, public sources and emails.
+        """
+        user_ids = [member[0] for member in members]
+
+        file_sources = set(DataFile.objects
+                           .filter(user_id__in=user_ids)
+                           .order_by()
+                           .values_list('user_id', 'source')
+                           .distinct())
 
-        for source in get_source_labels():
-            userdata = getattr(member.user, source)
-            is_connected = bool(userdata.is_connected)
+        public_sources = set(PublicSource.objects
+                             .filter(user_id__in=user_ids)
+                             .values_list('user_id', 'source'))
 
-            has_files, source_is_public = (False, False)
+        verified_emails = dict(EmailAddress.objects
+                               .filter(user_id__in=user_ids, primary=True)
+                               .values_list('user_id', 'verified'))
 
-            # Check for files.
-            has_files = DataFile.objects.filter(user=member.user,
-                                                source=source).count() > 0
+        sources = get_source_labels()
+        chunk_data = {}
 
-            # Check public sharing.
-            if is_connected:
-                source_is_public = is_public(member, source)
+        for (user_id, username, date_joined, connected_sources,
+             enrolled) in members:
+            # connections are read from the connected sources kept up to date
+            # by open_humans.badges rather than from each source's UserData
+            connected = set(connected_sources or [])
 
-            member_data[source] = {
-                'is_connected': is_connected,
-                'has_files': has_files,
-                'is_public': source_is_public,
-            }
+            member_data = {}
 
-        member_data['date_joined'] = member.user.date_joined.strftime(
-            '%Y%m%dT%H%M%SZ')
+            for source in sources:
+                is_connected = source in connected
 
-        if member.primary_email:
-            member_data['email_verified'] = member.primary_email.verified
-        else:
-            member_data['email_verified'] = False
+                member_data[source] = {
+                    'is_connected': is_connected,
+                    'has_files': (user_id, source) in file_sources,
+                    'is_public': (is_connected and
+                                  (user_id, source) in public_sources),
+                }
 
-        member_data['public_data_participant'] = (
-            member.public_data_participant.enrolled)
+            member_data['date_joined'] = date_joined.strftime(
+                '%Y%m%dT%H%M%SZ')
+            member_data['email_verified'] = verified_emails.get(user_id,
+                                                                False)
+            member_data['public_data_participant'] = bool(enrolled)
 
-        return member_data
+            chunk_data[username] = member_data
 
-    def get_members_data(self):
-        members = Member.enriched.all().exclude(
-            user__username='api-administrator')
+        return chunk_data
 
-        return {member.user.username: self.get_member_data(member)
-                for member in members}
+    def get_members_data(self, chunk_size, changed=None, previous=None):
+        """
+        Yield (username, member_data) for each member ordered by username.
+
+        If changed is given, only those user IDs are recomputed and every
+        other member's data is taken from previous, a PreviousOutput.
+        """
+        previous = previous or {}
+
+        members = (Member.objects
+                   .exclude(user__username='api-administrator')
+                   .order_by('user__username')
+                   .values_list('user_id', 'user__username',
+                                'user__date_joined', 'connected_sources',
+                                'public_data_participant__enrolled'))
+
+        last_username = ''
+
+        while True:
+            chunk = list(members.filter(
+                user__username__gt=last_username)[:chunk_size])
+
+            if not chunk:
+                return
+
+            last_username = chunk[-1][1]
+
+            stale = [member for member in chunk
+                     if changed is None or member[0] in changed or
+                     member[1] not in previous]
+
+            chunk_data = self.get_chunk_data(stale) if stale else {}
+
+            for member in chunk:
+                username = member[1]
+
+                if username in chunk_data:
+                    yield username, chunk_data[username]
+                else:
+                    yield username, previous[username]
+
+    @staticmethod
+    def write_members_data(f, members_data):
+        """
+        Write a JSON object of {username: member_data} one member at a time,
+        formatted as json.dump(..., sort_keys=True, indent=2) would.
+        """
+        separator = '{\n'
+
+        for username, member_data in members_data:
+            f.write(separator)
+            f.write('  {}: {}'.format(
+                json.dumps(username),
+                json.dumps(member_data, sort_keys=True, indent=2,
+                           separators=(',', ': ')).replace('\n', '\n  ')))
+
+            separator = ',\n'
+
+        f.write('\n}' if separator == ',\n' else '{}')
 
     def handle(self, *args, **options):
-        data = self.get_members_data()
+        chunk_size = max(options['chunk_size'], 1)
+        outputfile = options['outputfile']
+
+        if not options['since']:
+            with open(outputfile, 'w') as f:
+                self.write_members_data(f, self.get_members_data(chunk_size))
+
+            return
+
+        changed = self.changed_user_ids(arrow.get(options['since']).datetime)
+
+        try:
+            previous_file = open(outputfile, 'rb')
+        except IOError as e:
+            raise CommandError('--since needs the previous output in "{}": {}'
+                               .format(outputfile, e))
+
+        with previous_file:
+            try:
+                previous = PreviousOutput(previous_file)
+            except ValueError as e:
+                raise CommandError('Could not read "{}": {}'.format(
+                    outputfile, e))
+
+            # write alongside and then replace, since the previous output is
+            # the input
+            with open(outputfile + '.tmp', 'w') as f:
+                self.write_members_data(f, self.get_members_data(
+                    chunk_size, changed=changed, previous=previous))
 
-        with open(options['outputfile'], 'w') as f:
-            json.dump(data, f, sort_keys=True, indent=2)
+        os.rename(outputfile + '.tmp', outputfile)
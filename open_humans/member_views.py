@@ -24,6 +24,7 @@ from common.utils import get_activities, get_studies
 from data_import.models import DataFile
 from private_sharing.models import app_label_to_verbose_name_including_dynamic
 
+from .badges import update_member_badges
 from .forms import (EmailUserForm,
                     MemberChangeNameForm,
                     MemberContactSettingsEditForm,
@@ -67,10 +68,12 @@ class MemberListView(ListView):
     template_name = 'member/member-list.html'
 
     def get_queryset(self):
+        # Sort by number of badges; the member_badge_count_order index covers
+        # this ordering so a page is read without sorting the whole table
         queryset = (Member.objects
                     .select_related('user')
                     .exclude(user__username='api-administrator')
-                    .order_by('user__username'))
+                    .order_by('-badge_count', 'pk'))
 
         if self.request.GET.get('filter'):
             activities = personalize_activities()
@@ -82,15 +85,11 @@ class MemberListView(ListView):
             if not badge_exists:
                 raise Http404()
 
+            # uses the member_badges_gin index
             queryset = queryset.filter(
                 badges__contains=[{'label': filter_name}])
 
-        # Sort by number of badges
-        sorted_members = sorted(queryset,
-                                key=lambda m: len(m.badges),
-                                reverse=True)
-
-        return sorted_members
+        return queryset
 
     def get_context_data(self, **kwargs):
         """
@@ -281,8 +280,25 @@ class MemberConnectionDeleteView(PrivateMixin, TemplateView):
 
     template_name = 'member/my-member-connections-delete.html'
 
+    def get_connections(self, connection):
+        """
+        Return the member's connections, checking the sources themselves and
+        repairing the stored ones if they don't include connection.
+        """
+        member = self.request.user.member
+        connections = member.connections
+
+        if connection and connection not in connections:
+            # connected_sources may be out of date, e.g. for a member whose
+            # badges were never computed
+            update_member_badges(member)
+
+            connections = member.connections
+
+        return connections
+
     def get_access_tokens(self, connection):
-        connections = self.request.user.member.connections
+        connections = self.get_connections(connection)
 
         if connection not in connections:
             raise Http404()
@@ -320,7 +336,7 @@ class MemberConnectionDeleteView(PrivateMixin, TemplateView):
 
     def post(self, request, **kwargs):
         connection = kwargs.get('connection')
-        connections = self.request.user.member.connections
+        connections = self.get_connections(connection)
 
         if not connection or connection not in connections:
             if 'next' in self.request.GET:
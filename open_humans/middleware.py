@@ -1,4 +1,5 @@
 import logging
+import time
 
 from urlparse import urljoin
 
@@ -7,7 +8,9 @@ from django.core import urlresolvers
 from django.http import HttpResponseRedirect
 from django.utils.http import urlencode
 
-from data_import.models import is_public
+from private_sharing.utilities import SourceLookup, set_source_lookup
+from . import instrumentation
+from .interstitials import INTERSTITIALS, get_interstitial
 from .models import Member
 
 logger = logging.getLogger(__name__)
@@ -89,48 +92,39 @@ class RedirectStagingToProductionMiddleware(object):
         return get_production_redirect(request)
 
 
-class PGPInterstitialRedirectMiddleware(object):
+class InterstitialRedirectMiddleware(object):
     """
-    Redirect users with more than 1 private PGP datasets and zero public
-    datasets to an interstitial page exactly one time.
+    Redirect members to any one-time interstitial page they haven't seen yet
+    (see open_humans.interstitials). Must come after AddMemberMiddleware.
     """
 
     # pylint: disable=unused-argument
     @staticmethod
     def process_view(request, view_func, *view_args, **view_kwargs):
-        if request.user.is_anonymous():
+        if not getattr(request, 'member', None):
             return
 
+        # Don't redirect if user is already on an interstitial.
         try:
-            request.user.member
-        except Member.DoesNotExist:
-            return
-
-        if 'pgp' not in request.user.member.connections:
-            return
-
-        if request.user.member.seen_pgp_interstitial:
-            return
-
-        # Don't redirect if user is already on the intended interstitial.
-        try:
-            if request.resolver_match.url_name == 'pgp-interstitial':
+            if request.resolver_match.url_name in INTERSTITIALS:
                 return
         except AttributeError:
             pass
 
         # Try gently, give up if this breaks.
         try:
-            if not is_public(request.user.member, 'pgp'):
-                url = '{}?{}'.format(
-                    urlresolvers.reverse('pgp-interstitial'),
-                    urlencode({'next': request.get_full_path()}))
-                return HttpResponseRedirect(url)
-            else:
-                request.user.member.seen_pgp_interstitial = True
-                request.user.member.save()
+            url_name = get_interstitial(request)
         except:  # pylint: disable=bare-except
-            pass
+            logger.exception('Could not check interstitials')
+
+            return
+
+        if url_name:
+            url = '{}?{}'.format(
+                urlresolvers.reverse(url_name),
+                urlencode({'next': request.get_full_path()}))
+
+            return HttpResponseRedirect(url)
 
 
 class AddMemberMiddleware(object):
@@ -148,3 +142,66 @@ class AddMemberMiddleware(object):
             request.member = request.user.member
         except (Member.DoesNotExist, AttributeError):
             request.member = None
+
+
+class SourceLookupMiddleware(object):
+    """
+    Give each request its own SourceLookup so that source names, URL slugs and
+    badges are looked up at most once per request.
+    """
+
+    @staticmethod
+    def process_request(request):
+        request.source_lookup = SourceLookup()
+
+        set_source_lookup(request.source_lookup)
+
+    @staticmethod
+    def process_response(request, response):
+        set_source_lookup(None)
+
+        return response
+
+    @staticmethod
+    def process_exception(request, exception):
+        set_source_lookup(None)
+
+
+class InstrumentationMiddleware(object):
+    """
+    Record query counts and timings for a sample of requests (see
+    open_humans.instrumentation).
+    """
+
+    @staticmethod
+    def process_request(request):
+        if settings.INSTRUMENTATION_SAMPLE_RATE:
+            instrumentation.start_sample(request)
+
+    # pylint: disable=unused-argument
+    @staticmethod
+    def process_view(request, view_func, *view_args, **view_kwargs):
+        try:
+            instrumentation.set_view_name(request.resolver_match.view_name)
+        except AttributeError:
+            pass
+
+    @staticmethod
+    def process_template_response(request, response):
+        if instrumentation.current_sample() is None:
+            return response
+
+        start = time.time()
+
+        def rendered(response):
+            instrumentation.add_timing('template', time.time() - start)
+
+        response.add_post_render_callback(rendered)
+
+        return response
+
+    @staticmethod
+    def process_response(request, response):
+        instrumentation.finish_sample(response.status_code)
+
+        return response
@@ -0,0 +1,39 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.9.9 on 2026-10-18 12:00
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+def populate_badge_counts(apps, schema_editor):
+    """
+    Count the badges members already hold.
+    """
+    schema_editor.execute("""
+        INSERT INTO open_humans_badgecount (label, count)
+        SELECT badge->>'label', COUNT(*)
+        FROM open_humans_member, jsonb_array_elements(badges) AS badge
+        WHERE jsonb_typeof(badges) = 'array'
+          AND badge->>'label' IS NOT NULL
+        GROUP BY badge->>'label'
+    """)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('open_humans', '0007_blogpost'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BadgeCount',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('label', models.CharField(max_length=100, unique=True)),
+                ('count', models.IntegerField(default=0)),
+            ],
+        ),
+        migrations.RunPython(populate_badge_counts,
+                             migrations.RunPython.noop),
+    ]
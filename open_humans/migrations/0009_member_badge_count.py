@@ -0,0 +1,36 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.9.9 on 2026-10-18 12:00
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+populate_sql = """UPDATE open_humans_member
+                  SET badge_count = jsonb_array_length(badges)
+                  WHERE jsonb_typeof(badges) = 'array';"""
+
+# the member list is ordered by -badge_count, id and filtered with
+# badges @> '[{"label": ...}]'
+forward_sql = """CREATE INDEX member_badge_count_order
+                 ON open_humans_member (badge_count DESC, id);
+                 CREATE INDEX member_badges_gin
+                 ON open_humans_member USING GIN (badges jsonb_path_ops);"""
+
+reverse_sql = """DROP INDEX member_badge_count_order;
+                 DROP INDEX member_badges_gin;"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('open_humans', '0008_badgecount'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='member',
+            name='badge_count',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.RunSQL(populate_sql, migrations.RunSQL.noop),
+        migrations.RunSQL(forward_sql, reverse_sql),
+    ]
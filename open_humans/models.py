@@ -9,7 +9,7 @@ from bs4 import BeautifulSoup
 from django.apps import apps
 from django.conf import settings
 from django.contrib.auth.models import AbstractUser, UserManager
-from django.contrib.postgres.fields import JSONField
+from django.contrib.postgres.fields import ArrayField, JSONField
 from django.db import models
 from django.db.models import Prefetch, Q
 
@@ -155,6 +155,15 @@ class Member(models.Model):
         default=random_member_id)
     seen_pgp_interstitial = models.BooleanField(default=False)
     badges = JSONField(default=dict)
+    # the length of badges, kept in sync by open_humans.badges so that the
+    # member list can be sorted and paginated by an index (see migration
+    # 0009_member_badge_count)
+    badge_count = models.IntegerField(default=0)
+    # the labels of the sources the member is connected to, kept in sync by
+    # open_humans.badges so that connections don't query every source
+    connected_sources = ArrayField(models.CharField(max_length=100),
+                                   blank=True,
+                                   default=list)
 
     def __unicode__(self):
         return unicode(self.user)
@@ -167,23 +176,18 @@ class Member(models.Model):
         """
         return AccountEmailAddress.objects.get_primary(self.user)
 
-    @property
-    def connections(self):
+    @staticmethod
+    def connection_app_configs():
         """
-        Return a list of dicts containing activity and study connection
-        information. Connections represent data import relationships
-        (i.e., Open Humans is receiving data from this source).
+        Yield (app_config, connection_type) for each app that members can
+        connect to.
         """
-        connections = {}
-
         prefix_to_type = {
             'studies': 'study',
             'activities': 'activity'
         }
 
-        app_configs = apps.get_app_configs()
-
-        for app_config in app_configs:
+        for app_config in apps.get_app_configs():
             if '.' not in app_config.name:
                 continue
 
@@ -197,24 +201,92 @@ class Member(models.Model):
             if app_config.label == 'go_viral':
                 continue
 
+            yield app_config, connection_type
+
+    def get_connected_sources(self):
+        """
+        Check each source and return the labels of those the member is
+        connected to, ordered by verbose name.
+
+        This queries the sources that aren't preloaded by the EnrichedManager;
+        use connected_sources to read the stored result instead.
+        """
+        connected = []
+
+        for app_config, _ in self.connection_app_configs():
             # all of the is_connected methods are written in a way that they
             # work against the cached QuerySet of the EnrichedManager
-            connected = getattr(self.user, app_config.label).is_connected
-
-            # If connected, add to the dict.
-            if connected:
-                connections[app_config.label] = {
-                    'type': connection_type,
-                    'verbose_name': app_config.verbose_name,
-                    'label': app_config.label,
-                    'name': app_config.name,
-                    'disconnectable': app_config.disconnectable,
-                }
+            if getattr(self.user, app_config.label).is_connected:
+                connected.append(app_config)
+
+        return [app_config.label for app_config
+                in sorted(connected, key=lambda x: x.verbose_name)]
+
+    @property
+    def connections(self):
+        """
+        Return a list of dicts containing activity and study connection
+        information. Connections represent data import relationships
+        (i.e., Open Humans is receiving data from this source).
+
+        These are read from connected_sources without querying the sources.
+        """
+        connections = {}
+
+        for app_config, connection_type in self.connection_app_configs():
+            if app_config.label not in self.connected_sources:
+                continue
+
+            connections[app_config.label] = {
+                'type': connection_type,
+                'verbose_name': app_config.verbose_name,
+                'label': app_config.label,
+                'name': app_config.name,
+                'disconnectable': app_config.disconnectable,
+            }
 
         return OrderedDict(sorted(connections.items(),
                                   key=lambda x: x[1]['verbose_name']))
 
 
+class BadgeCount(models.Model):
+    """
+    The number of members holding each badge.
+
+    This is kept up to date by open_humans.badges as members' badges change,
+    so that the counts can be read without scanning every Member.
+    """
+
+    label = models.CharField(max_length=100, unique=True)
+    count = models.IntegerField(default=0)
+
+    def __unicode__(self):
+        return '{}: {}'.format(self.label, self.count)
+
+
+class DailyStatistic(models.Model):
+    """
+    The count of one kind of site activity on one day, e.g. signups or new
+    connections to a source.
+
+    These are kept up to date from UserEvent and ActivityFeed rows by
+    open_humans.statistics, so that reports don't walk every user.
+    """
+
+    date = models.DateField()
+    metric = models.CharField(max_length=32)
+    # e.g. the source for connections, empty for site-wide metrics
+    label = models.CharField(max_length=100, blank=True)
+    count = models.IntegerField(default=0)
+
+    class Meta:  # noqa: D101
+        unique_together = ('date', 'metric', 'label')
+
+    def __unicode__(self):
+        return '{}:{}:{}: {}'.format(self.date, self.metric, self.label,
+                                     self.count)
+
+
 class EmailMetadata(models.Model):
     """
     Metadata about email correspondence sent from a user's profile page.
@@ -83,6 +83,19 @@ INCOMPLETE_FILE_EXPIRATION_HOURS = 6
 if os.getenv('CI_NAME') == 'codeship':
     DISABLE_CACHING = True
 
+# The fraction of requests for which query counts and timings are recorded
+# (see open_humans.instrumentation), and how many recent samples are kept
+INSTRUMENTATION_SAMPLE_RATE = float(
+    os.getenv('INSTRUMENTATION_SAMPLE_RATE', 0))
+INSTRUMENTATION_BUFFER_SIZE = int(
+    os.getenv('INSTRUMENTATION_BUFFER_SIZE', 500))
+
+# The maximum number of queries for a sampled request to a view, by view name;
+# '*' applies to every other view
+QUERY_BUDGETS = {
+    '*': int(os.getenv('DEFAULT_QUERY_BUDGET', 50)),
+}
+
 console_at_info = {
     'handlers': ['console'],
     'level': 'INFO',
@@ -256,6 +269,8 @@ if not TESTING:
 MIDDLEWARE_CLASSES = (
     'whitenoise.middleware.WhiteNoiseMiddleware',
 
+    'open_humans.middleware.InstrumentationMiddleware',
+
     # 'debug_toolbar.middleware.DebugToolbarMiddleware',
     'sslify.middleware.SSLifyMiddleware',
 
@@ -282,7 +297,8 @@ MIDDLEWARE_CLASSES = (
     'account.middleware.TimezoneMiddleware',
 
     'open_humans.middleware.AddMemberMiddleware',
-    'open_humans.middleware.PGPInterstitialRedirectMiddleware',
+    'open_humans.middleware.SourceLookupMiddleware',
+    'open_humans.middleware.InterstitialRedirectMiddleware',
 
     'django.middleware.cache.FetchFromCacheMiddleware',
 )
@@ -7,19 +7,22 @@ from account.signals import email_confirmed
 
 from django.conf import settings
 from django.core.mail import send_mail
-from django.db.models.signals import post_save, pre_save
+from django.db.models.signals import post_delete, post_save, pre_save
 from django.dispatch import receiver
 from django.template.loader import render_to_string
 from django.core.urlresolvers import reverse
 
-from oauth2_provider.models import AccessToken
+from oauth2_provider.models import AccessToken, Application
 from social.apps.django_app.default.models import UserSocialAuth
 
 from common.utils import full_url, get_source_labels_and_configs
-from private_sharing.models import ActivityFeed
+from private_sharing.models import ActivityFeed, DataRequestProjectMember
 from private_sharing.utilities import source_to_url_slug
+from public_data.models import Participant
 
-from .models import Member
+from .badges import schedule_badge_update
+from .models import Member, UserEvent
+from .statistics import record_activity_feed, record_user_event
 
 logger = logging.getLogger(__name__)
 
@@ -161,6 +164,8 @@ def access_token_post_save_cb(sender, instance, created, raw, update_fields,
                                   user=instance.user).count() > 1:
         return
 
+    instance.user.log('connected', {'source': app_label})
+
     url_slug = source_to_url_slug(app_label)
     activity_url = full_url(reverse('activity-management',
                                     kwargs={'source': url_slug}))
@@ -184,6 +189,8 @@ def user_social_auth_post_save_cb(sender, instance, created, raw,
                                      user=instance.user).count() > 1:
         return
 
+    instance.user.log('connected', {'source': instance.provider})
+
     # Look up the related name and URL. Note, we've used app names that match
     # the UserSocialAuth 'provider' field in Python Social Auth.
     app_config = dict(get_source_labels_and_configs())[instance.provider]
@@ -228,4 +235,114 @@ def email_confirmed_cb(email_address, **kwargs):
     """
     Send a user a welcome email once they've confirmed their email address.
     """
+    email_address.user.log('email-confirmed', {})
+
     send_welcome_email(email_address)
+
+
+@receiver(post_save, sender=UserEvent)
+def user_event_post_save_cb(sender, instance, created, raw, update_fields,
+                            **kwargs):
+    """
+    Count a new UserEvent in the daily statistics.
+    """
+    if raw or not created:
+        return
+
+    record_user_event(instance)
+
+
+@receiver(post_save, sender=ActivityFeed)
+def activity_feed_post_save_cb(sender, instance, created, raw, update_fields,
+                               **kwargs):
+    """
+    Count a new ActivityFeed row in the daily statistics.
+    """
+    if raw or not created:
+        return
+
+    record_activity_feed(instance)
+
+
+@receiver([post_save, post_delete], sender=UserSocialAuth)
+def connection_changed_badges_cb(sender, instance, **kwargs):
+    """
+    Update a member's badges when they connect or disconnect a source.
+    """
+    if kwargs.get('raw') or not instance.user_id:
+        return
+
+    schedule_badge_update(user_id=instance.user_id)
+
+
+@receiver([post_save, post_delete], sender=AccessToken)
+def access_token_changed_badges_cb(sender, instance, **kwargs):
+    """
+    Update a member's badges when they connect or disconnect a study, which
+    are OAuth2 applications of the api-administrator user.
+
+    Project tokens, and saves of existing tokens such as refreshes, don't
+    change which sources are connected, so they're ignored.
+    """
+    if kwargs.get('raw') or not instance.user_id:
+        return
+
+    # only a new token or a deleted one can change whether a study is
+    # connected
+    if kwargs.get('signal') is post_save and not kwargs.get('created'):
+        return
+
+    source_names = [app_config.verbose_name
+                    for _, app_config in get_source_labels_and_configs()]
+
+    is_source = (Application.objects
+                 .filter(pk=instance.application_id,
+                         user__username='api-administrator',
+                         name__in=source_names)
+                 .exists())
+
+    if is_source:
+        schedule_badge_update(user_id=instance.user_id)
+
+
+@receiver([post_save, post_delete], sender=DataRequestProjectMember)
+@receiver([post_save, post_delete], sender=Participant)
+def membership_changed_badges_cb(sender, instance, **kwargs):
+    """
+    Update a member's badges when they join or leave a project or the public
+    data sharing study.
+    """
+    if kwargs.get('raw'):
+        return
+
+    schedule_badge_update(pk=instance.member_id)
+
+
+@receiver([post_save, post_delete])
+def user_data_changed_badges_cb(sender, instance, **kwargs):
+    """
+    Update a member's badges when the data behind one of their study or
+    activity connections changes, e.g. a UserData, a uBiome sample or a data
+    selfie file.
+    """
+    if kwargs.get('raw'):
+        return
+
+    app_name = sender._meta.app_config.name
+
+    if not (app_name.startswith('studies.') or
+            app_name.startswith('activities.')):
+        return
+
+    user_id = getattr(instance, 'user_id', None)
+
+    if user_id is None and hasattr(instance, 'user_data_id'):
+        # e.g. VCFData and UBiomeSample hang off of their app's UserData
+        user_data_model = sender._meta.get_field('user_data').related_model
+        user_id = (user_data_model.objects
+                   .filter(pk=instance.user_data_id)
+                   .values_list('user_id', flat=True)
+                   .first())
+
+    if user_id:
+        schedule_badge_update(user_id=user_id)
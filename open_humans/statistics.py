@@ -0,0 +1,186 @@
+"""
+Daily rollups of site activity.
+
+Each UserEvent and ActivityFeed row that records a signup, a verified email,
+a connection, a project join or a public sharing toggle increments a
+DailyStatistic as it's saved (see open_humans.signals). The backfill_statistics
+management command rebuilds the rollups from the same rows.
+"""
+from collections import Counter, OrderedDict
+from datetime import datetime, timedelta
+
+from django.db import connection, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from private_sharing.models import ActivityFeed
+
+from .models import DailyStatistic, Member, UserEvent
+
+SIGNUPS = 'signups'
+VERIFIED_EMAILS = 'verified-emails'
+CONNECTIONS = 'connections'
+PROJECT_JOINS = 'project-joins'
+PUBLIC_SHARED = 'public-shared'
+PUBLIC_UNSHARED = 'public-unshared'
+
+METRICS = [SIGNUPS, VERIFIED_EMAILS, CONNECTIONS, PROJECT_JOINS,
+           PUBLIC_SHARED, PUBLIC_UNSHARED]
+
+# the UserEvent types that are counted
+USER_EVENT_TYPES = ['email-confirmed', 'connected', 'public-data:toggle']
+
+
+def to_date(timestamp):
+    return timezone.localtime(timestamp).date()
+
+
+def user_event_metrics(event_type, data):
+    """
+    Return the (metric, label) pairs counted for a UserEvent.
+    """
+    if event_type == 'email-confirmed':
+        return [(VERIFIED_EMAILS, '')]
+
+    if event_type == 'connected':
+        return [(CONNECTIONS, data.get('source', ''))]
+
+    if event_type == 'public-data:toggle':
+        metric = PUBLIC_SHARED if data.get('public') else PUBLIC_UNSHARED
+
+        return [(metric, data.get('source', ''))]
+
+    return []
+
+
+def activity_feed_metrics(action, project_id):
+    """
+    Return the (metric, label) pairs counted for an ActivityFeed row.
+    """
+    if action == 'created-account':
+        return [(SIGNUPS, '')]
+
+    if action == 'joined-project':
+        return [(PROJECT_JOINS, 'direct-sharing-{}'.format(project_id))]
+
+    return []
+
+
+def increment(date, metric, label='', amount=1):
+    """
+    Add to the count of a metric for a day.
+    """
+    updated = (DailyStatistic.objects
+               .filter(date=date, metric=metric, label=label)
+               .update(count=F('count') + amount))
+
+    if not updated:
+        DailyStatistic.objects.get_or_create(date=date, metric=metric,
+                                             label=label)
+        DailyStatistic.objects.filter(
+            date=date, metric=metric, label=label).update(
+                count=F('count') + amount)
+
+
+def record_user_event(event):
+    for metric, label in user_event_metrics(event.event_type, event.data):
+        increment(to_date(event.timestamp), metric, label)
+
+
+def record_activity_feed(activity):
+    for metric, label in activity_feed_metrics(activity.action,
+                                               activity.project_id):
+        increment(to_date(activity.timestamp), metric, label)
+
+
+def aggregate_statistics(since=None):
+    """
+    Count every metric by day from the underlying rows, from the date `since`
+    (or from the beginning if None), in the form {(date, metric, label):
+    count}, streaming rather than loading them.
+
+    Signups are counted from the members' join dates, since the
+    'created-account' ActivityFeed rows only go back to when it was added.
+    """
+    counts = Counter()
+
+    members = Member.objects.all()
+    events = UserEvent.objects.filter(event_type__in=USER_EVENT_TYPES)
+    activities = ActivityFeed.objects.filter(action='joined-project')
+
+    if since:
+        since = timezone.make_aware(
+            datetime.combine(since, datetime.min.time()))
+
+        members = members.filter(user__date_joined__gte=since)
+        events = events.filter(timestamp__gte=since)
+        activities = activities.filter(timestamp__gte=since)
+
+    for date_joined in (members.values_list('user__date_joined', flat=True)
+                        .iterator()):
+        counts[(to_date(date_joined), SIGNUPS, '')] += 1
+
+    for event_type, data, timestamp in (
+            events.values_list('event_type', 'data', 'timestamp').iterator()):
+        for metric, label in user_event_metrics(event_type, data):
+            counts[(to_date(timestamp), metric, label)] += 1
+
+    for action, project_id, timestamp in (
+            activities.values_list('action', 'project_id', 'timestamp')
+            .iterator()):
+        for metric, label in activity_feed_metrics(action, project_id):
+            counts[(to_date(timestamp), metric, label)] += 1
+
+    return counts
+
+
+def rebuild_statistics(since=None):
+    """
+    Replace the rollups from the date `since` (or everything if None) onwards
+    with counts aggregated from the underlying rows.
+    """
+    with transaction.atomic():
+        # block increment() until the rebuild commits; an event saved in a
+        # transaction that's still open is then either included in the
+        # aggregate or counted after it
+        with connection.cursor() as cursor:
+            cursor.execute('LOCK TABLE {} IN SHARE ROW EXCLUSIVE MODE'.format(
+                DailyStatistic._meta.db_table))
+
+        counts = aggregate_statistics(since=since)
+
+        statistics = DailyStatistic.objects.all()
+
+        if since:
+            statistics = statistics.filter(date__gte=since)
+
+        statistics.delete()
+
+        DailyStatistic.objects.bulk_create(
+            DailyStatistic(date=date, metric=metric, label=label, count=count)
+            for (date, metric, label), count in counts.items())
+
+    return len(counts)
+
+
+def daily_statistics(start, end):
+    """
+    Return an OrderedDict of {date: {metric: {label: count}}} for each day
+    from start to end inclusive, read with a single query. Site-wide metrics
+    like signups have the label ''.
+    """
+    days = OrderedDict()
+    date = start
+
+    while date <= end:
+        days[date] = {metric: {} for metric in METRICS}
+        date += timedelta(days=1)
+
+    statistics = (DailyStatistic.objects
+                  .filter(date__range=[start, end])
+                  .values_list('date', 'metric', 'label', 'count'))
+
+    for date, metric, label, count in statistics:
+        days[date].setdefault(metric, {})[label] = count
+
+    return days
@@ -15,11 +15,8 @@ from django.template.defaultfilters import stringfilter
 from django.template.loader_tags import do_include
 from django.utils.safestring import mark_safe
 
-from common.activities import personalize_activities_dict
-from common.utils import full_url as full_url_method
-from private_sharing.models import app_label_to_verbose_name_including_dynamic
-from private_sharing.utilities import (source_to_url_slug as
-                                       source_to_url_slug_method)
+from common.utils import full_url as full_url_method, get_source_labels
+from private_sharing.utilities import get_source_lookup
 
 logger = logging.getLogger(__name__)
 
@@ -36,15 +33,20 @@ def startswith(string, substring):
 
 
 @register.filter
+@stringfilter
 def source_to_name(source):
     """
     Given 'american_gut', return 'American Gut'
     """
-    try:
-        return app_label_to_verbose_name_including_dynamic(source)
-    except:  # pylint: disable=bare-except
+    lookup = get_source_lookup()
+    name = lookup.name(source)
+
+    # a direct sharing project that no longer exists
+    if name is None and lookup.project_id(source) is not None:
         return source
 
+    return name
+
 
 @register.filter
 @stringfilter
@@ -52,7 +54,18 @@ def source_to_url_slug(source):
     """
     Return url_slug for an "app" activity, or slug for "project" activity.
     """
-    return source_to_url_slug_method(source)
+    return get_source_lookup().url_slug(source)
+
+
+@register.simple_tag()
+def preload_sources(sources):
+    """
+    Fetch the projects for a list of source labels with one query so that
+    source_to_name and source_to_url_slug don't query for each label.
+    """
+    get_source_lookup().preload(sources or [])
+
+    return ''
 
 
 @register.filter
@@ -226,14 +239,21 @@ def active(context, pattern_or_urlname):
 @register.simple_tag()
 def url_slug(label):
     """
-    Given a label, return the URL slug of the corresponding activity.
+    Given a label, return the URL slug of the corresponding activity, or ''
+    if it isn't in the activity catalog.
     """
-    activities = personalize_activities_dict()
+    lookup = get_source_lookup()
+
+    if lookup.project_id(label) is not None:
+        project = lookup.project(label)
 
-    if label not in activities:
+        # the catalog only lists approved and active projects
+        if not (project and project.approved and project.active):
+            return ''
+    elif label not in get_source_labels():
         return ''
 
-    return activities[label]['url_slug']
+    return lookup.url_slug(label) or ''
 
 
 @register.simple_tag()
@@ -1,4 +1,8 @@
 from cStringIO import StringIO
+from datetime import timedelta
+import json
+import os
+import tempfile
 import unittest
 
 from account.models import EmailConfirmation
@@ -7,17 +11,27 @@ from django.conf import settings
 from django.contrib import auth
 from django.core import management
 from django.db import IntegrityError
-from django.test import TestCase
+from django.test import RequestFactory, TestCase, TransactionTestCase
 from django.test.utils import override_settings
 from django.utils import timezone
 
 from mock import patch
-from oauth2_provider.models import AccessToken
+from oauth2_provider.models import AccessToken, Application
+from social.apps.django_app.default.models import UserSocialAuth
 
+from activities.ubiome.models import UBiomeSample
+
+from common.activities import badge_counts
 from common.api_testing import APITestCase
 from common.testing import BrowserTestCase, get_or_create_user, SmokeTestCase
+from public_data.models import PublicSource
 
-from .models import Member
+from .badges import aggregate_badge_counts, set_member_badges
+from .instrumentation import (clear_samples, fingerprint, get_samples,
+                              summarize)
+from .interstitials import get_interstitial
+from .member_views import MemberConnectionDeleteView
+from .models import DailyStatistic, Member
 
 UserModel = auth.get_user_model()
 
@@ -67,6 +81,7 @@ class SmokeTests(SmokeTestCase):
         '/about/',
         '/api/public-data/?username=beau',
         '/api/public-data/?created_start=2/14/2016&created_end=2/14/2016',
+        '/api/public-data/export/?username=beau',
         '/api/public-data/sources-by-member/',
         '/api/public-data/members-by-source/',
         '/beau/',
@@ -181,19 +196,311 @@ class CommandTests(TestCase):
         management.call_command('bulk_tasks', '--app=pgp', '--user=beau',
                                 stdout=self.output)
 
+    def test_process_task_queue(self):
+        management.call_command('process_task_queue', '--once',
+                                stdout=self.output)
+
     def test_setup_api(self):
         management.call_command('setup_api', stdout=self.output)
 
     def test_update_badges(self):
         management.call_command('update_badges', stdout=self.output)
 
+    def test_update_badges_only_writes_changes(self):
+        Member.objects.update(badges=[])
+
+        management.call_command('update_badges', '--verify',
+                                stdout=self.output)
+
+        self.assertFalse(Member.objects.exclude(badges=[]).exists())
+
+        management.call_command('update_badges', '--chunk-size=1',
+                                stdout=self.output)
+
+        output = StringIO()
+        management.call_command('update_badges', stdout=output)
+
+        self.assertIn('Done: 0 of', output.getvalue())
+
+    def test_stored_connections_match_sources(self):
+        Member.objects.update(connected_sources=[])
+
+        management.call_command('update_badges', stdout=self.output)
+
+        for member in Member.enriched.all():
+            self.assertEqual(list(member.connections.keys()),
+                             member.get_connected_sources())
+
+    def test_badge_counts_follow_badge_changes(self):
+        management.call_command('update_badges', stdout=self.output)
+
+        self.assertEqual(badge_counts(), aggregate_badge_counts())
+
+        member = Member.objects.get(user__username='beau')
+        counts = badge_counts()
+
+        set_member_badges(member, member.badges + [{'label': 'test-badge'}])
+
+        counts['test-badge'] = 1
+
+        self.assertEqual(Member.objects.get(pk=member.pk).badge_count,
+                         len(member.badges))
+
+        self.assertEqual(badge_counts(), counts)
+        self.assertEqual(badge_counts(), aggregate_badge_counts())
+
     def test_user_connections_json(self):
         management.call_command('user_connections_json', '/dev/null',
                                 stdout=self.output)
 
+    def test_user_connections_json_since(self):
+        outputfile = tempfile.NamedTemporaryFile(suffix='.json', delete=False)
+        outputfile.close()
+
+        self.addCleanup(os.remove, outputfile.name)
+
+        management.call_command('user_connections_json', outputfile.name,
+                                '--chunk-size=2', stdout=self.output)
+
+        with open(outputfile.name) as f:
+            full = json.load(f)
+
+        self.assertIn('beau', full)
+
+        management.call_command('user_connections_json', outputfile.name,
+                                '--since=2000-01-01', stdout=self.output)
+
+        with open(outputfile.name) as f:
+            self.assertEqual(json.load(f), full)
+
+        # every member is unchanged, so all of them are read from the file
+        management.call_command('user_connections_json', outputfile.name,
+                                '--since=2100-01-01', stdout=self.output)
+
+        with open(outputfile.name) as f:
+            self.assertEqual(json.load(f), full)
+
     def test_stats(self):
         management.call_command('stats', '--days=365', stdout=self.output)
 
+    def test_daily_statistics(self):
+        user = UserModel.objects.get(username='beau')
+        user.log('connected', {'source': 'pgp'})
+        user.log('connected', {'source': 'pgp'})
+
+        statistics = DailyStatistic.objects.filter(metric='connections',
+                                                   label='pgp')
+
+        self.assertEqual(statistics.get().count, 2)
+
+        management.call_command('backfill_statistics', stdout=self.output)
+
+        self.assertEqual(statistics.get().count, 2)
+        self.assertTrue(DailyStatistic.objects.filter(
+            metric='signups').exists())
+
+        management.call_command('stats', '--days=1', stdout=self.output)
+
+        self.assertIn('connections: pgp 2', self.output.getvalue())
+
+
+class BadgeSignalTests(TransactionTestCase):
+    """
+    Test that connecting and disconnecting sources updates badges.
+
+    The updates run in transaction.on_commit callbacks, which a TestCase never
+    commits.
+    """
+
+    def setUp(self):
+        user = get_or_create_user('badgetest')
+        self.member, _ = Member.objects.get_or_create(user=user)
+
+    def badge_labels(self):
+        member = Member.objects.get(pk=self.member.pk)
+
+        return [badge['label'] for badge in member.badges]
+
+    def assert_connected(self, label, connected):
+        member = Member.objects.get(pk=self.member.pk)
+
+        self.assertEqual(label in self.badge_labels(), connected)
+        self.assertEqual(label in member.connected_sources, connected)
+
+    def test_social_auth_connection_updates_badges(self):
+        social_auth = UserSocialAuth.objects.create(
+            user=self.member.user, provider='runkeeper', uid='1',
+            extra_data={})
+
+        self.assert_connected('runkeeper', True)
+
+        social_auth.delete()
+
+        self.assert_connected('runkeeper', False)
+
+    def test_user_data_change_updates_badges(self):
+        sample = UBiomeSample.objects.create(
+            user_data=self.member.user.ubiome,
+            sequence_file='member-files/ubiome/sample.fastq',
+            taxonomy='{}')
+
+        self.assert_connected('ubiome', True)
+
+        sample.delete()
+
+        self.assert_connected('ubiome', False)
+
+
+class AccessTokenBadgeTests(TestCase):
+    """
+    Test that only study access tokens update badges.
+    """
+
+    fixtures = ['open_humans/fixtures/test-data.json']
+
+    def create_token(self, application_name):
+        return AccessToken.objects.create(
+            user=UserModel.objects.get(username='beau'),
+            application=Application.objects.get(name=application_name),
+            token='badgetest-{}'.format(application_name),
+            expires=timezone.now() + timedelta(days=1),
+            scope='read')
+
+    @patch('open_humans.signals.schedule_badge_update')
+    def test_study_token_updates_badges(self, schedule_badge_update):
+        token = self.create_token('Harvard Personal Genome Project')
+
+        self.assertEqual(schedule_badge_update.call_count, 1)
+
+        # e.g. a refresh
+        token.save()
+
+        self.assertEqual(schedule_badge_update.call_count, 1)
+
+        token.delete()
+
+        self.assertEqual(schedule_badge_update.call_count, 2)
+
+    @patch('open_humans.signals.schedule_badge_update')
+    def test_project_token_does_not_update_badges(self,
+                                                  schedule_badge_update):
+        self.create_token('Keeping Pace').delete()
+
+        self.assertFalse(schedule_badge_update.called)
+
+
+class MemberConnectionDeleteTests(TestCase):
+    """
+    Test that deleting a connection doesn't rely on out of date stored
+    connections.
+    """
+
+    def test_stale_connections_are_checked(self):
+        user = get_or_create_user('staleconnection')
+        member, _ = Member.objects.get_or_create(user=user)
+
+        # the badge update runs on commit, which a TestCase never does
+        UBiomeSample.objects.create(
+            user_data=user.ubiome,
+            sequence_file='member-files/ubiome/sample.fastq',
+            taxonomy='{}')
+
+        self.assertNotIn('ubiome', member.connections)
+
+        view = MemberConnectionDeleteView()
+        view.request = RequestFactory().get('/')
+        view.request.user = user
+
+        self.assertIn('ubiome', view.get_connections('ubiome'))
+        self.assertIn('ubiome',
+                      Member.objects.get(pk=member.pk).connected_sources)
+
+
+@override_settings(SSLIFY_DISABLE=True, INSTRUMENTATION_SAMPLE_RATE=1,
+                   CACHES={
+                       'default': {
+                           'BACKEND': ('django.core.cache.backends.locmem.'
+                                       'LocMemCache'),
+                       }
+                   })
+class InstrumentationTests(TestCase):
+    """
+    Test the sampled per-view instrumentation.
+    """
+
+    def test_fingerprint(self):
+        self.assertEqual(
+            fingerprint("SELECT * FROM t WHERE id IN (1, 2) AND s = 'a''b'"),
+            'SELECT * FROM t WHERE id IN (...) AND s = ?')
+
+    def test_samples_are_recorded(self):
+        clear_samples()
+
+        self.client.get('/')
+
+        samples = get_samples()
+
+        self.assertEqual(len(samples), 1)
+        self.assertEqual(samples[0]['view'], 'home')
+        self.assertEqual(summarize(samples)['home']['samples'], 1)
+
+
+@override_settings(SSLIFY_DISABLE=True, CACHE_MIDDLEWARE_SECONDS=0)
+class InterstitialTests(TestCase):
+    """
+    Test the one-time PGP interstitial.
+    """
+
+    url = '/member/me/'
+
+    def setUp(self):
+        self.user = get_or_create_user('pgpinterstitial')
+        self.member, _ = Member.objects.get_or_create(user=self.user)
+
+        Member.objects.filter(pk=self.member.pk).update(
+            connected_sources=['pgp'])
+
+        self.client.force_login(self.user)
+
+    def is_redirected(self):
+        response = self.client.get(self.url)
+
+        return '/pgp-quick-note/' in response.get('Location', '')
+
+    def has_seen(self):
+        return Member.objects.get(pk=self.member.pk).seen_pgp_interstitial
+
+    def test_redirected_once(self):
+        self.assertTrue(self.is_redirected())
+        self.assertFalse(self.has_seen())
+
+        response = self.client.get('/pgp-quick-note/?next={}'.format(
+            self.url))
+
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(self.has_seen())
+        self.assertFalse(self.is_redirected())
+
+    def test_public_pgp_data_is_not_redirected(self):
+        PublicSource.objects.create(user=self.user, source='pgp')
+
+        self.assertFalse(self.is_redirected())
+        self.assertTrue(self.has_seen())
+
+    def test_no_queries_once_seen(self):
+        Member.objects.filter(pk=self.member.pk).update(
+            seen_pgp_interstitial=True)
+
+        request = RequestFactory().get(self.url)
+        request.user = UserModel.objects.get(pk=self.user.pk)
+        request.session = {}
+
+        # load the member as AddMemberMiddleware does
+        request.user.member  # pylint: disable=pointless-statement
+
+        with self.assertNumQueries(0):
+            self.assertIsNone(get_interstitial(request))
+
 
 class WsgiTests(TestCase):
     """
@@ -104,6 +104,12 @@ urlpatterns = [
     url(r'^pgp-quick-note/$',
         views.PGPInterstitialView.as_view(),
         name='pgp-interstitial'),
+    url(r'^statistics/$',
+        views.StatisticsView.as_view(),
+        name='statistics'),
+    url(r'^instrumentation/$',
+        views.InstrumentationView.as_view(),
+        name='instrumentation'),
     url(r'^public-data-api/$',
         views.PublicDataDocumentationView.as_view(),
         name='public-data-api'),
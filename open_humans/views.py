@@ -10,7 +10,8 @@ from django.contrib import messages as django_messages
 from django.contrib.auth import get_user_model
 from django.core.cache import cache
 from django.core.urlresolvers import reverse, reverse_lazy
-from django.http import Http404, HttpResponseRedirect
+from django.db.models import Case, IntegerField, Sum, When
+from django.http import Http404, HttpResponseRedirect, JsonResponse
 from django.shortcuts import render
 from django.views.generic.base import TemplateView, View
 from django.views.generic.edit import DeleteView, FormView
@@ -19,18 +20,25 @@ import feedparser
 
 from common.activities import (personalize_activities,
                                personalize_activities_dict)
-from common.mixins import LargePanelMixin, NeverCacheMixin, PrivateMixin
+from common.mixins import (LargePanelMixin, NeverCacheMixin, PrivateMixin,
+                           StaffMixin)
 from common.utils import querydict_from_dict
 from common.views import BaseOAuth2AuthorizationView
 from data_import.models import DataFile, is_public
 from private_sharing.models import (ActivityFeed, DataRequestProject,
-                                    FeaturedProject)
+                                    DataRequestProjectMember, FeaturedProject)
 from private_sharing.utilities import (
     get_source_labels_and_names_including_dynamic, source_to_url_slug)
+from public_data.contributors import public_contributor_count
 
 from .forms import ActivityMessageForm
+from .instrumentation import get_samples, summarize
+from .interstitials import mark_interstitial_seen
 from .mixins import SourcesContextMixin
 from .models import BlogPost
+from .statistics import (CONNECTIONS, PROJECT_JOINS, PUBLIC_SHARED,
+                         PUBLIC_UNSHARED, SIGNUPS, VERIFIED_EMAILS,
+                         daily_statistics)
 
 User = get_user_model()
 TEN_MINUTES = 60 * 10
@@ -284,8 +292,7 @@ class PGPInterstitialView(PrivateMixin, TemplateView):
     template_name = 'pages/pgp-interstitial.html'
 
     def get(self, request, *args, **kwargs):
-        request.user.member.seen_pgp_interstitial = True
-        request.user.member.save()
+        mark_interstitial_seen(request, 'pgp-interstitial')
 
         return super(PGPInterstitialView, self).get(request, *args, **kwargs)
 
@@ -334,6 +341,72 @@ class CreatePageView(TemplateView):
         return context
 
 
+class StatisticsView(StaffMixin, TemplateView):
+    """
+    A staff dashboard of daily signups, connections and sharing, read from the
+    DailyStatistic rollups.
+    """
+
+    template_name = 'pages/statistics.html'
+
+    def get_days(self):
+        try:
+            days = int(self.request.GET.get('days', 30))
+        except ValueError:
+            days = 30
+
+        return min(max(days, 1), 365)
+
+    def get_context_data(self, **kwargs):
+        context = super(StatisticsView, self).get_context_data(**kwargs)
+
+        days = self.get_days()
+
+        end = arrow.utcnow().date()
+        start = arrow.utcnow().replace(days=-(days - 1)).date()
+
+        rows = []
+        connections = {}
+
+        for date, metrics in reversed(daily_statistics(start, end).items()):
+            rows.append({
+                'date': date,
+                'signups': metrics[SIGNUPS].get('', 0),
+                'verified_emails': metrics[VERIFIED_EMAILS].get('', 0),
+                'connections': sum(metrics[CONNECTIONS].values()),
+                'project_joins': sum(metrics[PROJECT_JOINS].values()),
+                'made_public': sum(metrics[PUBLIC_SHARED].values()),
+                'made_private': sum(metrics[PUBLIC_UNSHARED].values()),
+            })
+
+            for label, count in metrics[CONNECTIONS].items():
+                connections[label] = connections.get(label, 0) + count
+
+        context.update({
+            'days': days,
+            'rows': rows,
+            'connections': sorted(connections.items(),
+                                  key=lambda x: x[1], reverse=True),
+        })
+
+        return context
+
+
+class InstrumentationView(StaffMixin, View):
+    """
+    A staff-only JSON report of the sampled per-view query counts and timings
+    (see open_humans.instrumentation). Pass ?raw=1 for the samples themselves.
+    """
+
+    def get(self, request, *args, **kwargs):
+        samples = get_samples()
+
+        if request.GET.get('raw'):
+            return JsonResponse({'samples': samples})
+
+        return JsonResponse(summarize(samples))
+
+
 class ActivityManagementView(NeverCacheMixin, LargePanelMixin, TemplateView):
     """
     A 'home' view for each activity, with sections for describing the activity,
@@ -355,24 +428,44 @@ class ActivityManagementView(NeverCacheMixin, LargePanelMixin, TemplateView):
         return by_url_id[self.kwargs['source']]
 
     def requesting_activities(self):
-        activities = []
-
-        for project in DataRequestProject.objects.filter(approved=True,
-                                                         active=True):
-            if self.activity['source_name'] in project.request_sources_access:
-                if self.request.user.is_authenticated():
-                    joined = project.is_joined(self.request.user)
-                else:
-                    joined = False
-
-                activities.append({
-                    'name': project.name,
-                    'slug': project.slug,
-                    'joined': joined,
-                    'members': project.authorized_members,
-                })
+        """
+        Return the approved, active projects requesting access to this
+        activity's source, with their authorized member counts and whether
+        the current user has joined them, using two queries.
+        """
+        # the request_sources_access @> lookup uses the
+        # project_request_sources_access_gin index
+        authorized_member_count = Sum(Case(
+            When(project_members__joined=True,
+                 project_members__authorized=True,
+                 project_members__revoked=False,
+                 then=1),
+            default=0,
+            output_field=IntegerField()))
+
+        projects = list(DataRequestProject.objects
+                        .filter(approved=True, active=True,
+                                request_sources_access__contains=[
+                                    self.activity['source_name']])
+                        .annotate(
+                            authorized_member_count=authorized_member_count))
+
+        joined_project_ids = set()
 
-        return activities
+        if self.request.user.is_authenticated():
+            joined_project_ids = set(
+                DataRequestProjectMember.objects
+                .filter_active()
+                .filter(member__user=self.request.user,
+                        project_id__in=[project.id for project in projects])
+                .values_list('project_id', flat=True))
+
+        return [{
+            'name': project.name,
+            'slug': project.slug,
+            'joined': project.id in joined_project_ids,
+            'members': project.authorized_member_count,
+        } for project in projects]
 
     def get_context_data(self, **kwargs):
         context = super(ActivityManagementView, self).get_context_data(
@@ -385,17 +478,7 @@ class ActivityManagementView(NeverCacheMixin, LargePanelMixin, TemplateView):
         except KeyError:
             raise Http404
 
-        # MPB Aug 2017: This comprehension is slow, taking 2+ secs in local dev
-        pubfilecount_cachetag = 'pubfilecount-{}'.format(
-            self.activity['source_name'])
-        public_files = cache.get(pubfilecount_cachetag)
-        if not public_files:
-            public_files = len([
-                df for df in
-                DataFile.objects.filter(source=self.activity['source_name'])
-                .exclude(parent_project_data_file__completed=False)
-                .current().distinct('user') if df.is_public])
-        cache.set(pubfilecount_cachetag, public_files, timeout=TEN_MINUTES)
+        public_files = public_contributor_count(self.activity['source_name'])
 
         requesting_activities = self.requesting_activities()
         data_is_public = False
@@ -0,0 +1 @@
+default_app_config = 'private_sharing.apps.PrivateSharingConfig'
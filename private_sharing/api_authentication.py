@@ -1,6 +1,7 @@
 import arrow
 
 from django.contrib.auth import get_user_model
+from django.core.cache import cache
 
 from oauth2_provider.models import AccessToken
 
@@ -8,10 +9,61 @@ from rest_framework import exceptions
 from rest_framework.authentication import (BaseAuthentication,
                                            get_authorization_header)
 
-from .models import DataRequestProject, OAuth2DataRequestProject
+from .models import (DataRequestProject, DataRequestProjectMember,
+                     OAuth2DataRequestProject, invalidate_token_cache,
+                     token_cache_tag)
 
 UserModel = get_user_model()
 
+TEN_MINUTES = 60 * 10
+
+
+def resolve_token(key):
+    """
+    Return a (user_id, project_id, kind, expiry) tuple for a project master
+    access token or an OAuth2 access token, or None if the token is invalid.
+    """
+    try:
+        project = (DataRequestProject.objects
+                   .select_related('coordinator')
+                   .get(master_access_token=key))
+    except DataRequestProject.DoesNotExist:
+        pass
+    else:
+        expiry = (None if project.token_expiration_disabled
+                  else project.token_expiration_date)
+
+        return (project.coordinator.user_id, project.id, 'master', expiry)
+
+    try:
+        access_token = AccessToken.objects.get(token=key)
+        project = OAuth2DataRequestProject.objects.get(
+            application_id=access_token.application_id)
+        project_member = (DataRequestProjectMember.objects
+                          .filter_active()
+                          .select_related('member')
+                          .get(member__user_id=access_token.user_id,
+                               project=project))
+    except (AccessToken.DoesNotExist,
+            OAuth2DataRequestProject.DoesNotExist,
+            DataRequestProjectMember.DoesNotExist):
+        return None
+
+    return (project_member.member.user_id, project.id, 'oauth2',
+            access_token.expires)
+
+
+def token_cache_timeout(expiry):
+    """
+    Cache a resolved token for ten minutes or until it expires.
+    """
+    if not expiry:
+        return TEN_MINUTES
+
+    seconds = int((expiry - arrow.utcnow().datetime).total_seconds())
+
+    return max(min(seconds, TEN_MINUTES), 0)
+
 
 class ProjectTokenAuthentication(BaseAuthentication):
     """
@@ -46,30 +98,41 @@ class ProjectTokenAuthentication(BaseAuthentication):
 
     @staticmethod
     def authenticate_credentials(key):
-        try:
-            project = DataRequestProject.objects.get(master_access_token=key)
+        cache_tag = token_cache_tag(key)
+        resolved = cache.get(cache_tag)
+
+        if not resolved:
+            resolved = resolve_token(key)
+
+            if not resolved:
+                raise exceptions.AuthenticationFailed('Invalid token.')
 
-            if (not project.token_expiration_disabled and
-                    project.token_expiration_date < arrow.utcnow().datetime):
-                raise exceptions.AuthenticationFailed('Expired token.')
+            # master access tokens are cached past their expiration so that
+            # repeated requests with an expired token are cheap to reject
+            timeout = (TEN_MINUTES if resolved[2] == 'master'
+                       else token_cache_timeout(resolved[3]))
 
-            user = project.coordinator.user
-        except DataRequestProject.DoesNotExist:
-            project = None
-            user = None
+            cache.set(cache_tag, resolved, timeout=timeout)
+
+        user_id, project_id, kind, expiry = resolved
+
+        if (kind == 'master' and expiry and
+                expiry < arrow.utcnow().datetime):
+            raise exceptions.AuthenticationFailed('Expired token.')
+
+        if kind == 'oauth2':
+            project_model = OAuth2DataRequestProject
+        else:
+            project_model = DataRequestProject
 
         try:
-            access_token = AccessToken.objects.get(token=key)
-            project = OAuth2DataRequestProject.objects.get(
-                application=access_token.application)
-            project_member = project.active_user(access_token.user)
-            user = project_member.member.user
-        except (AccessToken.DoesNotExist,
-                OAuth2DataRequestProject.DoesNotExist,
-                DataRequestProject.DoesNotExist):
-            pass
-
-        if not project or not user:
+            project = project_model.objects.get(pk=project_id)
+            user = (UserModel.objects
+                    .select_related('member')
+                    .get(pk=user_id))
+        except (project_model.DoesNotExist, UserModel.DoesNotExist):
+            invalidate_token_cache(key)
+
             raise exceptions.AuthenticationFailed('Invalid token.')
 
         return (user, project)
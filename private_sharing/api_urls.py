@@ -10,6 +10,7 @@ urlpatterns = [
     url(r'^project/exchange-member/$',
         api_views.ProjectMemberExchangeView.as_view()),
     url(r'^project/message/$', api_views.ProjectMessageView.as_view()),
+    url(r'^project/messages/$', api_views.ProjectMessageListView.as_view()),
 
     # Views for managing uploaded data files
     url(r'^project/files/upload/$', api_views.ProjectFileUploadView.as_view()),
@@ -20,6 +21,12 @@ urlpatterns = [
 
     url(r'^project/files/upload/complete/$',
         api_views.ProjectFileDirectUploadCompletionView.as_view()),
+
+    url(r'^project/files/upload/direct/batch/$',
+        api_views.ProjectFileDirectUploadBatchView.as_view()),
+
+    url(r'^project/files/upload/complete/batch/$',
+        api_views.ProjectFileDirectUploadBatchCompletionView.as_view()),
 ]
 
 urlpatterns = format_suffix_patterns(urlpatterns)
@@ -1,9 +1,13 @@
 import os
 
+from collections import defaultdict
+from itertools import chain
+
 from boto.s3.connection import S3Connection
 
 from django.conf import settings
 from django.contrib.auth import get_user_model
+from django.db import transaction
 from django.db.models.query import QuerySet
 
 from rest_framework import serializers, status
@@ -14,20 +18,53 @@ from rest_framework.views import APIView
 from common.mixins import NeverCacheMixin
 from common.permissions import HasValidToken
 
+from data_import.models import DataFile
 from data_import.utils import get_upload_path
+from public_data.contributors import refresh_public_contributor
 
 from .api_authentication import ProjectTokenAuthentication
 from .api_filter_backends import ProjectFilterBackend
 from .api_permissions import HasValidProjectToken
 from .forms import (DeleteDataFileForm, DirectUploadDataFileForm,
+                    DirectUploadDataFileBatchForm,
+                    DirectUploadDataFileBatchCompletionForm,
                     DirectUploadDataFileCompletionForm,
                     MessageProjectMembersForm, UploadDataFileForm)
 from .models import (DataRequestProject, DataRequestProjectMember,
-                     OAuth2DataRequestProject, ProjectDataFile)
-from .serializers import ProjectDataSerializer, ProjectMemberDataSerializer
+                     OAuth2DataRequestProject, ProjectDataFile,
+                     ProjectMessage)
+from .serializers import (ProjectDataSerializer, ProjectMemberDataSerializer,
+                          ProjectMessageSerializer)
 
 UserModel = get_user_model()
 
+# reused across requests since signing a URL doesn't touch the network
+_S3_CONNECTION = None
+
+
+def get_s3_connection():
+    """
+    Return a shared S3Connection for pre-signing upload URLs.
+    """
+    global _S3_CONNECTION  # pylint: disable=global-statement
+
+    if not _S3_CONNECTION:
+        _S3_CONNECTION = S3Connection(settings.AWS_ACCESS_KEY_ID,
+                                      settings.AWS_SECRET_ACCESS_KEY)
+
+    return _S3_CONNECTION
+
+
+def presign_upload_url(key):
+    """
+    Return a pre-signed URL for uploading the given key to S3.
+    """
+    return get_s3_connection().generate_url(
+        expires_in=settings.INCOMPLETE_FILE_EXPIRATION_HOURS * 60 * 60,
+        method='PUT',
+        bucket=settings.AWS_STORAGE_BUCKET_NAME,
+        key=key)
+
 
 class ProjectAPIView(NeverCacheMixin):
     """
@@ -105,7 +142,62 @@ class ProjectMemberDataView(ProjectListView):
     serializer_class = ProjectMemberDataSerializer
 
     def get_queryset(self):
-        return DataRequestProjectMember.objects.filter_active()
+        return (DataRequestProjectMember.objects
+                .filter_active()
+                .select_related('member__user', 'project')
+                .order_by('id'))
+
+    @staticmethod
+    def get_file_context(project_members):
+        """
+        Look up the current files for a page of project members with one query
+        and their public status with another, instead of querying per member
+        and per file.
+        """
+        user_ids = [project_member.member.user_id
+                    for project_member in project_members]
+        sources = set(chain.from_iterable(
+            project_member.sources_shared_including_self
+            for project_member in project_members))
+
+        files = (DataFile.objects
+                 .filter(user_id__in=user_ids, source__in=sources)
+                 .exclude(parent_project_data_file__completed=False)
+                 .current())
+
+        files_by_user = defaultdict(list)
+
+        for data_file in files:
+            files_by_user[data_file.user_id].append(data_file)
+
+        public_file_ids = set(DataFile.objects
+                              .public()
+                              .filter(user_id__in=user_ids,
+                                      source__in=sources)
+                              .order_by()
+                              .values_list('id', flat=True))
+
+        return {
+            'files_by_user': files_by_user,
+            'public_file_ids': public_file_ids,
+        }
+
+    def list(self, request, *args, **kwargs):
+        queryset = self.filter_queryset(self.get_queryset())
+
+        page = self.paginate_queryset(queryset)
+        project_members = page if page is not None else list(queryset)
+
+        context = self.get_serializer_context()
+        context.update(self.get_file_context(project_members))
+
+        serializer = self.get_serializer_class()(
+            project_members, many=True, context=context)
+
+        if page is not None:
+            return self.get_paginated_response(serializer.data)
+
+        return Response(serializer.data)
 
 
 class ProjectFormBaseView(ProjectAPIView, APIView):
@@ -115,8 +207,8 @@ class ProjectFormBaseView(ProjectAPIView, APIView):
 
     def post(self, request):
         project_member = self.get_oauth2_member()
-        project = DataRequestProject.objects.get(
-            master_access_token=self.request.auth.master_access_token)
+        # ProjectTokenAuthentication has already resolved the project
+        project = self.request.auth
 
         # Just to be safe and maybe unneeded, but we don't want one user's
         # OAuth2 token to to allow a write to a different user's account.
@@ -131,9 +223,11 @@ class ProjectFormBaseView(ProjectAPIView, APIView):
 
         if not project_member:
             try:
-                project_member = DataRequestProjectMember.objects.get(
-                    project=project,
-                    project_member_id=form.cleaned_data['project_member_id'])
+                project_member = (DataRequestProjectMember.objects
+                                  .select_related('member__user')
+                                  .get(project=project,
+                                       project_member_id=form.cleaned_data[
+                                           'project_member_id']))
             except DataRequestProjectMember.DoesNotExist:
                 project_member = None
 
@@ -155,14 +249,14 @@ class ProjectMessageView(ProjectAPIView, APIView):
     def post(self, request, format=None):
         request_data = request.data.copy()
         projmember = self.get_oauth2_member()
-        project = DataRequestProject.objects.get(
-            master_access_token=self.request.auth.master_access_token)
+        # ProjectTokenAuthentication has already resolved the project
+        project = self.request.auth
 
         if projmember:
             request_data['all_members'] = False
             request_data['project_member_ids'] = [projmember.project_member_id]
 
-        form = MessageProjectMembersForm(request_data)
+        form = MessageProjectMembersForm(request_data, project=project)
 
         if not form.is_valid():
             return Response({'errors': form.errors},
@@ -173,6 +267,17 @@ class ProjectMessageView(ProjectAPIView, APIView):
         return Response('success')
 
 
+class ProjectMessageListView(ProjectListView):
+    """
+    Return the delivery status of the project's messages, newest first.
+    """
+
+    serializer_class = ProjectMessageSerializer
+
+    def get_queryset(self):
+        return ProjectMessage.objects.order_by('-created')
+
+
 class ProjectFileDirectUploadView(ProjectFormBaseView):
     """
     Initiate a direct upload to S3 for a project by pre-signing and returning
@@ -195,21 +300,50 @@ class ProjectFileDirectUploadView(ProjectFormBaseView):
 
         data_file.save()
 
-        s3 = S3Connection(settings.AWS_ACCESS_KEY_ID,
-                          settings.AWS_SECRET_ACCESS_KEY)
-
-        url = s3.generate_url(
-            expires_in=settings.INCOMPLETE_FILE_EXPIRATION_HOURS * 60 * 60,
-            method='PUT',
-            bucket=settings.AWS_STORAGE_BUCKET_NAME,
-            key=key)
-
         return Response({
             'id': data_file.id,
-            'url': url,
+            'url': presign_upload_url(key),
         }, status=status.HTTP_201_CREATED)
 
 
+class ProjectFileDirectUploadBatchView(ProjectFormBaseView):
+    """
+    Initiate direct uploads to S3 of many files for a project member by
+    pre-signing and returning their URLs.
+    """
+
+    form_class = DirectUploadDataFileBatchForm
+
+    def post(self, request):
+        super(ProjectFileDirectUploadBatchView, self).post(request)
+
+        user = self.project_member.member.user
+        files = []
+
+        # bulk_create can't be used with multi-table inheritance, so save the
+        # files in a single transaction instead
+        with transaction.atomic():
+            for upload in self.form.cleaned_data['files']:
+                key = get_upload_path(self.project.id_label,
+                                      upload['filename'])
+
+                data_file = ProjectDataFile(
+                    user=user,
+                    file=key,
+                    metadata=upload['metadata'],
+                    direct_sharing_project=self.project)
+
+                data_file.save()
+
+                files.append({
+                    'id': data_file.id,
+                    'filename': upload['filename'],
+                    'url': presign_upload_url(key),
+                })
+
+        return Response({'files': files}, status=status.HTTP_201_CREATED)
+
+
 class ProjectFileDirectUploadCompletionView(ProjectFormBaseView):
     """
     Complete a direct upload for a project.
@@ -233,6 +367,42 @@ class ProjectFileDirectUploadCompletionView(ProjectFormBaseView):
         }, status=status.HTTP_200_OK)
 
 
+class ProjectFileDirectUploadBatchCompletionView(ProjectFormBaseView):
+    """
+    Complete many direct uploads for a project member.
+
+    File sizes aren't returned, since that would take a request to S3 for each
+    file; use the single file completion endpoint when the size is needed.
+    """
+
+    form_class = DirectUploadDataFileBatchCompletionForm
+
+    def post(self, request):
+        super(ProjectFileDirectUploadBatchCompletionView, self).post(request)
+
+        file_ids = self.form.cleaned_data['file_ids']
+
+        data_files = ProjectDataFile.all_objects.filter(
+            pk__in=file_ids,
+            user=self.project_member.member.user,
+            direct_sharing_project=self.project)
+
+        found_ids = set(data_files.values_list('pk', flat=True))
+
+        ProjectDataFile.all_objects.filter(pk__in=found_ids).update(
+            completed=True)
+
+        # update() doesn't send the signals that maintain the counts
+        refresh_public_contributor(self.project_member.member.user_id,
+                                   self.project.id_label)
+
+        return Response({
+            'status': 'ok',
+            'completed': sorted(found_ids),
+            'missing': sorted(set(file_ids) - found_ids),
+        }, status=status.HTTP_200_OK)
+
+
 class ProjectFileUploadView(ProjectFormBaseView):
     """
     A form for uploading ProjectDataFiles to Open Humans.
@@ -0,0 +1,16 @@
+from django.apps import AppConfig
+
+
+class PrivateSharingConfig(AppConfig):
+    """
+    Configure the private sharing application.
+    """
+
+    name = 'private_sharing'
+    verbose_name = 'Private Sharing'
+
+    def ready(self):
+        # Make sure our signal handlers get hooked up
+
+        # pylint: disable=unused-variable
+        import private_sharing.signals  # noqa
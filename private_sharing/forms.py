@@ -4,17 +4,14 @@ import re
 import arrow
 
 from django import forms
-from django.core.mail.message import EmailMultiAlternatives
-from django.core.urlresolvers import reverse
-from django.template import engines
-from django.template.loader import render_to_string
-
-from common.utils import full_url
 
 from .models import (DataRequestProjectMember, OAuth2DataRequestProject,
-                     OnSiteDataRequestProject)
+                     OnSiteDataRequestProject, ProjectMessage)
 from .utilities import get_source_labels_and_names_including_dynamic
 
+# the most files that can be uploaded or completed in one batch request
+MAX_BATCH_FILES = 500
+
 
 class DataRequestProjectForm(forms.ModelForm):
     """
@@ -121,6 +118,11 @@ class MessageProjectMembersForm(forms.Form):
         required=True,
         widget=forms.Textarea)
 
+    def __init__(self, *args, **kwargs):
+        self.project = kwargs.pop('project', None)
+
+        super(MessageProjectMembersForm, self).__init__(*args, **kwargs)
+
     def clean_project_member_ids(self):
         raw_ids = self.data.get('project_member_ids', '')
 
@@ -130,9 +132,16 @@ class MessageProjectMembersForm(forms.Form):
 
         project_member_ids = re.split(r'[ ,\r\n]+', raw_ids)
 
-        # remove empty IDs
-        project_member_ids = [project_member_id for project_member_id
-                              in project_member_ids if project_member_id]
+        # remove empty and duplicate IDs, keeping the order they were given
+        seen_ids = set()
+        unique_ids = []
+
+        for project_member_id in project_member_ids:
+            if project_member_id and project_member_id not in seen_ids:
+                seen_ids.add(project_member_id)
+                unique_ids.append(project_member_id)
+
+        project_member_ids = unique_ids
 
         # check for malformed IDs
         if any([True for project_member_id in project_member_ids
@@ -141,26 +150,28 @@ class MessageProjectMembersForm(forms.Form):
             raise forms.ValidationError(
                 'Project member IDs are always 8 digits long.')
 
-        # look up each ID in the database
+        # look up all of the IDs at once, scoped to the project
         project_members = DataRequestProjectMember.objects.filter(
             project_member_id__in=project_member_ids,
             message_permission=True)
 
+        if self.project:
+            project_members = project_members.filter(project=self.project)
+
+        found_ids = set(project_members.values_list('project_member_id',
+                                                    flat=True))
+
         # if some of the project members weren't found then they were invalid
-        if len(project_member_ids) != len(project_members):
-            def in_project_members(project_member_id):
-                for project_member in project_members:
-                    if project_member.project_member_id == project_member_id:
-                        return True
+        missing_ids = [project_member_id
+                       for project_member_id in project_member_ids
+                       if project_member_id not in found_ids]
 
+        if missing_ids:
             raise forms.ValidationError(
-                'Invalid project member ID(s): {0}'.format(', '.join([
-                    project_member_id
-                    for project_member_id in project_member_ids
-                    if not in_project_members(project_member_id)])))
+                'Invalid project member ID(s): {0}'.format(
+                    ', '.join(missing_ids)))
 
-        # return the actual objects
-        return project_members
+        return project_member_ids
 
     def clean(self):
         cleaned_data = super(MessageProjectMembersForm, self).clean()
@@ -179,8 +190,12 @@ class MessageProjectMembersForm(forms.Form):
                 'You must specify either all members or provide a list of IDs '
                 'but not both.')
 
-    def send_messages(self, project):
-        template = engines['django'].from_string(self.cleaned_data['message'])
+    def send_messages(self, project=None):
+        """
+        Queue the message for delivery by the send_project_messages
+        management command and return the ProjectMessage.
+        """
+        project = project or self.project
 
         subject = '[Open Humans Project Message] '
         if 'subject' in self.cleaned_data and self.cleaned_data['subject']:
@@ -188,37 +203,63 @@ class MessageProjectMembersForm(forms.Form):
         else:
             subject += 'From "{}"'.format(project.name)
 
-        if self.cleaned_data['all_members']:
-            project_members = project.project_members.filter(
-                message_permission=True)
-        else:
-            project_members = self.cleaned_data['project_member_ids']
-
-        for project_member in project_members:
-            context = {
-                'message': template.render({
-                    'PROJECT_MEMBER_ID': project_member.project_member_id
-                }),
-                'project': project.name,
-                'username': project_member.member.user.username,
-                'activity_management_url': full_url(reverse(
-                    'activity-management',
-                    kwargs={'source': project.slug})),
-                'project_message_form': full_url(reverse(
-                    'activity-messaging',
-                    kwargs={'source': project.slug})),
-            }
-
-            plain = render_to_string('email/project-message.txt', context)
-            headers = {'Reply-To': project.contact_email}
-
-            mail = EmailMultiAlternatives(
-                subject,
-                plain,
-                '{} <{}>'.format(project.name, 'support@openhumans.org'),
-                [project_member.member.primary_email.email],
-                headers=headers)
-            mail.send()
+        project_message = ProjectMessage(
+            project=project,
+            subject=subject,
+            message=self.cleaned_data['message'],
+            all_members=bool(self.cleaned_data['all_members']))
+
+        if not project_message.all_members:
+            project_message.project_member_ids = (
+                self.cleaned_data['project_member_ids'])
+
+        project_message.recipient_count = (project_message.recipients()
+                                           .count())
+        project_message.save()
+
+        return project_message
+
+
+def validate_metadata(metadata):
+    """
+    Validate the metadata of an uploaded file, raising a ValidationError if
+    it's invalid.
+    """
+    if 'description' not in metadata:
+        raise forms.ValidationError(
+            '"description" is a required field of the metadata')
+
+    if not isinstance(metadata['description'], basestring):
+        raise forms.ValidationError(
+            '"description" must be a string')
+
+    if 'tags' not in metadata:
+        raise forms.ValidationError(
+            '"tags" is a required field of the metadata')
+
+    if not isinstance(metadata['tags'], list):
+        raise forms.ValidationError(
+            '"tags" must be an array of strings')
+
+    def validate_date(date):
+        try:
+            arrow.get(date)
+        except arrow.parser.ParserError:
+            raise forms.ValidationError('Dates must be in ISO 8601 format')
+
+    if 'creation_date' in metadata:
+        validate_date(metadata['creation_date'])
+
+    if 'start_date' in metadata:
+        validate_date(metadata['start_date'])
+
+    if 'end_date' in metadata:
+        validate_date(metadata['end_date'])
+
+    if 'md5' in metadata:
+        if not re.match(r'[a-z0-9]{32}', metadata['md5'],
+                        flags=re.IGNORECASE):
+            raise forms.ValidationError('Invalid MD5 specified')
 
 
 class UploadDataFileBaseForm(forms.Form):
@@ -241,41 +282,7 @@ class UploadDataFileBaseForm(forms.Form):
             raise forms.ValidationError(
                 'could not parse the uploaded metadata')
 
-        if 'description' not in metadata:
-            raise forms.ValidationError(
-                '"description" is a required field of the metadata')
-
-        if not isinstance(metadata['description'], basestring):
-            raise forms.ValidationError(
-                '"description" must be a string')
-
-        if 'tags' not in metadata:
-            raise forms.ValidationError(
-                '"tags" is a required field of the metadata')
-
-        if not isinstance(metadata['tags'], list):
-            raise forms.ValidationError(
-                '"tags" must be an array of strings')
-
-        def validate_date(date):
-            try:
-                arrow.get(date)
-            except arrow.parser.ParserError:
-                raise forms.ValidationError('Dates must be in ISO 8601 format')
-
-        if 'creation_date' in metadata:
-            validate_date(metadata['creation_date'])
-
-        if 'start_date' in metadata:
-            validate_date(metadata['start_date'])
-
-        if 'end_date' in metadata:
-            validate_date(metadata['end_date'])
-
-        if 'md5' in metadata:
-            if not re.match(r'[a-z0-9]{32}', metadata['md5'],
-                            flags=re.IGNORECASE):
-                raise forms.ValidationError('Invalid MD5 specified')
+        validate_metadata(metadata)
 
         return metadata
 
@@ -334,3 +341,90 @@ class DeleteDataFileForm(forms.Form):
     all_files = forms.BooleanField(
         required=False,
         label='All files')
+
+
+def parse_json_list(value, name):
+    """
+    Return the given value as a list, parsing it from JSON if it's a string.
+    """
+    if isinstance(value, basestring):
+        try:
+            value = json.loads(value)
+        except ValueError:
+            raise forms.ValidationError('could not parse {}'.format(name))
+
+    if not isinstance(value, list):
+        raise forms.ValidationError('{} must be an array'.format(name))
+
+    return value
+
+
+class DirectUploadDataFileBatchForm(forms.Form):
+    """
+    A form for validating the direct upload of many files for a project.
+    """
+
+    project_member_id = forms.CharField(
+        label='Project member ID',
+        required=True)
+
+    files = forms.Field(
+        label='Files',
+        required=True)
+
+    def clean_files(self):
+        files = parse_json_list(self.cleaned_data['files'], 'files')
+
+        if len(files) > MAX_BATCH_FILES:
+            raise forms.ValidationError(
+                'at most {} files may be uploaded at once'.format(
+                    MAX_BATCH_FILES))
+
+        for data_file in files:
+            if (not isinstance(data_file, dict) or
+                    not isinstance(data_file.get('filename'), basestring) or
+                    not data_file['filename']):
+                raise forms.ValidationError(
+                    'each file must have a "filename" and "metadata"')
+
+            if isinstance(data_file.get('metadata'), basestring):
+                try:
+                    data_file['metadata'] = json.loads(data_file['metadata'])
+                except ValueError:
+                    raise forms.ValidationError(
+                        'could not parse the uploaded metadata')
+
+            if not isinstance(data_file.get('metadata'), dict):
+                raise forms.ValidationError(
+                    'each file must have a "filename" and "metadata"')
+
+            validate_metadata(data_file['metadata'])
+
+        return files
+
+
+class DirectUploadDataFileBatchCompletionForm(forms.Form):
+    """
+    A form for validating the completion of many direct uploads.
+    """
+
+    project_member_id = forms.CharField(
+        label='Project member ID',
+        required=True)
+
+    file_ids = forms.Field(
+        label='File IDs',
+        required=True)
+
+    def clean_file_ids(self):
+        file_ids = parse_json_list(self.cleaned_data['file_ids'], 'file_ids')
+
+        if len(file_ids) > MAX_BATCH_FILES:
+            raise forms.ValidationError(
+                'at most {} files may be completed at once'.format(
+                    MAX_BATCH_FILES))
+
+        try:
+            return [int(file_id) for file_id in file_ids]
+        except (TypeError, ValueError):
+            raise forms.ValidationError('file_ids must be integers')
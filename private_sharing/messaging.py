@@ -0,0 +1,102 @@
+"""
+Delivery of project messages queued by MessageProjectMembersForm.
+
+Messages are sent by the send_project_messages management command in chunks,
+each over one reused mail connection, so that a coordinator messaging a large
+project never ties up a web request.
+"""
+from django.core.mail.message import EmailMultiAlternatives
+from django.core.urlresolvers import reverse
+from django.db.models import F
+from django.template import engines
+from django.template.loader import get_template
+from django.utils import timezone
+
+from common.utils import full_url
+
+from .models import ProjectMessage
+
+
+def render_emails(project_message, recipients):
+    """
+    Return an EmailMultiAlternatives for each (pk, project_member_id,
+    username, email) recipient, compiling the message template only once.
+    """
+    project = project_message.project
+
+    message_template = engines['django'].from_string(project_message.message)
+    email_template = get_template('email/project-message.txt')
+
+    activity_management_url = full_url(reverse(
+        'activity-management', kwargs={'source': project.slug}))
+    project_message_form = full_url(reverse(
+        'activity-messaging', kwargs={'source': project.slug}))
+
+    from_email = '{} <{}>'.format(project.name, 'support@openhumans.org')
+    headers = {'Reply-To': project.contact_email}
+
+    emails = []
+
+    for _, project_member_id, username, email in recipients:
+        context = {
+            'message': message_template.render({
+                'PROJECT_MEMBER_ID': project_member_id,
+            }),
+            'project': project.name,
+            'username': username,
+            'activity_management_url': activity_management_url,
+            'project_message_form': project_message_form,
+        }
+
+        emails.append(EmailMultiAlternatives(
+            project_message.subject,
+            email_template.render(context),
+            from_email,
+            [email],
+            headers=headers))
+
+    return emails
+
+
+def send_chunk(project_message, connection, chunk_size=100):
+    """
+    Send the next chunk of a project message over the given connection and
+    return the number of recipients attempted; 0 means the message is done.
+    """
+    recipients = list(project_message.recipients().filter(
+        pk__gt=project_message.last_project_member_pk)[:chunk_size])
+
+    messages = ProjectMessage.objects.filter(pk=project_message.pk)
+
+    if not recipients:
+        messages.update(status=ProjectMessage.SENT, completed=timezone.now())
+
+        return 0
+
+    error = ''
+
+    try:
+        sent = connection.send_messages(
+            render_emails(project_message, recipients)) or 0
+    except Exception as e:  # pylint: disable=broad-except
+        # the chunk isn't retried since some of it may have been delivered
+        sent = 0
+        error = '{}: {}'.format(e.__class__.__name__, e)
+
+        connection.close()
+
+    updates = {
+        'status': ProjectMessage.SENDING,
+        'sent_count': F('sent_count') + sent,
+        'failed_count': F('failed_count') + len(recipients) - sent,
+        'last_project_member_pk': recipients[-1][0],
+    }
+
+    if error:
+        updates['last_error'] = error
+
+    messages.update(**updates)
+
+    project_message.refresh_from_db()
+
+    return len(recipients)
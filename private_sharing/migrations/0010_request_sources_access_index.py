@@ -0,0 +1,24 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.9.9 on 2026-10-18 12:00
+from __future__ import unicode_literals
+
+from django.db import migrations
+
+# ActivityManagementView finds the projects requesting a source with
+# request_sources_access @> ARRAY[source]
+forward_sql = """CREATE INDEX project_request_sources_access_gin
+                 ON private_sharing_datarequestproject
+                 USING GIN (request_sources_access);"""
+
+reverse_sql = """DROP INDEX project_request_sources_access_gin;"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('private_sharing', '0009_projectmessage'),
+    ]
+
+    operations = [
+        migrations.RunSQL(forward_sql, reverse_sql),
+    ]
@@ -1,5 +1,6 @@
 from __future__ import unicode_literals
 
+import hashlib
 import re
 
 from string import digits  # pylint: disable=deprecated-module
@@ -9,6 +10,7 @@ import arrow
 from autoslug import AutoSlugField
 
 from django.contrib.postgres.fields import ArrayField
+from django.core.cache import cache
 from django.db import models, router
 from django.db.models.deletion import Collector
 
@@ -36,6 +38,23 @@ operate (e.g. using Google Forms) where a pre-filled project_member_id field
 allows you to connect those responses to corresponding data in Open Humans."""
 
 
+def token_cache_tag(token):
+    """
+    Return the cache tag for a resolved project or OAuth2 token.
+
+    Tokens are hashed so they're never stored in the cache in plain text.
+    """
+    return 'project-token-{}'.format(
+        hashlib.sha256(token.encode('utf-8')).hexdigest())
+
+
+def invalidate_token_cache(*tokens):
+    """
+    Remove the cached resolution of the given tokens.
+    """
+    cache.delete_many([token_cache_tag(token) for token in tokens if token])
+
+
 def now_plus_24_hours():
     """
     Return a datetime 24 hours in the future.
@@ -170,6 +189,8 @@ class DataRequestProject(models.Model):
         """
         Generate a new master access token that expires in 24 hours.
         """
+        invalidate_token_cache(self.master_access_token)
+
         self.master_access_token = generate_id()
         self.token_expiration_date = now_plus_24_hours()
 
@@ -447,3 +468,65 @@ class FeaturedProject(models.Model):
     """
     project = models.ForeignKey(DataRequestProject)
     description = models.TextField(blank=True)
+
+
+class ProjectMessage(models.Model):
+    """
+    A message from a project to its members, queued for delivery by the
+    send_project_messages management command.
+    """
+
+    QUEUED = 'queued'
+    SENDING = 'sending'
+    SENT = 'sent'
+
+    STATUS_CHOICES = (
+        (QUEUED, 'Queued'),
+        (SENDING, 'Sending'),
+        (SENT, 'Sent'),
+    )
+
+    project = models.ForeignKey(DataRequestProject, related_name='messages')
+    subject = models.CharField(max_length=255)
+    message = models.TextField()
+    all_members = models.BooleanField(default=False)
+    project_member_ids = ArrayField(models.CharField(max_length=16),
+                                    default=list)
+
+    status = models.CharField(max_length=16, choices=STATUS_CHOICES,
+                              default=QUEUED)
+    recipient_count = models.IntegerField(default=0)
+    sent_count = models.IntegerField(default=0)
+    failed_count = models.IntegerField(default=0)
+    # the primary key of the last DataRequestProjectMember delivered to, so
+    # that delivery can resume where it left off
+    last_project_member_pk = models.IntegerField(default=0)
+    last_error = models.TextField(blank=True)
+
+    created = models.DateTimeField(auto_now_add=True)
+    completed = models.DateTimeField(null=True, blank=True)
+
+    def __unicode__(self):
+        return '{}:{}:{}'.format(self.project.slug, self.subject, self.status)
+
+    def recipients(self):
+        """
+        Return a QuerySet of (pk, project_member_id, username, email) tuples
+        for the members receiving this message, ordered for resumable
+        delivery.
+        """
+        project_members = DataRequestProjectMember.objects.filter(
+            project=self.project_id,
+            message_permission=True,
+            member__user__emailaddress__primary=True)
+
+        if not self.all_members:
+            project_members = project_members.filter(
+                project_member_id__in=self.project_member_ids)
+
+        return (project_members
+                .order_by('pk')
+                .values_list('pk',
+                             'project_member_id',
+                             'member__user__username',
+                             'member__user__emailaddress__email'))
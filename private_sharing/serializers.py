@@ -3,7 +3,8 @@ from rest_framework import serializers
 from data_import.models import DataFile
 from data_import.serializers import DataFileSerializer
 
-from .models import DataRequestProject, DataRequestProjectMember
+from .models import (DataRequestProject, DataRequestProjectMember,
+                     ProjectMessage)
 
 
 class ProjectDataSerializer(serializers.ModelSerializer):
@@ -45,18 +46,28 @@ class ProjectMemberDataSerializer(serializers.ModelSerializer):
 
         return None
 
-    @staticmethod
-    def get_data(obj):
+    def get_data(self, obj):
         """
         Return current data files for each source the user has shared with
         the project, including the project itself.
         """
-        files = DataFile.objects.filter(
-            user=obj.member.user,
-            source__in=obj.sources_shared_including_self).exclude(
-            parent_project_data_file__completed=False).current()
-
-        return [DataFileSerializer(data_file).data for data_file in files]
+        # ProjectMemberDataView looks up the files for a whole page of members
+        # at once and passes them in the context
+        files_by_user = self.context.get('files_by_user')
+
+        if files_by_user is None:
+            files = DataFile.objects.filter(
+                user=obj.member.user,
+                source__in=obj.sources_shared_including_self).exclude(
+                parent_project_data_file__completed=False).current()
+        else:
+            sources = set(obj.sources_shared_including_self)
+            files = [data_file for data_file
+                     in files_by_user.get(obj.member.user_id, [])
+                     if data_file.source in sources]
+
+        return [DataFileSerializer(data_file, context=self.context).data
+                for data_file in files]
 
     def to_representation(self, obj):
         rep = super(ProjectMemberDataSerializer, self).to_representation(obj)
@@ -65,3 +76,23 @@ class ProjectMemberDataSerializer(serializers.ModelSerializer):
             rep.pop('username')
 
         return rep
+
+
+class ProjectMessageSerializer(serializers.ModelSerializer):
+    """
+    Serialize the delivery status of a project message.
+    """
+
+    class Meta:  # noqa: D101
+        model = ProjectMessage
+
+        fields = [
+            'id',
+            'subject',
+            'status',
+            'recipient_count',
+            'sent_count',
+            'failed_count',
+            'created',
+            'completed',
+        ]
@@ -0,0 +1,72 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from oauth2_provider.models import AccessToken
+
+from common.activities import invalidate_activity_catalog
+
+from .models import (DataRequestProject, DataRequestProjectMember,
+                     FeaturedProject, OAuth2DataRequestProject,
+                     OnSiteDataRequestProject, invalidate_token_cache)
+
+
+# post_save and post_delete are sent with the concrete class as the sender, so
+# each of the project subclasses is listed here
+@receiver([post_save, post_delete], sender=DataRequestProject)
+@receiver([post_save, post_delete], sender=OAuth2DataRequestProject)
+@receiver([post_save, post_delete], sender=OnSiteDataRequestProject)
+@receiver([post_save, post_delete], sender=FeaturedProject)
+def catalog_model_changed_cb(sender, instance, **kwargs):
+    """
+    Invalidate the cached activity catalog when a project changes.
+    """
+    if kwargs.get('raw'):
+        return
+
+    invalidate_activity_catalog()
+
+
+@receiver([post_save, post_delete], sender=DataRequestProject)
+@receiver([post_save, post_delete], sender=OAuth2DataRequestProject)
+@receiver([post_save, post_delete], sender=OnSiteDataRequestProject)
+def project_token_changed_cb(sender, instance, **kwargs):
+    """
+    Invalidate the cached resolution of a project's master access token, since
+    its expiration settings may have changed.
+    """
+    if kwargs.get('raw'):
+        return
+
+    invalidate_token_cache(instance.master_access_token)
+
+
+@receiver([post_save, post_delete], sender=AccessToken)
+def access_token_changed_cb(sender, instance, **kwargs):
+    """
+    Invalidate the cached resolution of an OAuth2 access token.
+    """
+    if kwargs.get('raw'):
+        return
+
+    invalidate_token_cache(instance.token)
+
+
+@receiver([post_save, post_delete], sender=DataRequestProjectMember)
+def project_member_changed_cb(sender, instance, **kwargs):
+    """
+    Invalidate the cached resolution of a member's OAuth2 access tokens for a
+    project when they're no longer an active member of it.
+    """
+    if kwargs.get('raw'):
+        return
+
+    if (kwargs.get('signal') == post_save and instance.joined and
+            instance.authorized and not instance.revoked):
+        return
+
+    tokens = AccessToken.objects.filter(
+        user_id=instance.member.user_id,
+        application__oauth2datarequestproject__pk=instance.project_id
+    ).values_list('token', flat=True)
+
+    invalidate_token_cache(*tokens)
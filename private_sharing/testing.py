@@ -1,8 +1,15 @@
+import json
+
 from cStringIO import StringIO
 
-from common.testing import SmokeTestCase
+from django.core import mail, management
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from common.testing import get_or_create_user, SmokeTestCase
+from open_humans.models import Member
 
-from .models import DataRequestProjectMember, ProjectDataFile
+from .models import DataRequestProjectMember, ProjectDataFile, ProjectMessage
 
 
 class DirectSharingMixin(object):
@@ -46,6 +53,38 @@ class DirectSharingMixin(object):
 
         return project_member
 
+    def test_project_members_query_count(self):
+        self.update_member(joined=True, authorized=True)
+
+        url = '/api/direct-sharing/project/members/?access_token={}'.format(
+            self.member1_project.master_access_token)
+
+        def count_queries():
+            with CaptureQueriesContext(connection) as context:
+                response = self.client.get(url)
+
+            self.assertEqual(response.status_code, 200)
+
+            return len(context.captured_queries)
+
+        # the first request resolves and caches the project token
+        count_queries()
+
+        before = count_queries()
+
+        for i in range(3):
+            user = get_or_create_user('querycount{}'.format(i))
+            member, _ = Member.objects.get_or_create(user=user)
+
+            DataRequestProjectMember.objects.create(
+                member=member,
+                project=self.member1_project,
+                joined=True,
+                authorized=True,
+                sources_shared=self.member1_project.request_sources_access)
+
+        self.assertEqual(count_queries(), before)
+
     def test_file_upload(self):
         member = self.update_member(joined=True, authorized=True)
 
@@ -232,3 +271,84 @@ class DirectSharingMixin(object):
         self.assertIn('/member-files/direct-sharing-', json['url'])
 
         self.assertEqual(response.status_code, 201)
+
+    def test_direct_upload_batch(self):
+        member = self.update_member(joined=True, authorized=True)
+
+        metadata = {
+            'description': 'Test description...',
+            'tags': ['tag 1', 'tag 2', 'tag 3'],
+        }
+
+        response = self.client.post(
+            '/api/direct-sharing/project/files/upload/direct/batch/'
+            '?access_token={}'.format(
+                self.member1_project.master_access_token),
+            data={
+                'project_member_id': member.project_member_id,
+                'files': json.dumps([
+                    {'filename': 'test-file-1.json', 'metadata': metadata},
+                    {'filename': 'test-file-2.json', 'metadata': metadata},
+                ]),
+            })
+
+        self.assertEqual(response.status_code, 201)
+
+        files = response.json()['files']
+
+        self.assertEqual([f['filename'] for f in files],
+                         ['test-file-1.json', 'test-file-2.json'])
+
+        for data_file in files:
+            self.assertIn('/member-files/direct-sharing-', data_file['url'])
+
+        file_ids = [data_file['id'] for data_file in files]
+
+        response = self.client.post(
+            '/api/direct-sharing/project/files/upload/complete/batch/'
+            '?access_token={}'.format(
+                self.member1_project.master_access_token),
+            data={
+                'project_member_id': member.project_member_id,
+                'file_ids': json.dumps(file_ids + [0]),
+            })
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['completed'], sorted(file_ids))
+        self.assertEqual(response.json()['missing'], [0])
+
+        self.assertEqual(
+            ProjectDataFile.objects.filter(pk__in=file_ids).count(), 2)
+
+    def test_message_members(self):
+        member = self.update_member(joined=True, authorized=True)
+        member.message_permission = True
+        member.save()
+
+        response = self.client.post(
+            '/api/direct-sharing/project/message/?access_token={}'.format(
+                self.member1_project.master_access_token),
+            data={
+                'project_member_ids': [member.project_member_id],
+                'subject': 'Test subject',
+                'message': 'Your ID is {{ PROJECT_MEMBER_ID }}.',
+            })
+
+        self.assertEqual(response.status_code, 200)
+
+        project_message = ProjectMessage.objects.get(
+            project=self.member1_project)
+
+        self.assertEqual(project_message.status, ProjectMessage.QUEUED)
+        self.assertEqual(project_message.recipient_count, 1)
+
+        management.call_command('send_project_messages', '--once',
+                                stdout=StringIO())
+
+        project_message.refresh_from_db()
+
+        self.assertEqual(project_message.status, ProjectMessage.SENT)
+        self.assertEqual(project_message.sent_count, 1)
+
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertIn(member.project_member_id, mail.outbox[0].body)
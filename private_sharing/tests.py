@@ -7,17 +7,23 @@ from urllib import quote
 
 from django.conf import settings
 from django.contrib import auth
+from django.core.cache import cache
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
 from django.test.utils import override_settings
 
 from oauth2_provider.models import AccessToken
 
 from common.testing import BrowserTestCase, get_or_create_user, SmokeTestCase
 from open_humans.models import Member
+from open_humans.templatetags.utilities import url_slug
 
-from .models import (DataRequestProjectMember, OnSiteDataRequestProject,
-                     OAuth2DataRequestProject, ProjectDataFile)
+from .models import (DataRequestProject, DataRequestProjectMember,
+                     OnSiteDataRequestProject, OAuth2DataRequestProject,
+                     ProjectDataFile)
 from .testing import DirectSharingMixin
+from .utilities import SourceLookup
 
 UserModel = auth.get_user_model()
 
@@ -115,6 +121,28 @@ class DirectSharingOnSiteTests(DirectSharingMixin, TestCase):
         self.assertEqual(
             'Project previously authorized.' in response.content, True)
 
+    @override_settings(CACHES={
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        }
+    })
+    def test_refreshed_token_is_not_cached(self):
+        url = '/api/direct-sharing/project/?access_token={}'
+
+        project = OnSiteDataRequestProject.objects.get(slug='abc-2')
+        old_token = project.master_access_token
+
+        response = self.client.get(url.format(old_token))
+        self.assertEqual(response.status_code, 200)
+
+        project.refresh_token()
+
+        response = self.client.get(url.format(old_token))
+        self.assertEqual(response.status_code, 401)
+
+        response = self.client.get(url.format(project.master_access_token))
+        self.assertEqual(response.status_code, 200)
+
 
 @override_settings(SSLIFY_DISABLE=True)
 class DirectSharingOAuth2Tests(DirectSharingMixin, TestCase):
@@ -277,6 +305,99 @@ class DirectSharingOAuth2Tests(DirectSharingMixin, TestCase):
         self.assertEqual(data_file.file.readlines(), ['just testing...'])
 
 
+@override_settings(SSLIFY_DISABLE=True, CACHES={
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    }
+})
+class ActivityQueryCountTests(DirectSharingMixin, TestCase):
+    """
+    Make sure the pages that list activities run a fixed number of queries
+    regardless of how many projects a member has joined.
+    """
+
+    urls = [
+        '/',
+        '/add-data/',
+        '/explore-share/',
+        '/create/',
+    ]
+
+    def setUp(self):
+        super(ActivityQueryCountTests, self).setUp()
+
+        cache.clear()
+
+        user1 = get_or_create_user('user1')
+        self.member1, _ = Member.objects.get_or_create(user=user1)
+
+        self.client.login(username='user1', password='user1')
+
+    def count_queries(self, url):
+        # the first request warms the activity catalog
+        self.client.get(url)
+
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(url)
+
+        self.assertEqual(response.status_code, 200)
+
+        return len(context.captured_queries)
+
+    def test_query_counts(self):
+        before = {url: self.count_queries(url) for url in self.urls}
+
+        for project in DataRequestProject.objects.all():
+            DataRequestProjectMember.objects.create(
+                member=self.member1,
+                project=project,
+                joined=True,
+                authorized=True)
+
+        after = {url: self.count_queries(url) for url in self.urls}
+
+        self.assertEqual(before, after)
+
+
+class SourceLookupTests(DirectSharingMixin, TestCase):
+    """
+    Make sure source labels are resolved with one query per preload.
+    """
+
+    def test_preload(self):
+        projects = list(DataRequestProject.objects.all())
+        labels = ['direct-sharing-{}'.format(project.id)
+                  for project in projects]
+
+        lookup = SourceLookup()
+
+        with self.assertNumQueries(1):
+            lookup.preload(labels + ['direct-sharing-0', 'pgp'])
+
+        with self.assertNumQueries(0):
+            for label, project in zip(labels, projects):
+                self.assertEqual(lookup.name(label), project.name)
+                self.assertEqual(lookup.url_slug(label), project.slug)
+
+            self.assertEqual(lookup.name('direct-sharing-0'), None)
+            self.assertEqual(lookup.url_slug('pgp'), 'pgp')
+
+    def test_url_slug_tag(self):
+        project = DataRequestProject.objects.filter(approved=True,
+                                                    active=True)[0]
+        label = 'direct-sharing-{}'.format(project.id)
+
+        self.assertEqual(url_slug(label), project.slug)
+        self.assertEqual(url_slug('pgp'), 'pgp')
+        self.assertEqual(url_slug('direct-sharing-0'), '')
+        self.assertEqual(url_slug('public_data'), '')
+
+        project.active = False
+        project.save()
+
+        self.assertEqual(url_slug(label), '')
+
+
 class SmokeTests(SmokeTestCase):
     """
     A simple GET test for all of the simple URLs in the site.
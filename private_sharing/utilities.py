@@ -1,10 +1,13 @@
 import re
+import threading
 
 from django.apps import apps
 
-from common.utils import get_source_labels_and_names
+from common.utils import app_label_to_verbose_name, get_source_labels_and_names
 from private_sharing.models import DataRequestProject
 
+_LOCAL = threading.local()
+
 
 def get_direct_sharing_sources():
     """
@@ -28,6 +31,97 @@ def get_source_labels_and_names_including_dynamic():
     return sorted(sources, key=lambda x: x[1].lower())
 
 
+class SourceLookup(object):
+    """
+    Resolve source labels to names and URL slugs.
+
+    Direct sharing projects are fetched with one query per call to preload()
+    and remembered, so rendering many labels takes a fixed number of queries.
+    SourceLookupMiddleware gives each request its own lookup; see
+    get_source_lookup().
+    """
+
+    def __init__(self):
+        # project ID to DataRequestProject, or None if it doesn't exist
+        self.projects = {}
+
+    @staticmethod
+    def project_id(label):
+        match = re.match(r'direct-sharing-(?P<id>\d+)', label)
+
+        if match:
+            return int(match.group('id'))
+
+    def preload(self, labels):
+        """
+        Fetch the projects for any direct sharing labels not already known.
+        """
+        project_ids = set(self.project_id(label) for label in labels)
+        project_ids -= set(self.projects)
+        project_ids.discard(None)
+
+        if not project_ids:
+            return
+
+        projects = DataRequestProject.objects.filter(id__in=project_ids)
+
+        self.projects.update(dict.fromkeys(project_ids))
+        self.projects.update((project.id, project) for project in projects)
+
+    def project(self, label):
+        project_id = self.project_id(label)
+
+        if project_id is None:
+            return None
+
+        if project_id not in self.projects:
+            self.preload([label])
+
+        return self.projects[project_id]
+
+    def name(self, label):
+        """
+        Given 'american_gut', return 'American Gut'.
+        """
+        try:
+            return app_label_to_verbose_name(label)
+        except LookupError:
+            project = self.project(label)
+
+            if project:
+                return project.name
+
+    def url_slug(self, label):
+        """
+        Return url_slug for an "app" activity, or slug for "project"
+        activity.
+        """
+        try:
+            return apps.get_app_config(label).url_slug
+        except AttributeError:
+            return label
+        except LookupError:
+            project = self.project(label)
+
+            if project:
+                return project.slug
+
+
+def set_source_lookup(lookup):
+    """
+    Set the SourceLookup shared by the current thread, or None to clear it.
+    """
+    _LOCAL.source_lookup = lookup
+
+
+def get_source_lookup():
+    """
+    Return the current request's SourceLookup, or a new one outside of a
+    request.
+    """
+    return getattr(_LOCAL, 'source_lookup', None) or SourceLookup()
+
+
 def source_to_url_slug(source):
     """
     Return url_slug for an "app" activity, or slug for "project" activity.
@@ -40,13 +134,4 @@ def source_to_url_slug(source):
 
     Returned slug should be valid input for the 'activity-management' page.
     """
-    try:
-        return apps.get_app_config(source).url_slug
-    except AttributeError:
-        return source
-    except LookupError:
-        match = re.match(r'direct-sharing-(?P<id>\d+)', source)
-
-        if match:
-            project = DataRequestProject.objects.get(id=int(match.group('id')))
-            return project.slug
+    return get_source_lookup().url_slug(source)
@@ -523,10 +523,18 @@ class MessageProjectMembersView(PrivateMixin, CoordinatorOnlyView, DetailView,
         return reverse_lazy('direct-sharing:detail-{}'.format(project.type),
                             kwargs={'slug': project.slug})
 
+    def get_form_kwargs(self):
+        kwargs = super(MessageProjectMembersView, self).get_form_kwargs()
+        # CoordinatorOnlyView has already looked up the project
+        kwargs['project'] = self.object
+
+        return kwargs
+
     def form_valid(self, form):
-        form.send_messages(self.get_object())
+        form.send_messages()
 
         django_messages.success(self.request,
-                                'Your message was sent successfully.')
+                                'Your message has been queued and will be '
+                                'sent shortly.')
 
         return super(MessageProjectMembersView, self).form_valid(form)
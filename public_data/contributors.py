@@ -0,0 +1,78 @@
+"""
+Maintenance of PublicContributorCount, the number of members publicly sharing
+current files for each source.
+
+A (user, source) pair is counted when it has a PublicSource and the user has
+current files for the source; PublicSource.has_files records whether it's
+counted. refresh_public_contributor is called by the signals in
+public_data.signals whenever a PublicSource or DataFile changes, and directly
+after bulk updates that don't send signals.
+"""
+from django.db import transaction
+from django.db.models import F
+
+from data_import.models import DataFile
+
+from .models import PublicContributorCount, PublicSource
+
+
+def public_contributor_count(source):
+    """
+    Return the number of members publicly sharing files for a source.
+    """
+    return (PublicContributorCount.objects
+            .filter(source=source)
+            .values_list('count', flat=True)
+            .first()) or 0
+
+
+def adjust_public_contributor_count(source, change):
+    updated = (PublicContributorCount.objects
+               .filter(source=source)
+               .update(count=F('count') + change))
+
+    if not updated:
+        PublicContributorCount.objects.get_or_create(source=source)
+        PublicContributorCount.objects.filter(source=source).update(
+            count=F('count') + change)
+
+
+def has_current_files(user_id, source):
+    return (DataFile.objects
+            .filter(user_id=user_id, source=source)
+            .current()
+            .exclude(parent_project_data_file__completed=False)
+            .exists())
+
+
+def refresh_public_contributor(user_id, source):
+    """
+    Recompute whether a (user, source) pair is counted and adjust the count
+    if that changed.
+    """
+    with transaction.atomic():
+        public_source = (PublicSource.objects
+                         .select_for_update()
+                         .filter(user_id=user_id, source=source)
+                         .first())
+
+        if not public_source:
+            return
+
+        has_files = has_current_files(user_id, source)
+
+        if has_files == public_source.has_files:
+            return
+
+        PublicSource.objects.filter(pk=public_source.pk).update(
+            has_files=has_files)
+
+        adjust_public_contributor_count(source, 1 if has_files else -1)
+
+
+def remove_public_contributor(public_source):
+    """
+    Adjust the count for a deleted PublicSource.
+    """
+    if public_source.has_files:
+        adjust_public_contributor_count(public_source.source, -1)
@@ -0,0 +1,48 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.9.9 on 2026-10-18 12:00
+from __future__ import unicode_literals
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def populate_public_sources(apps, schema_editor):
+    """
+    Create a PublicSource for each public PublicDataAccess.
+    """
+    PublicDataAccess = apps.get_model('public_data', 'PublicDataAccess')
+    PublicSource = apps.get_model('public_data', 'PublicSource')
+
+    pairs = set(PublicDataAccess.objects
+                .filter(is_public=True)
+                .values_list('participant__member__user_id', 'data_source'))
+
+    PublicSource.objects.bulk_create(
+        PublicSource(user_id=user_id, source=source)
+        for user_id, source in pairs)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('public_data', '0002_auto_20171213_1947'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PublicSource',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('source', models.CharField(db_index=True, max_length=100)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='public_sources', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.AlterUniqueTogether(
+            name='publicsource',
+            unique_together=set([('user', 'source')]),
+        ),
+        migrations.RunPython(populate_public_sources,
+                             migrations.RunPython.noop),
+    ]
@@ -0,0 +1,51 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.9.9 on 2026-10-18 12:00
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+# a public source has files if the user has a current data file for it that
+# isn't an incomplete project upload
+populate_sql = """
+    UPDATE public_data_publicsource ps
+    SET has_files = EXISTS (
+        SELECT 1
+        FROM data_import_datafile df
+        LEFT JOIN private_sharing_projectdatafile pdf
+        ON pdf.parent_id = df.id
+        WHERE df.user_id = ps.user_id
+          AND df.source = ps.source
+          AND df.archived IS NULL
+          AND (pdf.completed IS NULL OR pdf.completed));
+
+    INSERT INTO public_data_publiccontributorcount (source, count)
+    SELECT source, COUNT(*)
+    FROM public_data_publicsource
+    WHERE has_files
+    GROUP BY source;
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('public_data', '0003_publicsource'),
+        ('private_sharing', '0009_projectmessage'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='publicsource',
+            name='has_files',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.CreateModel(
+            name='PublicContributorCount',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('source', models.CharField(max_length=100, unique=True)),
+                ('count', models.IntegerField(default=0)),
+            ],
+        ),
+        migrations.RunSQL(populate_sql, migrations.RunSQL.noop),
+    ]
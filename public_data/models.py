@@ -1,3 +1,4 @@
+from django.conf import settings
 from django.db import models
 
 from activities.data_selfie.models import DataSelfieDataFile
@@ -18,9 +19,8 @@ class Participant(models.Model):
 
     @property
     def public_sources(self):
-        return [data_access.data_source
-                for data_access in self.publicdataaccess_set.all()
-                if data_access.is_public]
+        return list(self.member.user.public_sources
+                    .values_list('source', flat=True))
 
     def files_for_source(self, source):
         return DataFile.objects.filter(
@@ -86,6 +86,44 @@ class PublicDataAccess(models.Model):
                              self.data_source, status)
 
 
+class PublicSource(models.Model):
+    """
+    An index of the (user, source) pairs that are currently public.
+
+    This is kept in sync with PublicDataAccess by the signals in
+    public_data.signals so that public files can be looked up without joining
+    through Member, Participant and PublicDataAccess.
+    """
+
+    user = models.ForeignKey(settings.AUTH_USER_MODEL,
+                             related_name='public_sources')
+    source = models.CharField(max_length=100, db_index=True)
+    # whether the user has current files for the source, i.e. whether they're
+    # counted in PublicContributorCount
+    has_files = models.BooleanField(default=False)
+
+    class Meta:  # noqa: D101
+        unique_together = ('user', 'source')
+
+    def __unicode__(self):
+        return '%s:%s' % (self.user.username, self.source)
+
+
+class PublicContributorCount(models.Model):
+    """
+    The number of members publicly sharing current files for each source.
+
+    This is kept up to date by public_data.contributors as PublicSource and
+    DataFile rows change.
+    """
+
+    source = models.CharField(max_length=100, unique=True)
+    count = models.IntegerField(default=0)
+
+    def __unicode__(self):
+        return '%s: %s' % (self.source, self.count)
+
+
 class WithdrawalFeedback(models.Model):
     """
     Keep track of any feedback a study participant gives when they withdraw
@@ -1,7 +1,11 @@
-from django.db.models.signals import post_save
+from django.db.models.signals import post_delete, post_save
 from django.dispatch import receiver
 
-from .models import Participant
+from data_import.models import DataFile
+
+from .contributors import (refresh_public_contributor,
+                           remove_public_contributor)
+from .models import Participant, PublicDataAccess, PublicSource
 
 
 @receiver(post_save, sender=Participant)
@@ -15,6 +19,68 @@ def post_save_cb(sender, instance, created, raw, update_fields, **kwargs):
         return
 
     if not instance.enrolled:
-        for public_data_access in instance.publicdataaccess_set.all():
-            public_data_access.is_public = False
-            public_data_access.save(update_fields=['is_public'])
+        instance.publicdataaccess_set.update(is_public=False)
+
+        PublicSource.objects.filter(user_id=instance.member.user_id).delete()
+
+
+@receiver(post_save, sender=PublicDataAccess)
+def public_data_access_post_save_cb(sender, instance, created, raw,
+                                    update_fields, **kwargs):
+    """
+    Keep the PublicSource index in sync with a member's sharing settings.
+    """
+    if raw:
+        return
+
+    user_id = instance.participant.member.user_id
+
+    if instance.is_public:
+        PublicSource.objects.get_or_create(user_id=user_id,
+                                           source=instance.data_source)
+    else:
+        PublicSource.objects.filter(user_id=user_id,
+                                    source=instance.data_source).delete()
+
+
+@receiver(post_delete, sender=PublicDataAccess)
+def public_data_access_post_delete_cb(sender, instance, **kwargs):
+    """
+    Remove a deleted PublicDataAccess from the PublicSource index.
+    """
+    PublicSource.objects.filter(user_id=instance.participant.member.user_id,
+                                source=instance.data_source).delete()
+
+
+@receiver(post_save, sender=PublicSource)
+def public_source_post_save_cb(sender, instance, created, raw, update_fields,
+                               **kwargs):
+    """
+    Count a newly public source in PublicContributorCount.
+    """
+    if raw or not created:
+        return
+
+    refresh_public_contributor(instance.user_id, instance.source)
+
+
+@receiver(post_delete, sender=PublicSource)
+def public_source_post_delete_cb(sender, instance, **kwargs):
+    """
+    Stop counting a source that's no longer public.
+    """
+    remove_public_contributor(instance)
+
+
+@receiver([post_save, post_delete])
+def data_file_changed_cb(sender, instance, **kwargs):
+    """
+    Update PublicContributorCount when a data file is created, completed,
+    archived or deleted.
+    """
+    # post_save and post_delete are sent with the concrete class as the
+    # sender, so DataFile subclasses are matched here
+    if kwargs.get('raw') or not isinstance(instance, DataFile):
+        return
+
+    refresh_public_contributor(instance.user_id, instance.source)
@@ -3,9 +3,11 @@ from django.test import TestCase
 
 from common.testing import SmokeTestCase
 from common.utils import get_source_labels
+from data_import.models import DataFile
 from open_humans.models import Member
 
-from .models import Participant, PublicDataAccess
+from .contributors import public_contributor_count
+from .models import Participant, PublicDataAccess, PublicSource
 
 UserModel = get_user_model()
 
@@ -40,6 +42,80 @@ class PublicDataTestCase(TestCase):
         self.assertFalse(user.member.public_data_participant
                          .publicdataaccess_set.all()[0].is_public)
 
+    def assert_public(self, user, source, public):
+        self.assertEqual(
+            PublicSource.objects.filter(user=user, source=source).exists(),
+            public)
+        self.assertEqual(
+            DataFile.objects.public().filter(user=user,
+                                             source=source).exists(),
+            public)
+
+    def test_toggling_access_updates_public_sources(self):
+        user = UserModel.objects.get(username='test-user')
+        source = get_source_labels()[0]
+
+        DataFile.objects.create(user=user, source=source)
+
+        self.assert_public(user, source, True)
+
+        access = PublicDataAccess.objects.get(
+            participant__member__user=user, data_source=source)
+
+        access.is_public = False
+        access.save()
+
+        self.assert_public(user, source, False)
+
+        access.is_public = True
+        access.save()
+
+        self.assert_public(user, source, True)
+
+    def test_withdrawing_removes_public_sources(self):
+        user = UserModel.objects.get(username='test-user')
+        source = get_source_labels()[0]
+
+        DataFile.objects.create(user=user, source=source)
+
+        self.assert_public(user, source, True)
+
+        user.member.public_data_participant.enrolled = False
+        user.member.public_data_participant.save()
+
+        self.assert_public(user, source, False)
+
+    def test_deleting_access_removes_public_source(self):
+        user = UserModel.objects.get(username='test-user')
+        source = get_source_labels()[0]
+
+        DataFile.objects.create(user=user, source=source)
+
+        PublicDataAccess.objects.filter(
+            participant__member__user=user, data_source=source).delete()
+
+        self.assert_public(user, source, False)
+
+    def test_public_contributor_count(self):
+        user = UserModel.objects.get(username='test-user')
+        source = get_source_labels()[0]
+
+        self.assertEqual(public_contributor_count(source), 0)
+
+        data_file = DataFile.objects.create(user=user, source=source)
+
+        self.assertEqual(public_contributor_count(source), 1)
+
+        DataFile.objects.create(user=user, source=source)
+        data_file.delete()
+
+        self.assertEqual(public_contributor_count(source), 1)
+
+        user.member.public_data_participant.enrolled = False
+        user.member.public_data_participant.save()
+
+        self.assertEqual(public_contributor_count(source), 0)
+
 
 class SmokeTests(SmokeTestCase):
     """
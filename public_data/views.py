@@ -3,6 +3,7 @@ import re
 from django.conf import settings
 from django.contrib import messages as django_messages
 from django.core.urlresolvers import reverse_lazy
+from django.db import transaction
 from django.utils.decorators import method_decorator
 from django.views.decorators.http import require_POST
 from django.views.generic.base import RedirectView, TemplateView
@@ -114,6 +115,7 @@ class ToggleSharingView(PrivateMixin, RedirectView):
         else:
             return super(ToggleSharingView, self).get_redirect_url()
 
+    @transaction.atomic
     def toggle_data(self, user, source, public):
         if (source not in get_source_labels() and
                 not source.startswith('direct-sharing-')):
@@ -130,6 +132,9 @@ class ToggleSharingView(PrivateMixin, RedirectView):
         access.is_public = True if public == 'True' else False
         access.save()
 
+        user.log('public-data:toggle', {'source': source,
+                                        'public': access.is_public})
+
         if source.startswith('direct-sharing-'):
             match = re.match(r'direct-sharing-(?P<id>\d+)', source)
             if match:
@@ -172,6 +177,7 @@ class WithdrawView(PrivateMixin, CreateView):
     fields = ['feedback']
     success_url = reverse_lazy('public-data:home')
 
+    @transaction.atomic
     def form_valid(self, form):
         """
         If the form is valid, redirect to the supplied URL.
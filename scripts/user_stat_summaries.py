@@ -1,104 +1,280 @@
+"""
+Summarize the member data written by the user_connections_json management
+command.
+
+The data is loaded once into columns: for each flag, a list holding one
+integer per member whose bits are that member's sources. Loading visits each
+member's sources once; every count is then a pass of bitwise ANDs and
+popcounts over those columns rather than over the JSON, e.g.:
+
+    python scripts/user_stat_summaries.py connections.json \\
+        --sources pgp,fitbit,runkeeper --thresholds 1,2,3 --cohorts
+"""
+import argparse
 import json
-import sys
+
+from collections import Counter, OrderedDict
 
 STUDIES = ['american_gut', 'pgp', 'wildlife']
 ACTIVITIES = ['data_selfie', 'runkeeper', 'twenty_three_and_me']
 SOURCES = STUDIES + ACTIVITIES
 
-with open(sys.argv[1]) as f:
-    data = json.load(f)
-
-
-def counts_for_sourcelist_and_threshold(sourcelist, threshold):
-    return {
-        'is_connected': len(
-            [u for u in data
-             if len([s for s in sourcelist
-                     if data[u][s]['is_connected']]) >= threshold]),
-        'has_files': len(
-            [u for u in data
-             if len([s for s in sourcelist
-                     if data[u][s]['has_files']]) >= threshold]),
-        'is_shared': len(
-            [u for u in data
-             if len([s for s in sourcelist
-                     if data[u][s]['shared_directly'] or
-                     data[u][s]['is_public']]) >= threshold]),
-        'is_public': len(
-            [u for u in data
-             if len([s for s in sourcelist
-                     if data[u][s]['is_public']]) >= threshold]),
-    }
+FLAGS = ['is_connected', 'has_files', 'is_shared', 'is_public']
+
+FLAG_NAMES = {
+    'is_connected': 'connected',
+    'has_files': 'with files',
+    'is_shared': 'shared',
+    'is_public': 'public',
+}
+
+
+def popcount(n):
+    return bin(n).count('1')
+
+
+class MemberColumns(object):
+    """
+    A columnar representation of the member data.
+
+    Each source in `sources` is assigned a bit; `flags[flag][i]` is the
+    bitmask of sources for which member i has that flag set.
+    """
+
+    def __init__(self, data, sources):
+        first = next(data.itervalues())
+
+        self.sources = [s for s in sources if s in first]
+        self.bits = {source: 1 << i for i, source in enumerate(self.sources)}
+
+        self.flags = {flag: [] for flag in FLAGS}
+        self.email_verified = []
+        self.public_data_participant = []
+        # YYYYMM, from date_joined's YYYYMMDDTHHMMSSZ
+        self.joined_month = []
+
+        for member_data in data.itervalues():
+            masks = dict.fromkeys(FLAGS, 0)
+
+            for source, bit in self.bits.items():
+                source_data = member_data.get(source)
+
+                if not source_data:
+                    continue
+
+                is_connected = source_data.get('is_connected')
+
+                # data selfie is connected if it has files
+                if source == 'data_selfie':
+                    is_connected = source_data.get('has_files')
+
+                if is_connected:
+                    masks['is_connected'] |= bit
+
+                if source_data.get('has_files'):
+                    masks['has_files'] |= bit
+
+                if source_data.get('is_public'):
+                    masks['is_public'] |= bit
+
+                # older dumps also have shared_directly
+                if (source_data.get('shared_directly') or
+                        source_data.get('is_public')):
+                    masks['is_shared'] |= bit
+
+            for flag in FLAGS:
+                self.flags[flag].append(masks[flag])
+
+            self.email_verified.append(bool(member_data.get('email_verified')))
+            self.public_data_participant.append(
+                bool(member_data.get('public_data_participant')))
+            self.joined_month.append(
+                (member_data.get('date_joined') or '')[:6])
+
+    def mask(self, sources):
+        """
+        Return the bitmask for a list of sources, ignoring unknown sources.
+        """
+        return sum(self.bits.get(source, 0) for source in set(sources))
+
+    def threshold_counts(self, sources, thresholds):
+        """
+        Return {threshold: {flag: count}} of the members with at least
+        `threshold` of `sources` for each flag, in one pass per flag.
+        """
+        mask = self.mask(sources)
+        counts = {threshold: dict.fromkeys(FLAGS, 0)
+                  for threshold in thresholds}
+
+        for flag in FLAGS:
+            for member_mask in self.flags[flag]:
+                n = popcount(member_mask & mask)
+
+                for threshold in thresholds:
+                    if n >= threshold:
+                        counts[threshold][flag] += 1
+
+        return counts
+
+    def source_counts(self):
+        """
+        Return {source: {flag: count}} of the members with each flag set for
+        each source.
+        """
+        counts = {source: dict.fromkeys(FLAGS, 0) for source in self.sources}
+
+        for flag in FLAGS:
+            for member_mask in self.flags[flag]:
+                for source, bit in self.bits.items():
+                    if member_mask & bit:
+                        counts[source][flag] += 1
+
+        return counts
+
+    def connected_distribution(self, sources):
+        """
+        Return a Counter of {n: members connected to exactly n of `sources`}.
+        """
+        mask = self.mask(sources)
+
+        return Counter(popcount(member_mask & mask)
+                       for member_mask in self.flags['is_connected'])
+
+    def cohort_counts(self, sources):
+        """
+        Return an OrderedDict of {join month: counts} in month order, where
+        counts has the number of members who joined that month, how many
+        verified their email, and how many have each flag set for 1 or more
+        of `sources`.
+        """
+        mask = self.mask(sources)
+        cohorts = {}
+
+        for i, month in enumerate(self.joined_month):
+            cohort = cohorts.setdefault(
+                month, dict.fromkeys(['members', 'email_verified'] + FLAGS, 0))
+
+            cohort['members'] += 1
+            cohort['email_verified'] += self.email_verified[i]
+
+            for flag in FLAGS:
+                if self.flags[flag][i] & mask:
+                    cohort[flag] += 1
+
+        return OrderedDict(sorted(cohorts.items()))
+
+    def connected_unverified(self, sources):
+        """
+        Return the number of members connected to any of `sources` whose
+        email is unverified.
+        """
+        mask = self.mask(sources)
+
+        return sum(1 for member_mask, verified
+                   in zip(self.flags['is_connected'], self.email_verified)
+                   if member_mask & mask and not verified)
+
+
+def parse_list(value):
+    return [item.strip() for item in value.split(',') if item.strip()]
 
 
 def main():
-    for u in data:
-        try:
-            data[u]['data_selfie']['is_connected'] = data[u]['data_selfie']['has_files']
-        except KeyError:
-            continue
-
-    # Make this robust to analyzing past data dumps that didn't have all sources.
-    studies = [s for s in STUDIES if s in data[data.keys()[0]]]
-    sources = [s for s in SOURCES if s in data[data.keys()[0]]]
-
-    study_twoplus_counts = counts_for_sourcelist_and_threshold(studies, 2)
-
-    print ('Members that have 2+ studies...\n'
-           '  ...connected: {}\n'
-           '  ...with files: {}\n'
-           '  ...shared: {}\n'
-           '  ...public: {}\n'.format(*[
-               study_twoplus_counts[k] for k in
-               ['is_connected', 'has_files', 'is_shared', 'is_public']]))
-
-    source_twoplus_counts = counts_for_sourcelist_and_threshold(sources, 2)
-
-    print ('Members that have 2+ sources...\n'
-           '  ...connected: {}\n'
-           '  ...with files: {}\n'
-           '  ...shared: {}\n'
-           '  ...public: {}\n'.format(*[
-               source_twoplus_counts[k] for k in
-               ['is_connected', 'has_files', 'is_shared', 'is_public']]))
-
-    study_oneplus_counts = counts_for_sourcelist_and_threshold(studies, 1)
-
-    print ('Members that have 1+ studies...\n'
-           '  ...connected: {}\n'
-           '  ...with files: {}\n'
-           '  ...shared: {}\n'
-           '  ...public: {}\n'.format(*[
-               study_oneplus_counts[k] for k in
-               ['is_connected', 'has_files', 'is_shared', 'is_public']]))
-
-    source_oneplus_counts = counts_for_sourcelist_and_threshold(sources, 1)
-
-    print ('Members that have 1+ sources...\n'
-           '  ...connected: {}\n'
-           '  ...with files: {}\n'
-           '  ...shared: {}\n'
-           '  ...public: {}\n'.format(*[
-               source_oneplus_counts[k] for k in
-               ['is_connected', 'has_files', 'is_shared', 'is_public']]))
-
-    print ('Members that joined Public Data Sharing:'
-           ' {}'.format(
-               len([u for u in data if data[u]['public_data_participant']])
-           ))
-
-    print ('Members with email unverified:'
-           ' {}'.format(
-               len([u for u in data if not data[u]['email_verified']])
-           ))
-
-    print ('Members with 1+ sources connected, but email unverified:'
-           ' {}'.format(
-               len([u for u in data
-                    if len([s for s in sources
-                            if data[u][s]['is_connected']]) >= 1 and not
-                    data[u]['email_verified']])
-           ))
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+
+    parser.add_argument('datafile',
+                        help='the output of user_connections_json')
+    parser.add_argument('--studies',
+                        type=parse_list,
+                        default=STUDIES,
+                        help='a comma-separated list of study sources')
+    parser.add_argument('--sources',
+                        type=parse_list,
+                        default=SOURCES,
+                        help='a comma-separated list of all sources')
+    parser.add_argument('--thresholds',
+                        type=lambda value: [int(v) for v in parse_list(value)],
+                        default=[2, 1],
+                        help='a comma-separated list of source counts')
+    parser.add_argument('--by-source',
+                        action='store_true',
+                        help='also print the counts for each source')
+    parser.add_argument('--cohorts',
+                        action='store_true',
+                        help=('also print the counts by number of connected '
+                              'sources and by the month members joined'))
+
+    args = parser.parse_args()
+
+    with open(args.datafile) as f:
+        data = json.load(f)
+
+    if not data:
+        print 'No members found'
+
+        return
+
+    # Make this robust to analyzing past data dumps that didn't have all
+    # sources.
+    columns = MemberColumns(
+        data, list(OrderedDict.fromkeys(args.studies + args.sources)))
+
+    studies = [s for s in args.studies if s in columns.bits]
+    sources = [s for s in args.sources if s in columns.bits]
+
+    study_counts = columns.threshold_counts(studies, args.thresholds)
+    source_counts = columns.threshold_counts(sources, args.thresholds)
+
+    for threshold in args.thresholds:
+        for name, counts in (('studies', study_counts),
+                             ('sources', source_counts)):
+            print 'Members that have {}+ {}...'.format(threshold, name)
+
+            for flag in FLAGS:
+                print '  ...{}: {}'.format(FLAG_NAMES[flag],
+                                           counts[threshold][flag])
+
+            print
+
+    if args.by_source:
+        by_source = columns.source_counts()
+
+        for source in columns.sources:
+            print '{}: {}'.format(source, ', '.join(
+                '{} {}'.format(by_source[source][flag], FLAG_NAMES[flag])
+                for flag in FLAGS))
+
+        print
+
+    if args.cohorts:
+        distribution = columns.connected_distribution(sources)
+
+        print 'Members by number of sources connected...'
+
+        for n in sorted(distribution):
+            print '  ...{}: {}'.format(n, distribution[n])
+
+        print
+
+        print 'Members by month joined (with 1+ sources)...'
+
+        for month, cohort in columns.cohort_counts(sources).items():
+            print '  ...{}: {} joined, {} email verified, {}'.format(
+                '{}-{}'.format(month[:4], month[4:]) if month else 'unknown',
+                cohort['members'], cohort['email_verified'],
+                ', '.join('{} {}'.format(cohort[flag], FLAG_NAMES[flag])
+                          for flag in FLAGS))
+
+        print
+
+    print 'Members that joined Public Data Sharing: {}'.format(
+        sum(columns.public_data_participant))
+
+    print 'Members with email unverified: {}'.format(
+        columns.email_verified.count(False))
+
+    print 'Members with 1+ sources connected, but email unverified: {}'.format(
+        columns.connected_unverified(sources))
 
 
 if __name__ == '__main__':